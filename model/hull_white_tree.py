@@ -0,0 +1,222 @@
+from math import ceil, sqrt
+
+import numpy as np
+from scipy.optimize import minimize_scalar
+
+from product.interest_rate_swaption import InterestRateSwaption
+from utils.constants import FLOAT_EQ_THRESHOLD
+from utils.enum import CashFlowFrequency, PayerReceiver
+from vol_surface.swaption_vol_surface.abs_swaption_surface import AbsSwaptionSurface
+from yield_curve.abs_curve import AbsCurve
+
+
+class HullWhiteTree:
+    """
+    Hull-White trinomial tree for the short rate, dr = (theta(t) - a r) dt + sigma dW.
+
+    The geometry (node spacing, branching and probabilities) depends only on a, sigma and the time step, so one tree
+    is reused for every curve; fit() only solves the drift of each time slice to the curve. Slices are stored at the
+    full width of the tree, nodes that are not reachable yet carry zero state prices.
+    """
+
+    def __init__(self, mean_reversion: float, volatility: float, time_step: float, num_steps: int):
+        assert mean_reversion > 0, mean_reversion
+
+        self._mean_reversion = mean_reversion
+
+        self._volatility = volatility
+
+        self._time_step = time_step
+
+        self._num_steps = num_steps
+
+        self._dx = volatility * sqrt(3 * time_step)
+
+        self._j_max = ceil(0.184 / (mean_reversion * time_step))
+
+        j = np.arange(-self._j_max, self._j_max + 1)
+
+        self._x = j * self._dx
+
+        m = mean_reversion * j * time_step
+
+        # standard branching to j + 1, j, j - 1 except at the edges where the tree branches inwards
+        centre = j.copy()
+        centre[-1] -= 1
+        centre[0] += 1
+
+        self._p_up = 1 / 6 + (m ** 2 - m) / 2
+        self._p_mid = 2 / 3 - m ** 2
+        self._p_down = 1 / 6 + (m ** 2 + m) / 2
+
+        self._p_up[-1], self._p_mid[-1], self._p_down[-1] = (7 / 6 + (m[-1] ** 2 - 3 * m[-1]) / 2,
+                                                             -1 / 3 - m[-1] ** 2 + 2 * m[-1],
+                                                             1 / 6 + (m[-1] ** 2 - m[-1]) / 2)
+
+        self._p_up[0], self._p_mid[0], self._p_down[0] = (1 / 6 + (m[0] ** 2 + m[0]) / 2,
+                                                          -1 / 3 - m[0] ** 2 - 2 * m[0],
+                                                          7 / 6 + (m[0] ** 2 + 3 * m[0]) / 2)
+
+        # indices of the successor nodes within a slice
+        self._up = centre + 1 + self._j_max
+        self._mid = centre + self._j_max
+        self._down = centre - 1 + self._j_max
+
+    @classmethod
+    def for_schedule(cls, mean_reversion: float, volatility: float, end_time: float,
+                     cash_flow_frequency: CashFlowFrequency, steps_per_period: int = 4):
+        """
+        Tree whose slices fall on every date of a schedule with the given frequency up to end_time
+        """
+        time_step = 1 / (int(cash_flow_frequency) * steps_per_period)
+
+        return cls(mean_reversion, volatility, time_step, round(end_time / time_step))
+
+    @classmethod
+    def calibrate(cls, libor_curve: AbsCurve, swaption_vol_surface: AbsSwaptionSurface, exercise_times,
+                  swap_end_time: float, strike: float, cash_flow_frequency: CashFlowFrequency,
+                  payer_receiver: PayerReceiver, mean_reversion: float = 0.1, steps_per_period: int = 4,
+                  volatility_bounds=(1E-04, 0.1)):
+        """
+        Fits sigma, for a fixed mean reversion, to the Black prices of the co-terminal European swaptions expiring on
+        each exercise time into a swap ending at swap_end_time, by least squares
+        """
+        exercise_times = np.asarray(exercise_times, dtype=float)
+
+        black_prices = InterestRateSwaption.present_value_batch(
+            libor_curve, swaption_vol_surface, 1., strike, exercise_times, swap_end_time - exercise_times,
+            int(cash_flow_frequency), int(payer_receiver))
+
+        # swaptions the surface cannot price, e.g. tenors shorter than its grid, are left out
+        priced = ~np.isnan(black_prices)
+
+        assert np.any(priced), "No co-terminal swaption is covered by the vol surface."
+
+        exercise_times, black_prices = exercise_times[priced], black_prices[priced]
+
+        def _f(volatility):
+            tree = cls.for_schedule(mean_reversion, volatility, swap_end_time, cash_flow_frequency, steps_per_period)
+
+            tree_prices = tree.european_swaption_values(libor_curve, exercise_times, swap_end_time, strike,
+                                                        cash_flow_frequency, payer_receiver)
+
+            return np.sum((tree_prices - black_prices) ** 2)
+
+        result = minimize_scalar(_f, bounds=volatility_bounds, method='bounded')
+
+        return cls.for_schedule(mean_reversion, result.x, swap_end_time, cash_flow_frequency, steps_per_period)
+
+    def fit(self, libor_curve: AbsCurve) -> np.ndarray:
+        """
+        Drift of every slice such that the tree reprices the curve's discount factors, found by forward induction
+        of the state prices
+        :return: array of shape (num_steps,), the short rate at node j of slice i being alphas[i] + j * dx
+        """
+        dt = self._time_step
+
+        discount_factors = libor_curve.interpolate_discount_factor(dt * np.arange(1, self._num_steps + 1))
+
+        width = len(self._x)
+
+        state_prices = np.zeros(width)
+        state_prices[self._j_max] = 1
+
+        alphas = np.empty(self._num_steps)
+
+        for i in range(self._num_steps):
+            alphas[i] = (np.log(np.sum(state_prices * np.exp(-1 * self._x * dt))) - np.log(discount_factors[i])) / dt
+
+            discounted = state_prices * np.exp(-1 * (alphas[i] + self._x) * dt)
+
+            state_prices = (np.bincount(self._up, discounted * self._p_up, width)
+                            + np.bincount(self._mid, discounted * self._p_mid, width)
+                            + np.bincount(self._down, discounted * self._p_down, width))
+
+        return alphas
+
+    def bermudan_swaption_value(self, libor_curve: AbsCurve, exercise_times, swap_end_time: float, strike: float,
+                                cash_flow_frequency: CashFlowFrequency, payer_receiver: PayerReceiver) -> float:
+        """
+        Value per unit notional of the right to enter, on any of the exercise times, the swap from that time to
+        swap_end_time
+        """
+        return self._swaption_values(libor_curve, exercise_times, swap_end_time, strike, cash_flow_frequency,
+                                     payer_receiver, bermudan=True)[0]
+
+    def european_swaption_values(self, libor_curve: AbsCurve, exercise_times, swap_end_time: float, strike: float,
+                                 cash_flow_frequency: CashFlowFrequency, payer_receiver: PayerReceiver) -> np.ndarray:
+        """
+        Values per unit notional of the co-terminal European swaptions expiring on each exercise time, all rolled back
+        together
+        """
+        return self._swaption_values(libor_curve, exercise_times, swap_end_time, strike, cash_flow_frequency,
+                                     payer_receiver, bermudan=False)
+
+    def _swaption_values(self, libor_curve: AbsCurve, exercise_times, swap_end_time: float, strike: float,
+                         cash_flow_frequency: CashFlowFrequency, payer_receiver: PayerReceiver, bermudan: bool):
+        alphas = self.fit(libor_curve)
+
+        exercise_steps = self._steps(exercise_times)
+
+        end_step = int(self._steps(swap_end_time))
+
+        assert end_step <= self._num_steps, swap_end_time
+
+        assert np.all(exercise_steps < end_step), exercise_times
+
+        coupon_steps = set(self._steps(swap_end_time - np.arange(round(swap_end_time * int(cash_flow_frequency)))
+                                       / int(cash_flow_frequency)).tolist())
+
+        exercise_rows = {step: (0 if bermudan else row) for row, step in enumerate(exercise_steps.tolist())}
+
+        option_values = np.zeros((1 if bermudan else len(exercise_steps), len(self._x)))
+
+        # value of the fixed leg plus final notional paid after the current slice
+        bond_values = np.zeros(len(self._x))
+
+        for i in range(end_step, -1, -1):
+            if i < end_step:
+                discount = np.exp(-1 * (alphas[i] + self._x) * self._time_step)
+
+                option_values = discount * (self._p_up * option_values[:, self._up]
+                                            + self._p_mid * option_values[:, self._mid]
+                                            + self._p_down * option_values[:, self._down])
+
+                bond_values = discount * (self._p_up * bond_values[self._up] + self._p_mid * bond_values[self._mid]
+                                          + self._p_down * bond_values[self._down])
+
+            if i in exercise_rows:
+                row = exercise_rows[i]
+
+                # the floating leg of a swap starting now is worth par
+                exercise_value = int(payer_receiver) * (1 - bond_values)
+
+                option_values[row] = np.maximum(option_values[row], exercise_value)
+
+            if i in coupon_steps:
+                bond_values = bond_values + strike / int(cash_flow_frequency) + (1 if i == end_step else 0)
+
+        return option_values[:, self._j_max]
+
+    def _steps(self, times) -> np.ndarray:
+        steps = np.asarray(times, dtype=float) / self._time_step
+
+        assert np.all(np.abs(steps - np.round(steps)) < FLOAT_EQ_THRESHOLD), "Times must fall on the tree's slices."
+
+        return np.round(steps).astype(int)
+
+    @property
+    def mean_reversion(self):
+        return self._mean_reversion
+
+    @property
+    def volatility(self):
+        return self._volatility
+
+    @property
+    def time_step(self):
+        return self._time_step
+
+    @property
+    def num_steps(self):
+        return self._num_steps
@@ -0,0 +1,325 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+from product.cancellable_swap import CancellableSwap
+from product.cap_floor import Cap
+from product.interest_rate_swaption import InterestRateSwaption
+from utils.constants import FLOAT_EQ_THRESHOLD
+from utils.enum import CashFlowFrequency
+from vol_surface.cap_vol_surface.abs_cap_surface import AbsCapSurface
+from vol_surface.swaption_vol_surface.abs_swaption_surface import AbsSwaptionSurface
+from yield_curve.abs_curve import AbsCurve
+
+
+@dataclass
+class LmmPaths:
+    # forwards[p, i, k] is forward k on path p at tenor time i, forwards that have reset keep their fixing
+    forwards: np.ndarray
+    # numeraires[p, i] is the discretely rolled spot LIBOR account at tenor time i
+    numeraires: np.ndarray
+    tenor_times: np.ndarray
+    period: float
+
+
+@dataclass
+class MonteCarloResult:
+    present_value: float
+    standard_error: float
+    num_paths: int
+
+
+class LiborMarketModel:
+    """
+    Lognormal LIBOR market model on a regular tenor grid, simulated under the spot LIBOR measure with a log-Euler
+    predictor-corrector scheme. Forward k covers [T_k, T_k+1] and has a constant vol, forwards are correlated by
+    exp(-decay * |T_i - T_j|).
+
+    Payoffs are callables taking LmmPaths and returning the cash flows paid at each tenor time, of shape
+    (paths, tenor times), so path dependent payoffs without a closed form are priced the same way as the products.
+    """
+
+    def __init__(self, tenor_times: np.ndarray, initial_forwards: np.ndarray, volatilities: np.ndarray,
+                 correlation_decay: float = 0.1, steps_per_period: int = 1):
+        self._tenor_times = np.asarray(tenor_times, dtype=float)
+
+        self._period = self._tenor_times[1] - self._tenor_times[0]
+
+        assert np.allclose(np.diff(self._tenor_times), self._period), "Tenor times must be a regular grid."
+
+        self._initial_forwards = np.asarray(initial_forwards, dtype=float)
+
+        self._volatilities = np.asarray(volatilities, dtype=float)
+
+        self._steps_per_period = steps_per_period
+
+        reset_times = self._tenor_times[:-1]
+
+        correlation = np.exp(-1 * correlation_decay * np.abs(reset_times[:, None] - reset_times[None, :]))
+
+        self._correlation_factor = np.linalg.cholesky(correlation)
+
+        # drift_k = vol_k * sum_{alive j <= k} rho_kj * vol_j * tau F_j / (1 + tau F_j)
+        self._drift_matrix = np.tril(correlation) * self._volatilities[:, None]
+
+    @classmethod
+    def from_cap_vol_surface(cls, libor_curve: AbsCurve, cap_vol_surface: AbsCapSurface, end_time: float,
+                             cash_flow_frequency: CashFlowFrequency, correlation_decay: float = 0.1,
+                             steps_per_period: int = 1):
+        """
+        Forward vols are the caplet vols the surface applies to a cap ending at end_time
+        """
+        tenor_times = cls._tenor_grid(end_time, cash_flow_frequency)
+
+        volatilities = cap_vol_surface.caplet_vols(end_time, tenor_times[:-1])
+
+        return cls(tenor_times, cls._initial_forwards_from_curve(libor_curve, tenor_times), volatilities,
+                   correlation_decay, steps_per_period)
+
+    @classmethod
+    def from_swaption_vol_surface(cls, libor_curve: AbsCurve, swaption_vol_surface: AbsSwaptionSurface,
+                                  end_time: float, cash_flow_frequency: CashFlowFrequency,
+                                  correlation_decay: float = 0.1, steps_per_period: int = 1):
+        """
+        Forward vols are the co-terminal swaption vols expiring on each reset time, the forwards the surface does not
+        cover take the vol of the nearest covered reset
+        """
+        tenor_times = cls._tenor_grid(end_time, cash_flow_frequency)
+
+        reset_times = tenor_times[:-1]
+
+        volatilities = np.array([swaption_vol_surface.interpolate_vol(t, end_time - t) for t in reset_times],
+                                dtype=float)
+
+        covered = np.flatnonzero(~np.isnan(volatilities))
+
+        assert len(covered), "No co-terminal swaption is covered by the vol surface."
+
+        nearest = covered[np.argmin(np.abs(reset_times[:, None] - reset_times[covered][None, :]), axis=1)]
+
+        return cls(tenor_times, cls._initial_forwards_from_curve(libor_curve, tenor_times), volatilities[nearest],
+                   correlation_decay, steps_per_period)
+
+    def simulate(self, num_paths: int, rng: np.random.Generator) -> LmmPaths:
+        num_forwards = len(self._initial_forwards)
+
+        tau = self._period
+
+        dt = tau / self._steps_per_period
+
+        forwards = np.empty((num_paths, num_forwards + 1, num_forwards))
+
+        log_forwards = np.tile(np.log(self._initial_forwards), (num_paths, 1))
+
+        forwards[:, 0] = self._initial_forwards
+
+        for i in range(num_forwards):
+            # forwards up to i have reset, the rest evolve until T_i+1
+            alive = slice(i + 1, num_forwards)
+
+            volatilities = self._volatilities[alive]
+
+            drift_matrix = self._drift_matrix[alive, alive]
+
+            for _ in range(self._steps_per_period if i + 1 < num_forwards else 0):
+                shocks = (rng.standard_normal((num_paths, num_forwards)) @ self._correlation_factor.T)[:, alive]
+
+                diffusion = volatilities * np.sqrt(dt) * shocks - 0.5 * volatilities ** 2 * dt
+
+                drift = self._drift(log_forwards[:, alive], drift_matrix, volatilities)
+
+                predicted = log_forwards[:, alive] + drift * dt + diffusion
+
+                predicted_drift = self._drift(predicted, drift_matrix, volatilities)
+
+                log_forwards[:, alive] += 0.5 * (drift + predicted_drift) * dt + diffusion
+
+            forwards[:, i + 1] = np.exp(log_forwards)
+
+        fixings = forwards[:, np.arange(num_forwards), np.arange(num_forwards)]
+
+        numeraires = np.ones((num_paths, num_forwards + 1))
+        numeraires[:, 1:] = np.cumprod(1 + tau * fixings, axis=1)
+
+        return LmmPaths(forwards, numeraires, self._tenor_times, tau)
+
+    def present_value(self, payoff, num_paths: int = 10000, chunk_size: int = 5000, seed=None,
+                      max_workers: int = 1) -> MonteCarloResult:
+        """
+        Averages the deflated cash flows of a payoff. Paths are simulated in chunks of at most chunk_size with an
+        independent random stream spawned per chunk, so the result depends on the seed but not on max_workers.
+        max_workers above one simulates the chunks in a process pool, the payoff must then be picklable.
+        """
+        chunk_sizes = [min(chunk_size, num_paths - start) for start in range(0, num_paths, chunk_size)]
+
+        seed_sequences = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+
+        chunks = [(self, payoff, size, seed_sequence) for size, seed_sequence in zip(chunk_sizes, seed_sequences)]
+
+        if max_workers == 1:
+            moments = [_simulate_chunk(*chunk) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                moments = list(executor.map(_simulate_chunk, *zip(*chunks)))
+
+        total, total_squares = np.sum(moments, axis=0)
+
+        mean = total / num_paths
+
+        variance = max(total_squares / num_paths - mean ** 2, 0)
+
+        return MonteCarloResult(mean, np.sqrt(variance / num_paths), num_paths)
+
+    def cap_present_value(self, cap: Cap, **simulation_kwargs) -> MonteCarloResult:
+
+        return self.present_value(CapPayoff(cap, self._tenor_times), **simulation_kwargs)
+
+    def swaption_present_value(self, swaption: InterestRateSwaption, **simulation_kwargs) -> MonteCarloResult:
+
+        return self.present_value(SwaptionPayoff(swaption, self._tenor_times), **simulation_kwargs)
+
+    def cancellable_swap_present_value(self, cancellable_swap: CancellableSwap,
+                                       **simulation_kwargs) -> MonteCarloResult:
+
+        return self.present_value(CancellableSwapPayoff(cancellable_swap, self._tenor_times), **simulation_kwargs)
+
+    def _drift(self, log_forwards: np.ndarray, drift_matrix: np.ndarray, volatilities: np.ndarray):
+        tau_forwards = self._period * np.exp(log_forwards)
+
+        # the drift matrix is lower triangular so each forward only sees the alive forwards resetting before it
+        return (volatilities * tau_forwards / (1 + tau_forwards)) @ drift_matrix.T
+
+    @staticmethod
+    def _tenor_grid(end_time: float, cash_flow_frequency: CashFlowFrequency):
+        m = int(cash_flow_frequency)
+
+        return np.arange(round(end_time * m) + 1) / m
+
+    @staticmethod
+    def _initial_forwards_from_curve(libor_curve: AbsCurve, tenor_times: np.ndarray):
+        period = tenor_times[1] - tenor_times[0]
+
+        # simple compounded forwards over each accrual period from the curve's continuous forward rates
+        return np.expm1(libor_curve.interpolate_forward_rate(tenor_times[:-1], period) * period) / period
+
+    @property
+    def tenor_times(self):
+        return self._tenor_times
+
+    @property
+    def initial_forwards(self):
+        return self._initial_forwards
+
+    @property
+    def volatilities(self):
+        return self._volatilities
+
+
+class CapPayoff:
+
+    def __init__(self, cap: Cap, tenor_times: np.ndarray):
+        self._reset_indices = _grid_indices(cap.reset_dates, tenor_times)
+
+        assert np.isclose(1 / int(cap.payment_frequency), tenor_times[1] - tenor_times[0]), (
+            "The cap must pay on the model's tenor grid.")
+
+        self._notional = cap.notional * cap.long_short
+
+        self._strike_rate = cap.strike_rate
+
+        self._cap_floor = int(cap.cap_floor)
+
+    def __call__(self, paths: LmmPaths) -> np.ndarray:
+        k = self._reset_indices
+
+        fixings = paths.forwards[:, k, k]
+
+        cash_flows = np.zeros(paths.numeraires.shape)
+
+        cash_flows[:, k + 1] = self._notional * paths.period * np.maximum(
+            self._cap_floor * (fixings - self._strike_rate), 0)
+
+        return cash_flows
+
+
+class SwaptionPayoff:
+
+    def __init__(self, swaption: InterestRateSwaption, tenor_times: np.ndarray):
+        swap = swaption.underlying_swap
+
+        assert np.isclose(1 / int(swap.cash_flow_frequency), tenor_times[1] - tenor_times[0]), (
+            "The swap must pay on the model's tenor grid.")
+
+        self._expiry_index = int(_grid_indices(swaption.swaption_expiry, tenor_times))
+
+        self._end_index = int(_grid_indices(swap.start_time + swap.maturity, tenor_times))
+
+        self._notional = swaption.notional * swaption.long_short
+
+        self._strike = swaption.strike
+
+        self._payer_receiver = int(swaption.payer_receiver)
+
+    def __call__(self, paths: LmmPaths) -> np.ndarray:
+        e = self._expiry_index
+
+        forwards = paths.forwards[:, e, e:self._end_index]
+
+        # discount factors from the expiry to each payment date of the swap
+        discount_factors = np.cumprod(1 / (1 + paths.period * forwards), axis=1)
+
+        annuities = paths.period * np.sum(discount_factors, axis=1)
+
+        swap_rates = (1 - discount_factors[:, -1]) / annuities
+
+        cash_flows = np.zeros(paths.numeraires.shape)
+
+        cash_flows[:, e] = self._notional * annuities * np.maximum(self._payer_receiver * (swap_rates - self._strike),
+                                                                   0)
+
+        return cash_flows
+
+
+class CancellableSwapPayoff:
+    """
+    Cash flows of the underlying swap on every path plus the European cancellation right
+    """
+
+    def __init__(self, cancellable_swap: CancellableSwap, tenor_times: np.ndarray):
+        swap = cancellable_swap.underlying_swap
+
+        assert swap.start_time == 0, swap.start_time
+
+        self._end_index = int(_grid_indices(swap.maturity, tenor_times))
+
+        self._notional = swap.notional * int(swap.payer_receiver)
+
+        self._swap_rate = swap.swap_rate
+
+        self._swaption_payoff = SwaptionPayoff(cancellable_swap.offsetting_swaption, tenor_times)
+
+    def __call__(self, paths: LmmPaths) -> np.ndarray:
+        k = np.arange(self._end_index)
+
+        cash_flows = self._swaption_payoff(paths)
+
+        cash_flows[:, k + 1] += self._notional * paths.period * (paths.forwards[:, k, k] - self._swap_rate)
+
+        return cash_flows
+
+
+def _grid_indices(times, tenor_times: np.ndarray):
+    indices = np.asarray(times, dtype=float) / (tenor_times[1] - tenor_times[0])
+
+    assert np.all(np.abs(indices - np.round(indices)) < FLOAT_EQ_THRESHOLD), "Times must fall on the tenor grid."
+
+    return np.round(indices).astype(int)
+
+
+def _simulate_chunk(model: LiborMarketModel, payoff, num_paths: int, seed_sequence: np.random.SeedSequence):
+    paths = model.simulate(num_paths, np.random.default_rng(seed_sequence))
+
+    values = np.sum(payoff(paths) / paths.numeraires, axis=1)
+
+    return np.array([np.sum(values), np.sum(values ** 2)])
@@ -0,0 +1,61 @@
+from typing import List
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from yield_curve.abs_curve import AbsCurve
+
+# payment times closer than this are merged into one column
+_TIME_DECIMALS = 10
+
+
+class CashFlowMatrix:
+    """
+    Compiles a book of linear trades (anything with cash_flows(), e.g. InterestRateSwap, FixedRateBond and
+    ZeroCouponBond) into a sparse (trades x payment times) matrix on the book's unique payment times, so pricing the
+    book is one curve evaluation and one sparse mat-vec
+    """
+
+    def __init__(self, trades: List):
+        self._trades = trades
+
+        trade_times = []
+
+        trade_amounts = []
+
+        for trade in trades:
+            times, amounts = trade.cash_flows()
+            trade_times.append(times)
+            trade_amounts.append(amounts)
+
+        rows = np.repeat(np.arange(len(trades)), [len(times) for times in trade_times])
+
+        self._times, columns = np.unique(np.round(np.concatenate(trade_times), _TIME_DECIMALS), return_inverse=True)
+
+        # repeated (trade, time) entries are summed
+        self._matrix = csr_matrix((np.concatenate(trade_amounts), (rows, columns.reshape(-1))),
+                                  shape=(len(trades), len(self._times)))
+
+    def present_values(self, libor_curve: AbsCurve) -> np.ndarray:
+        """
+        :param libor_curve: a curve, or a CurveSet to price the book on every curve of the set
+        :return: present value per trade, of shape (trades,) or (trades, curves) for a CurveSet
+        """
+        discount_factors = libor_curve.interpolate_discount_factor(self._times)
+
+        return self._matrix @ discount_factors.T
+
+    def book_value(self, libor_curve: AbsCurve):
+        return self.present_values(libor_curve).sum(axis=0)
+
+    @property
+    def times(self) -> np.ndarray:
+        return self._times
+
+    @property
+    def matrix(self) -> csr_matrix:
+        return self._matrix
+
+    @property
+    def trades(self) -> List:
+        return self._trades
@@ -0,0 +1,144 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from portfolio.cash_flow_matrix import CashFlowMatrix
+from product.bond.fixed_rate_bond import FixedRateBond
+from product.bond.zero_coupon_bond import ZeroCouponBond
+from product.cancellable_swap import CancellableSwap
+from product.cap_floor import Cap
+from product.interest_rate_swap import InterestRateSwap
+from product.interest_rate_swaption import InterestRateSwaption
+from vol_surface.cap_vol_surface.abs_cap_surface import AbsCapSurface
+from vol_surface.swaption_vol_surface.abs_swaption_surface import AbsSwaptionSurface
+from yield_curve.libor_curve import LiborCurve
+
+_LINEAR_PRODUCTS = (InterestRateSwap, FixedRateBond, ZeroCouponBond)
+
+# product groups priced together
+_LINEAR, _SWAPTION, _CAP, _CANCELLABLE = range(4)
+
+_ALL_GROUPS = (_LINEAR, _SWAPTION, _CAP, _CANCELLABLE)
+
+
+class BookRiskEngine:
+    """
+    Bump and reprice risk for a book of swaps, bonds, swaptions, caps and cancellable swaps. Every bumped curve or
+    surface is built once for the whole book and dropped before the next one is built. Each product type is priced
+    with its book pricer: linear products through one CashFlowMatrix, swaptions and caps through their batch Black
+    pricers.
+    """
+
+    def __init__(self, trades: List, libor_curve: LiborCurve, swaption_vol_surface: AbsSwaptionSurface = None,
+                 cap_vol_surface: AbsCapSurface = None):
+        self._trades = trades
+
+        self._libor_curve = libor_curve
+
+        self._swaption_vol_surface = swaption_vol_surface
+
+        self._cap_vol_surface = cap_vol_surface
+
+        self._linear_indices = self._indices_of(_LINEAR_PRODUCTS)
+
+        self._swaption_indices = self._indices_of(InterestRateSwaption)
+
+        self._cap_indices = self._indices_of(Cap)
+
+        self._cancellable_indices = self._indices_of(CancellableSwap)
+
+        priced = (len(self._linear_indices) + len(self._swaption_indices) + len(self._cap_indices)
+                  + len(self._cancellable_indices))
+
+        if priced != len(trades):
+            raise ValueError("Book contains trades the risk engine cannot price.")
+
+        self._cash_flow_matrix = CashFlowMatrix([trades[i] for i in self._linear_indices])
+
+        self._swaptions = [trades[i] for i in self._swaption_indices]
+
+        self._caps = [trades[i] for i in self._cap_indices]
+
+        self._cancellables = [trades[i] for i in self._cancellable_indices]
+
+    def present_values(self, libor_curve: LiborCurve = None, swaption_vol_surface: AbsSwaptionSurface = None,
+                       cap_vol_surface: AbsCapSurface = None) -> np.ndarray:
+        """
+        Present value of every trade, the engine's market is used for anything not given
+        """
+        return self._present_values(_ALL_GROUPS, libor_curve, swaption_vol_surface, cap_vol_surface)
+
+    def curve_risk(self, n_bps_bump=1) -> pd.DataFrame:
+        """
+        :return: trade x curve node matrix of repriced minus base values, one column per bumped instrument
+        """
+        npv = self.present_values()
+
+        risk = {node: self.present_values(libor_curve=bumped_curve) - npv
+                for node, bumped_curve in self._libor_curve.iter_bumped_curves(n_bps_bump)}
+
+        return pd.DataFrame(risk)
+
+    def swaption_vega_risk(self, n_bps_bump=1) -> pd.DataFrame:
+        """
+        :return: trade x (expiry, tenor) matrix, zero for trades that do not depend on the swaption surface
+        """
+        groups = (_SWAPTION, _CANCELLABLE)
+
+        npv = self._present_values(groups)
+
+        risk = {point: self._present_values(groups, swaption_vol_surface=bumped_surface) - npv
+                for point, bumped_surface in self._swaption_vol_surface.iter_bumped_surfaces(n_bps_bump)}
+
+        return pd.DataFrame(risk)
+
+    def cap_vega_risk(self, n_bps_bump=1) -> pd.DataFrame:
+        """
+        :return: trade x expiry matrix, zero for trades that do not depend on the cap surface
+        """
+        groups = (_CAP,)
+
+        npv = self._present_values(groups)
+
+        risk = {expiry: self._present_values(groups, cap_vol_surface=bumped_surface) - npv
+                for expiry, bumped_surface in self._cap_vol_surface.iter_bumped_surfaces(n_bps_bump)}
+
+        return pd.DataFrame(risk)
+
+    def _present_values(self, groups, libor_curve: LiborCurve = None, swaption_vol_surface: AbsSwaptionSurface = None,
+                        cap_vol_surface: AbsCapSurface = None) -> np.ndarray:
+        """
+        Values of the trades in the given product groups, zero for the other trades
+        """
+        libor_curve = self._libor_curve if libor_curve is None else libor_curve
+
+        swaption_vol_surface = self._swaption_vol_surface if swaption_vol_surface is None else swaption_vol_surface
+
+        cap_vol_surface = self._cap_vol_surface if cap_vol_surface is None else cap_vol_surface
+
+        values = np.zeros(len(self._trades))
+
+        if _LINEAR in groups and len(self._linear_indices):
+            values[self._linear_indices] = self._cash_flow_matrix.present_values(libor_curve)
+
+        if _SWAPTION in groups and len(self._swaption_indices):
+            values[self._swaption_indices] = InterestRateSwaption.present_value_book(self._swaptions, libor_curve,
+                                                                                     swaption_vol_surface)
+
+        if _CAP in groups and len(self._cap_indices):
+            values[self._cap_indices] = Cap.present_value_book(self._caps, libor_curve, cap_vol_surface)
+
+        if _CANCELLABLE in groups:
+            for i, cancellable in zip(self._cancellable_indices, self._cancellables):
+                values[i] = cancellable.present_value(libor_curve, swaption_vol_surface)
+
+        return values
+
+    def _indices_of(self, product_types) -> np.ndarray:
+
+        return np.array([i for i, trade in enumerate(self._trades) if isinstance(trade, product_types)], dtype=int)
+
+    @property
+    def trades(self):
+        return self._trades
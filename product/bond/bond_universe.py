@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+from product.bond.key_rate_duration import key_rate_durations
+from yield_curve.abs_curve import AbsCurve
+from yield_curve.libor_curve import LiborCurve
+
+
+@dataclass
+class BondAnalytics:
+    yield_rate: np.ndarray
+    z_spread: np.ndarray
+    # -dP/dy and d2P/dy2 at the yield, the same convention as FixedRateBond.duration_from_yield
+    duration: np.ndarray
+    convexity: np.ndarray
+
+
+class BondUniverse:
+    """
+    A universe of FixedRateBond and ZeroCouponBond with their cash flows padded into (bonds x cash flows) arrays, so
+    yields and z-spreads for every bond are solved together by one masked Newton iteration
+    """
+
+    def __init__(self, bonds: List):
+        self._bonds = bonds
+
+        bond_cash_flows = [bond.cash_flows() for bond in bonds]
+
+        max_cash_flows = max(len(times) for times, _ in bond_cash_flows)
+
+        self._times = np.zeros((len(bonds), max_cash_flows))
+
+        self._amounts = np.zeros((len(bonds), max_cash_flows))
+
+        for i, (times, amounts) in enumerate(bond_cash_flows):
+            # padding has zero amount and repeats the last time so it stays inside the curve
+            self._times[i, :len(times)] = times
+            self._times[i, len(times):] = times[-1]
+            self._amounts[i, :len(amounts)] = amounts
+
+    def yield_to_price(self, yield_rates):
+
+        return np.sum(self._amounts * np.exp(-1 * self._times * np.asarray(yield_rates)[:, None]), axis=-1)
+
+    def price_to_yield(self, prices, **solver_kwargs):
+
+        return self._solve_rate(self._amounts, prices, **solver_kwargs)
+
+    def present_value(self, libor_curve: AbsCurve, applied_z_spreads=0.):
+
+        return np.sum(self._curve_discounted_amounts(libor_curve)
+                      * np.exp(-1 * self._times * np.asarray(applied_z_spreads)[..., None]), axis=-1)
+
+    def z_spread(self, prices, libor_curve: AbsCurve, **solver_kwargs):
+
+        return self._solve_rate(self._curve_discounted_amounts(libor_curve), prices, **solver_kwargs)
+
+    def duration_from_yield(self, yield_rates):
+
+        return np.sum(self._times * self._discounted_amounts(yield_rates), axis=-1)
+
+    def convexity_from_yield(self, yield_rates):
+
+        return np.sum(self._times ** 2 * self._discounted_amounts(yield_rates), axis=-1)
+
+    def key_rate_durations(self, libor_curve: LiborCurve):
+        """
+        :return: key-rate durations of shape (bonds, curve points)
+        """
+        return key_rate_durations(self._times, self._amounts, libor_curve)
+
+    def analytics(self, prices, libor_curve: AbsCurve, **solver_kwargs) -> BondAnalytics:
+        yield_rates = self.price_to_yield(prices, **solver_kwargs)
+
+        discounted_amounts = self._discounted_amounts(yield_rates)
+
+        return BondAnalytics(yield_rate=yield_rates, z_spread=self.z_spread(prices, libor_curve, **solver_kwargs),
+                             duration=np.sum(self._times * discounted_amounts, axis=-1),
+                             convexity=np.sum(self._times ** 2 * discounted_amounts, axis=-1))
+
+    def _discounted_amounts(self, yield_rates):
+
+        return self._amounts * np.exp(-1 * self._times * np.asarray(yield_rates)[:, None])
+
+    def _curve_discounted_amounts(self, libor_curve: AbsCurve):
+
+        return self._amounts * libor_curve.interpolate_discount_factor(self._times)
+
+    def _solve_rate(self, discounted_amounts: np.ndarray, prices, tolerance=1E-12, max_iterations=50):
+        """
+        Solves sum(c * exp(-t * x)) = price for x on every bond, the left hand side is decreasing and convex in x so
+        Newton converges from any start; converged bonds are masked out of later iterations
+        :return: rates, nan for bonds that did not converge
+        """
+        prices = np.broadcast_to(np.asarray(prices, dtype=float), (len(self._bonds),))
+
+        rates = np.zeros(len(self._bonds))
+
+        active = np.ones(len(self._bonds), dtype=bool)
+
+        for _ in range(max_iterations):
+            if not active.any():
+                break
+
+            i = np.flatnonzero(active)
+
+            weighted = discounted_amounts[i] * np.exp(-1 * self._times[i] * rates[i][:, None])
+
+            step = (np.sum(weighted, axis=-1) - prices[i]) / -np.sum(self._times[i] * weighted, axis=-1)
+
+            rates[i] -= step
+
+            active[i] = ~(np.abs(step) <= tolerance)
+
+        return np.where(active, np.nan, rates)
+
+    @property
+    def bonds(self):
+        return self._bonds
+
+    @property
+    def times(self):
+        return self._times
+
+    @property
+    def amounts(self):
+        return self._amounts
@@ -1,7 +1,9 @@
 from math import exp
 
+import numpy as np
 from scipy.optimize import newton
 
+from product.bond.key_rate_duration import key_rate_durations
 from utils.enum import CashFlowFrequency
 from yield_curve.libor_curve import LiborCurve
 
@@ -20,15 +22,33 @@ class FixedRateBond:
 
         value = self.notional * exp(-1 * self.maturity * (libor_curve.interpolate_curve(self.maturity) + applied_z_spread))
 
-        for i in range(1, self.num_coupon_payments + 1):
-            t = i * self.coupon_period
+        t = np.arange(1, self.num_coupon_payments + 1) * self.coupon_period
 
-            ir_yield = libor_curve.interpolate_curve(t)
+        ir_yield = libor_curve.interpolate_curve(t)
 
-            value += coupon_amount * exp(-1 * t * (ir_yield + applied_z_spread))
+        value += coupon_amount * np.sum(np.exp(-1 * t * (ir_yield + applied_z_spread)))
 
         return value
 
+    def cash_flows(self):
+        coupon_amount = self.notional * self.coupon_rate * self.coupon_period
+
+        times = np.append(np.arange(1, self.num_coupon_payments + 1) * self.coupon_period, self.maturity)
+
+        amounts = np.append(np.full(self.num_coupon_payments, coupon_amount), self.notional)
+
+        return times, amounts
+
+    def key_rate_durations(self, libor_curve: LiborCurve):
+        """
+        Key-rate durations keyed by curve point time
+        """
+        times, amounts = self.cash_flows()
+
+        durations = key_rate_durations(times[None, :], amounts[None, :], libor_curve)[0]
+
+        return dict(zip(libor_curve.curve_times, durations))
+
     def yield_to_price(self, yield_rate: float):
         coupon_amount = self.notional * self.coupon_rate * self.coupon_period
 
@@ -0,0 +1,21 @@
+import numpy as np
+
+from yield_curve.libor_curve import LiborCurve
+
+
+def key_rate_durations(times: np.ndarray, amounts: np.ndarray, libor_curve: LiborCurve) -> np.ndarray:
+    """
+    Key-rate durations -(1/P) dP/ds against the curve's spot rates, from the cash flows and the curve's interpolation
+    weights instead of one rebuilt curve per node
+    :param times: cash flow times of shape (bonds, cash flows), padded entries having zero amount
+    :param amounts: cash flow amounts of the same shape
+    :return: array of shape (bonds, curve points)
+    """
+    discounted_amounts = amounts * libor_curve.interpolate_discount_factor(times)
+
+    # dP/ds_j = -sum_k t_k a_k D(t_k) w_kj
+    time_weighted = times * discounted_amounts
+
+    node_sensitivities = np.einsum('bk,bkj->bj', time_weighted, libor_curve.interpolation_weights(times))
+
+    return node_sensitivities / np.sum(discounted_amounts, axis=-1)[:, None]
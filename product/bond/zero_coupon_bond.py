@@ -1,7 +1,9 @@
 from math import exp
 
+import numpy as np
 from scipy.optimize import newton
 
+from product.bond.key_rate_duration import key_rate_durations
 from yield_curve.libor_curve import LiborCurve
 
 
@@ -16,6 +18,19 @@ class ZeroCouponBond:
 
         return value
 
+    def cash_flows(self):
+        return np.array([self.maturity]), np.array([self.notional])
+
+    def key_rate_durations(self, libor_curve: LiborCurve):
+        """
+        Key-rate durations keyed by curve point time
+        """
+        times, amounts = self.cash_flows()
+
+        durations = key_rate_durations(times[None, :], amounts[None, :], libor_curve)[0]
+
+        return dict(zip(libor_curve.curve_times, durations))
+
     def yield_to_price(self, yield_rate: float):
 
         return self.notional * exp(-1 * self.maturity * yield_rate)
@@ -1,8 +1,14 @@
+from functools import partial
+
+import numpy as np
+
+from model.hull_white_tree import HullWhiteTree
 from product.interest_rate_swap import InterestRateSwap
 from product.interest_rate_swaption import InterestRateSwaption
 from utils.enum import CashFlowFrequency, PayerReceiver, LongShort
 from vol_surface.swaption_vol_surface.abs_swaption_surface import AbsSwaptionSurface
 from yield_curve.libor_curve import LiborCurve
+from yield_curve.risk_ladder import curve_risk_ladder
 
 class CancellableSwap:
 
@@ -41,45 +47,70 @@ class CancellableSwap:
         return self._underlying_swap.present_value(libor_curve) + self._offsetting_swaption.present_value(libor_curve,
                                                                                                           swaption_vol_surface)
 
-    def first_order_curve_risk(self, libor_curve: LiborCurve, swaption_vol_surface):
-        risk_map = dict()
+    def bermudan_present_value(self, libor_curve: LiborCurve, hull_white_tree: HullWhiteTree):
+        """
+        Present value with the cancellation right exercisable on every coupon date from the termination date
+        """
+        swaption = self._offsetting_swaption
 
-        bumped_curve_map = libor_curve.bump_curve_by_instrument()
+        underlying_swap = swaption.underlying_swap
 
-        npv = self.present_value(libor_curve, swaption_vol_surface)
+        option_value = hull_white_tree.bermudan_swaption_value(
+            libor_curve, self._cancellation_times(), underlying_swap.start_time + underlying_swap.maturity,
+            swaption.strike, underlying_swap.cash_flow_frequency, swaption.payer_receiver)
 
-        for node, bumped_curve in bumped_curve_map.items():
-            risk_map[node] = self.present_value(bumped_curve, swaption_vol_surface) - npv
+        return (self._underlying_swap.present_value(libor_curve)
+                + swaption.long_short * swaption.notional * option_value)
 
-        return risk_map
+    def calibrate_hull_white_tree(self, libor_curve: LiborCurve, swaption_vol_surface: AbsSwaptionSurface,
+                                  mean_reversion: float = 0.1, steps_per_period: int = 4):
+        """
+        Hull-White tree calibrated to the co-terminal swaptions of the cancellation dates at the swap rate
+        """
+        swaption = self._offsetting_swaption
 
-    def gamma_curve_risk(self, libor_curve: LiborCurve, swaption_vol_surface):
+        underlying_swap = swaption.underlying_swap
 
-        npv_1_map = dict()
+        return HullWhiteTree.calibrate(libor_curve, swaption_vol_surface, self._cancellation_times(),
+                                       underlying_swap.start_time + underlying_swap.maturity, swaption.strike,
+                                       underlying_swap.cash_flow_frequency, swaption.payer_receiver, mean_reversion,
+                                       steps_per_period)
 
-        bumped_1_curve_map = libor_curve.bump_curve_by_instrument(n_bps_bump=1)
+    def bermudan_first_order_curve_risk(self, libor_curve: LiborCurve, hull_white_tree: HullWhiteTree):
+        risk_map = dict()
 
-        npv_0 = self.present_value(libor_curve, swaption_vol_surface)
+        npv = self.bermudan_present_value(libor_curve, hull_white_tree)
 
-        for node, bumped_curve in bumped_1_curve_map.items():
-            npv_1_map[node] = self.present_value(bumped_curve, swaption_vol_surface)
+        # the tree geometry is shared by every bumped curve, only its drift is refitted
+        for node, bumped_curve in libor_curve.bump_curve_by_instrument().items():
+            risk_map[node] = self.bermudan_present_value(bumped_curve, hull_white_tree) - npv
 
-        npv_2_map = dict()
+        return risk_map
 
-        bumped_2_curve_map = libor_curve.bump_curve_by_instrument(n_bps_bump=2)
+    def _cancellation_times(self):
+        underlying_swap = self._offsetting_swaption.underlying_swap
 
-        for node, bumped_curve in bumped_2_curve_map.items():
-            npv_2_map[node] = self.present_value(bumped_curve, swaption_vol_surface)
+        m = int(underlying_swap.cash_flow_frequency)
 
-        assert set(npv_1_map.keys()) == set(npv_2_map.keys())
+        return self._termination_date + np.arange(round(underlying_swap.maturity * m)) / m
 
-        delta_1_map = {node: npv_2_map[node] - npv_1_map[node] for node in npv_1_map.keys()}
+    def first_order_curve_risk(self, libor_curve: LiborCurve, swaption_vol_surface):
+        risk_map = dict()
 
-        delta_0_map = {node: npv_1 - npv_0 for node, npv_1 in npv_1_map.items()}
+        bumped_curve_map = libor_curve.bump_curve_by_instrument()
 
-        gamma_map = {node: delta_1_map[node] - delta_0_map[node] for node in delta_0_map.keys()}
+        npv = self.present_value(libor_curve, swaption_vol_surface)
 
-        return gamma_map
+        for node, bumped_curve in bumped_curve_map.items():
+            risk_map[node] = self.present_value(bumped_curve, swaption_vol_surface) - npv
+
+        return risk_map
+
+    def gamma_curve_risk(self, libor_curve: LiborCurve, swaption_vol_surface):
+
+        ladder = curve_risk_ladder(partial(self.present_value, swaption_vol_surface=swaption_vol_surface), libor_curve)
+
+        return ladder.gamma[1]
 
     def surface_vega_risk(self, libor_curve, swaption_vol_surface: AbsSwaptionSurface):
 
@@ -93,3 +124,15 @@ class CancellableSwap:
             npv_map[expiry_tenor_tuple] = bump_npv - npv
 
         return npv_map
+
+    @property
+    def underlying_swap(self):
+        return self._underlying_swap
+
+    @property
+    def offsetting_swaption(self):
+        return self._offsetting_swaption
+
+    @property
+    def termination_date(self):
+        return self._termination_date
@@ -1,8 +1,14 @@
+from dataclasses import astuple
 from math import log, sqrt
+from typing import Dict, List
 
+import numpy as np
 from scipy.stats import norm
 
 from product.interest_rate_swap import InterestRateSwap
+from utils.black_model import (BlackGreeks, black_delta, black_gamma, black_implied_vol, black_price, black_theta,
+                                black_vega)
+from utils.constants import BASIS_POINT_CONVERSION
 from utils.enum import CapFloor, LongShort, CashFlowFrequency
 from vol_surface.cap_vol_surface.abs_cap_surface import AbsCapSurface
 from yield_curve.abs_curve import AbsCurve
@@ -27,21 +33,16 @@ class Cap:
 
         assert round(12 * maturity) % payment_frequency == 0, maturity
 
+        self._payment_frequency = payment_frequency
+
         # time between reset date and payoff date
         self._period = 1 / payment_frequency
 
-        self._reset_dates = []
-        i = 1
-
-        while round(self._period * i) < self._maturity:
-            self._reset_dates.append(self._period * i)
-
-            i += 1
+        reset_dates, reset_mask = self.reset_date_schedules(np.array([maturity]), np.array([self._period]))
 
-        self._caplets = []
+        self._reset_dates = reset_dates[0, reset_mask[0]]
 
-        for reset_date in self._reset_dates:
-            self._caplets.append(self.build_caplet(reset_date))
+        self._payoff_dates = self._reset_dates + self._period
 
     @classmethod
     def get_par_cap(cls, libor_curve: LiborCurve, notional: float, maturity: float,
@@ -58,14 +59,256 @@ class Cap:
 
     def present_value(self, libor_curve: LiborCurve, vol_surface: AbsCapSurface):
 
-        volatility = vol_surface.interpolate_vol(self._maturity)
+        volatilities = vol_surface.caplet_vols(self._maturity, self._reset_dates)
+
+        caplet_values = self._caplet_present_values(libor_curve, self._notional, self._strike_rate, volatilities,
+                                                    self._reset_dates, self._period, float(self._long_short),
+                                                    float(self._cap_floor))
+
+        return np.sum(caplet_values, axis=-1)
+
+    @classmethod
+    def present_value_batch(cls, libor_curve: AbsCurve, vol_surface: AbsCapSurface, notionals, strike_rates,
+                            maturities, payment_frequencies, cap_floors=CapFloor.CAP, long_shorts=LongShort.LONG):
+        """
+        Prices a book of caps and floors given as arrays, scalar arguments are broadcast across the book. The caplet
+        schedules are padded to the longest cap and all caplets are priced in one Black evaluation
+        :return: array of present values, of shape (caps,) or (curves, caps) for a CurveSet
+        """
+        maturities = np.atleast_1d(np.asarray(maturities, dtype=float))
+
+        periods = 1 / np.broadcast_to(np.asarray(payment_frequencies, dtype=float), maturities.shape)
+
+        reset_dates, reset_mask = cls.reset_date_schedules(maturities, periods)
+
+        volatilities = vol_surface.caplet_vols(maturities[:, None], reset_dates)
 
-        pv = 0
+        cap_floors = np.broadcast_to(np.asarray(cap_floors, dtype=float), maturities.shape)
 
-        for caplet in self._caplets:
-            pv += caplet.present_value(libor_curve, volatility)
+        long_shorts = np.asarray(long_shorts, dtype=float)
 
-        return pv
+        caplet_values = cls._caplet_present_values(
+            libor_curve, np.asarray(notionals, dtype=float)[..., None], np.asarray(strike_rates, dtype=float)[..., None],
+            volatilities, reset_dates, periods[:, None],
+            np.broadcast_to(long_shorts, maturities.shape)[:, None], cap_floors[:, None]
+        )
+
+        return np.sum(np.where(reset_mask, caplet_values, 0), axis=-1)
+
+    @classmethod
+    def implied_vol_batch(cls, libor_curve: AbsCurve, premiums, notionals, strike_rates, maturities,
+                          payment_frequencies, cap_floors=CapFloor.CAP, **solver_kwargs):
+        """
+        Flat Black vols implied from the premiums of long caps or floors, every caplet of a cap sharing the vol
+        """
+        maturities = np.atleast_1d(np.asarray(maturities, dtype=float))
+
+        periods = 1 / np.broadcast_to(np.asarray(payment_frequencies, dtype=float), maturities.shape)
+
+        reset_dates, reset_mask = cls.reset_date_schedules(maturities, periods)
+
+        forward_rates = libor_curve.interpolate_forward_rate(reset_dates, periods[:, None])
+
+        weights = (np.abs(np.asarray(notionals, dtype=float))[..., None] * periods[:, None]
+                   * libor_curve.interpolate_discount_factor(reset_dates + periods[:, None]))
+
+        return black_implied_vol(premiums, np.where(reset_mask, weights, 0), forward_rates,
+                                 np.asarray(strike_rates, dtype=float)[..., None], reset_dates,
+                                 np.asarray(cap_floors, dtype=float)[..., None], **solver_kwargs)
+
+    @classmethod
+    def present_value_book(cls, caps: List['Cap'], libor_curve: AbsCurve, vol_surface: AbsCapSurface):
+
+        return cls.present_value_batch(libor_curve, vol_surface,
+                                       [cap.notional for cap in caps],
+                                       [cap.strike_rate for cap in caps],
+                                       [cap.maturity for cap in caps],
+                                       [int(cap.payment_frequency) for cap in caps],
+                                       [int(cap.cap_floor) for cap in caps],
+                                       [int(cap.long_short) for cap in caps])
+
+    @classmethod
+    def greeks_batch(cls, libor_curve: AbsCurve, vol_surface: AbsCapSurface, notionals, strike_rates, maturities,
+                     payment_frequencies, cap_floors=CapFloor.CAP, long_shorts=LongShort.LONG) -> BlackGreeks:
+        """
+        Black values of a book of caps and floors with the greeks summed over their caplets, i.e. delta and gamma to
+        a parallel move of the caplet forwards and vega to a parallel move of the caplet vols
+        """
+        caplet_greeks, _ = cls._caplet_greeks(libor_curve, vol_surface, notionals, strike_rates, maturities,
+                                              payment_frequencies, cap_floors, long_shorts)
+
+        return BlackGreeks(*(np.sum(values, axis=-1) for values in astuple(caplet_greeks)))
+
+    @classmethod
+    def curve_sensitivities_batch(cls, libor_curve: LiborCurve, vol_surface: AbsCapSurface, notionals, strike_rates,
+                                  maturities, payment_frequencies, cap_floors=CapFloor.CAP,
+                                  long_shorts=LongShort.LONG) -> np.ndarray:
+        """
+        First order sensitivities of a book of caps and floors to the curve's spot rates, from the caplet greeks and
+        the interpolation weights of the curve, the vol surface is only read
+        :return: d(value) / d(spot rate) of shape (caps, curve points)
+        """
+        caplet_greeks, (reset_dates, periods, _) = cls._caplet_greeks(
+            libor_curve, vol_surface, notionals, strike_rates, maturities, payment_frequencies, cap_floors,
+            long_shorts)
+
+        return np.sum(cls._caplet_curve_sensitivities(libor_curve, caplet_greeks, reset_dates, periods), axis=1)
+
+    @classmethod
+    def node_sensitivities_batch(cls, libor_curve: LiborCurve, vol_surface: AbsCapSurface, notionals, strike_rates,
+                                 maturities, payment_frequencies, cap_floors=CapFloor.CAP, long_shorts=LongShort.LONG):
+        """
+        First order sensitivities of a book of caps and floors to the curve's spot rates and to the vol surface's
+        nodes, from the caplet greeks and the interpolation weights of the curve and the surface
+        :return: d(value) / d(spot rate) of shape (caps, curve points) and d(value) / d(vol) of shape (caps, nodes)
+        """
+        maturities = np.atleast_1d(np.asarray(maturities, dtype=float))
+
+        caplet_greeks, (reset_dates, periods, reset_mask) = cls._caplet_greeks(
+            libor_curve, vol_surface, notionals, strike_rates, maturities, payment_frequencies, cap_floors,
+            long_shorts)
+
+        caplet_curve_sensitivities = cls._caplet_curve_sensitivities(libor_curve, caplet_greeks, reset_dates, periods)
+
+        caplet_vol_sensitivities = caplet_greeks.vega[..., None] * vol_surface.caplet_vol_weights(maturities[:, None],
+                                                                                                 reset_dates)
+
+        return (np.sum(caplet_curve_sensitivities, axis=1),
+                np.sum(np.where(reset_mask[..., None], caplet_vol_sensitivities, 0), axis=1))
+
+    @staticmethod
+    def _caplet_curve_sensitivities(libor_curve: LiborCurve, caplet_greeks: BlackGreeks, reset_dates: np.ndarray,
+                                    periods: np.ndarray) -> np.ndarray:
+        payoff_dates = reset_dates + periods
+
+        reset_weights = libor_curve.interpolation_weights(reset_dates)
+
+        payoff_weights = libor_curve.interpolation_weights(payoff_dates)
+
+        # value = l tau D(T_b) B(F) with D(T_b) = exp(-s_b T_b) and F = (s_b T_b - s_a T_a) / tau
+        return ((-1 * payoff_dates * caplet_greeks.present_value)[..., None] * payoff_weights
+                + (caplet_greeks.delta / periods)[..., None] * (payoff_dates[..., None] * payoff_weights
+                                                                - reset_dates[..., None] * reset_weights))
+
+    @classmethod
+    def _caplet_greeks(cls, libor_curve: AbsCurve, vol_surface: AbsCapSurface, notionals, strike_rates, maturities,
+                       payment_frequencies, cap_floors, long_shorts):
+        """
+        :return: greeks of every caplet of shape (caps, max resets), zero on the padding, and the reset dates,
+        periods and validity mask of the padded schedules
+        """
+        maturities = np.atleast_1d(np.asarray(maturities, dtype=float))
+
+        periods = 1 / np.broadcast_to(np.asarray(payment_frequencies, dtype=float), maturities.shape)
+
+        reset_dates, reset_mask = cls.reset_date_schedules(maturities, periods)
+
+        periods = periods[:, None]
+
+        volatilities = vol_surface.caplet_vols(maturities[:, None], reset_dates)
+
+        forward_rates = libor_curve.interpolate_forward_rate(reset_dates, periods)
+
+        strike_rates = np.asarray(strike_rates, dtype=float)[..., None]
+
+        option_types = np.broadcast_to(np.asarray(cap_floors, dtype=float), maturities.shape)[:, None]
+
+        l = np.where(reset_mask, (np.asarray(notionals, dtype=float) * np.asarray(long_shorts, dtype=float))[..., None]
+                     * periods * libor_curve.interpolate_discount_factor(reset_dates + periods), 0)
+
+        caplet_greeks = BlackGreeks(
+            present_value=l * black_price(forward_rates, strike_rates, volatilities, reset_dates, option_types),
+            delta=l * black_delta(forward_rates, strike_rates, volatilities, reset_dates, option_types),
+            gamma=l * black_gamma(forward_rates, strike_rates, volatilities, reset_dates),
+            vega=l * black_vega(forward_rates, strike_rates, volatilities, reset_dates),
+            theta=l * black_theta(forward_rates, strike_rates, volatilities, reset_dates)
+        )
+
+        return caplet_greeks, (reset_dates, periods, reset_mask)
+
+    @staticmethod
+    def reset_date_schedules(maturities: np.ndarray, periods: np.ndarray):
+        """
+        Reset dates of each cap padded to the longest schedule, a cap resets every period while the rounded reset
+        date is before its maturity
+        :return: reset dates and validity mask, both of shape (caps, max resets)
+        """
+        max_resets = int(np.max(np.ceil((maturities + 1) / periods)))
+
+        reset_dates = periods[:, None] * np.arange(1, max_resets + 1)
+
+        return reset_dates, np.round(reset_dates) < maturities[:, None]
+
+    @staticmethod
+    def _caplet_present_values(libor_curve: AbsCurve, notionals, strike_rates, volatilities, reset_dates, periods,
+                               long_shorts, cap_floors):
+        forward_rates = libor_curve.interpolate_forward_rate(reset_dates, periods)
+
+        notional_product = long_shorts * notionals * periods * libor_curve.interpolate_discount_factor(reset_dates + periods)
+
+        return notional_product * black_price(forward_rates, strike_rates, volatilities, reset_dates, cap_floors)
+
+    def greeks(self, libor_curve: AbsCurve, vol_surface: AbsCapSurface) -> BlackGreeks:
+
+        return BlackGreeks(*(float(value[0]) for value in astuple(self.greeks_batch(
+            libor_curve, vol_surface, self._notional, self._strike_rate, self._maturity, int(self._payment_frequency),
+            int(self._cap_floor), int(self._long_short)))))
+
+    def analytic_curve_risk(self, libor_curve: LiborCurve, vol_surface: AbsCapSurface,
+                            n_bps_bump=1) -> Dict[str, float]:
+        """
+        First order equivalent of repricing on every curve of bump_curve_by_instrument
+        """
+        curve_sensitivities = self.curve_sensitivities_batch(
+            libor_curve, vol_surface, self._notional, self._strike_rate, self._maturity, int(self._payment_frequency),
+            int(self._cap_floor), int(self._long_short))
+
+        return libor_curve.instrument_risk(curve_sensitivities[0], n_bps_bump)
+
+    def analytic_vega_risk(self, libor_curve: LiborCurve, vol_surface: AbsCapSurface,
+                           n_bps_bump=1) -> Dict[float, float]:
+        """
+        First order equivalent of repricing on every surface of the cap vol surface's bump_surface, keyed by expiry
+        """
+        _, vol_sensitivities = self.node_sensitivities_batch(
+            libor_curve, vol_surface, self._notional, self._strike_rate, self._maturity, int(self._payment_frequency),
+            int(self._cap_floor), int(self._long_short))
+
+        risk = vol_sensitivities[0] * n_bps_bump * BASIS_POINT_CONVERSION ** 2
+
+        return {float(expiry): vega for expiry, vega in zip(vol_surface.expiries, risk)}
+
+    @property
+    def notional(self):
+        return self._notional
+
+    @property
+    def strike_rate(self):
+        return self._strike_rate
+
+    @property
+    def maturity(self):
+        return self._maturity
+
+    @property
+    def payment_frequency(self):
+        return self._payment_frequency
+
+    @property
+    def cap_floor(self):
+        return self._cap_floor
+
+    @property
+    def long_short(self):
+        return self._long_short
+
+    @property
+    def reset_dates(self):
+        return self._reset_dates
+
+    @property
+    def payoff_dates(self):
+        return self._payoff_dates
 
     @staticmethod
     def _calc_par_rate(notional: float, maturity: float, libor_curve: LiborCurve, payment_frequency: CashFlowFrequency):
@@ -109,3 +352,20 @@ class Caplet:
 
         return notional_product * (forward_rate * norm.cdf(d1 * float(self._cap_floor)) - self._strike_rate * norm.cdf(
             d2 * float(self._cap_floor)))
+
+    def greeks(self, libor_curve: AbsCurve, volatility: float) -> BlackGreeks:
+        forward_rate = libor_curve.interpolate_forward_rate(self._reset_date, self._period)
+
+        l = (self._notional * self._period * libor_curve.interpolate_discount_factor(self._payoff_date)
+             * float(self._long_short))
+
+        option_type = float(self._cap_floor)
+
+        return BlackGreeks(
+            present_value=float(l * black_price(forward_rate, self._strike_rate, volatility, self._reset_date,
+                                                option_type)),
+            delta=float(l * black_delta(forward_rate, self._strike_rate, volatility, self._reset_date, option_type)),
+            gamma=float(l * black_gamma(forward_rate, self._strike_rate, volatility, self._reset_date)),
+            vega=float(l * black_vega(forward_rate, self._strike_rate, volatility, self._reset_date)),
+            theta=float(l * black_theta(forward_rate, self._strike_rate, volatility, self._reset_date))
+        )
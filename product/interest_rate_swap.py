@@ -1,5 +1,7 @@
 from typing import List
 
+import numpy as np
+
 from utils.enum import CashFlowFrequency, CompoundingType, PayerReceiver, SwapLegType
 from yield_curve.abs_curve import AbsCurve
 from dataclasses import dataclass
@@ -45,12 +47,28 @@ class InterestRateSwap:
 
         fixed_cash_flow_notional = self._swap_rate * self._notional / float(self._cash_flow_frequency)
 
-        fixed_leg_value = sum(
-            [fixed_cash_flow_notional * libor_curve.interpolate_discount_factor(t) for t in self._times_of_cash_flows]
+        # summed over the last axis so a CurveSet gives one value per curve
+        fixed_leg_value = fixed_cash_flow_notional * np.sum(
+            libor_curve.interpolate_discount_factor(np.array(self._times_of_cash_flows)), axis=-1
         )
 
         return int(self._payer_receiver) * (floating_leg_value - fixed_leg_value)
 
+    def cash_flows(self):
+        """
+        Times and amounts whose discounted sum is the present value, the floating leg is replicated by the notional
+        exchanged at the start and end of the swap
+        """
+        fixed_cash_flow_notional = self._swap_rate * self._notional / float(self._cash_flow_frequency)
+
+        times = np.array([self._start_time] + self._times_of_cash_flows)
+
+        amounts = np.full(len(times), -1 * fixed_cash_flow_notional)
+        amounts[0] = self._notional
+        amounts[-1] -= self._notional
+
+        return times, int(self._payer_receiver) * amounts
+
     def par_rate(self, libor_curve: AbsCurve):
 
         return self._calc_par_rate(libor_curve, self._times_of_cash_flows, self._maturity, self._start_time,
@@ -122,9 +140,7 @@ class InterestRateSwap:
 
         end_time = start_time + maturity
 
-        discount_factor_sum = sum(
-            [libor_curve.interpolate_discount_factor(t) for t in times_of_cash_flows]
-        )
+        discount_factor_sum = np.sum(libor_curve.interpolate_discount_factor(np.array(times_of_cash_flows)), axis=-1)
 
         d_range = libor_curve.interpolate_discount_factor(start_time) - libor_curve.interpolate_discount_factor(
             end_time)
@@ -141,16 +157,14 @@ class InterestRateSwap:
         return bumped_npv - npv
 
     def first_order_curve_risk(self, libor_curve: AbsCurve):
-        risk_map = dict()
-
-        bumped_curve_map = libor_curve.bump_curve_by_instrument()
+        bumped_curve_set = libor_curve.bump_curve_by_instrument()
 
         npv = self.present_value(libor_curve)
 
-        for node, bumped_curve in bumped_curve_map.items():
-            risk_map[node] = self.present_value(bumped_curve) - npv
+        # all bumped curves are priced in one pass
+        bumped_npvs = self.present_value(bumped_curve_set)
 
-        return risk_map
+        return dict(zip(bumped_curve_set.names, bumped_npvs - npv))
 
     @property
     def start_time(self):
@@ -1,12 +1,20 @@
+from dataclasses import astuple
+from functools import partial
 from math import log, sqrt
+from typing import Dict, List
 
+import numpy as np
 from scipy.stats import norm
 
 from product.interest_rate_swap import InterestRateSwap
+from utils.black_model import (BlackGreeks, black_delta, black_gamma, black_implied_vol, black_price, black_theta,
+                                black_vega)
+from utils.constants import BASIS_POINT_CONVERSION
 from utils.enum import CashFlowFrequency, PayerReceiver, LongShort
 from vol_surface.swaption_vol_surface.abs_swaption_surface import AbsSwaptionSurface
 from yield_curve.abs_curve import AbsCurve
 from yield_curve.libor_curve import LiborCurve
+from yield_curve.risk_ladder import curve_risk_ladder
 
 
 class InterestRateSwaption:
@@ -40,22 +48,238 @@ class InterestRateSwaption:
 
         s_0 = self._underlying_swap.par_rate(libor_curve)
 
-        s_k = self._strike
+        vol = swaption_vol_surface.interpolate_vol(self._swaption_expiry, self._swap_tenor_years, self._strike - s_0)
 
-        vol = swaption_vol_surface.interpolate_vol(self._swaption_expiry, self._swap_tenor_years)
+        m = int(self._underlying_swap.cash_flow_frequency)
 
-        d_1 = (log(s_0 / s_k) + 0.5 * self._swaption_expiry * vol ** 2) / (vol * sqrt(self._swaption_expiry))
+        a = (1 / m) * np.sum(
+            libor_curve.interpolate_discount_factor(np.array(self._underlying_swap.times_of_cash_flows)), axis=-1)
 
-        d_2 = d_1 - vol * sqrt(self._swaption_expiry)
+        l = self._notional * self._long_short
 
-        m = int(self._underlying_swap.cash_flow_frequency)
+        return l * a * black_price(s_0, self._strike, vol, self._swaption_expiry, int(self._payer_receiver))
 
-        a = (1 / m) * sum(
-            [libor_curve.interpolate_discount_factor(t) for t in self._underlying_swap.times_of_cash_flows])
+    @staticmethod
+    def present_value_batch(libor_curve: AbsCurve, swaption_vol_surface: AbsSwaptionSurface, notionals, strikes,
+                            swaption_expiries, swap_tenors_years, swap_cash_flow_frequencies, swap_payer_receivers,
+                            long_shorts=LongShort.LONG):
+        """
+        Black prices of a book of swaptions given as arrays, scalar arguments are broadcast across the book
+        :return: array of present values, of shape (swaptions,) or (curves, swaptions) for a CurveSet
+        """
+        expiries = np.atleast_1d(np.asarray(swaption_expiries, dtype=float))
 
-        l = self._notional * self._long_short * self._payer_receiver
+        tenors = np.broadcast_to(np.asarray(swap_tenors_years, dtype=float), expiries.shape)
+
+        forward_swap_rates, annuities = InterestRateSwaption._forward_swap_rates_and_annuities(
+            libor_curve, expiries, tenors, swap_cash_flow_frequencies)
+
+        strikes = np.asarray(strikes, dtype=float)
+
+        vols = swaption_vol_surface.interpolate_vol(expiries, tenors, strikes - forward_swap_rates)
+
+        l = np.asarray(notionals, dtype=float) * np.asarray(long_shorts, dtype=float)
+
+        option_types = np.asarray(swap_payer_receivers, dtype=float)
+
+        return l * annuities * black_price(forward_swap_rates, strikes, vols, expiries, option_types)
+
+    @staticmethod
+    def implied_vol_batch(libor_curve: AbsCurve, premiums, notionals, strikes, swaption_expiries, swap_tenors_years,
+                          swap_cash_flow_frequencies, swap_payer_receivers, **solver_kwargs):
+        """
+        Black vols implied from the premiums of long swaptions, scalar arguments are broadcast across the premiums
+        :param strikes: None for at-the-money swaptions
+        """
+        expiries = np.atleast_1d(np.asarray(swaption_expiries, dtype=float))
+
+        tenors = np.broadcast_to(np.asarray(swap_tenors_years, dtype=float), expiries.shape)
+
+        forward_swap_rates, annuities = InterestRateSwaption._forward_swap_rates_and_annuities(
+            libor_curve, expiries, tenors, swap_cash_flow_frequencies)
+
+        if strikes is None:
+            strikes = forward_swap_rates
+
+        return black_implied_vol(premiums, np.abs(np.asarray(notionals, dtype=float)) * annuities, forward_swap_rates,
+                                 strikes, expiries, swap_payer_receivers, **solver_kwargs)
+
+    @staticmethod
+    def greeks_batch(libor_curve: AbsCurve, swaption_vol_surface: AbsSwaptionSurface, notionals, strikes,
+                     swaption_expiries, swap_tenors_years, swap_cash_flow_frequencies, swap_payer_receivers,
+                     long_shorts=LongShort.LONG) -> BlackGreeks:
+        """
+        Black values of a book of swaptions with their delta and gamma to the forward swap rate, vega and theta,
+        all from one evaluation and holding the annuity fixed. The vol is read at the strike offset, so the delta
+        also carries the vega times the move of the vol along the smile as the forward moves against a fixed strike,
+        the gamma is taken at a fixed vol
+        """
+        expiries = np.atleast_1d(np.asarray(swaption_expiries, dtype=float))
+
+        tenors = np.broadcast_to(np.asarray(swap_tenors_years, dtype=float), expiries.shape)
+
+        forward_swap_rates, annuities = InterestRateSwaption._forward_swap_rates_and_annuities(
+            libor_curve, expiries, tenors, swap_cash_flow_frequencies)
+
+        strikes = np.asarray(strikes, dtype=float)
+
+        strike_offsets = strikes - forward_swap_rates
+
+        vols = swaption_vol_surface.interpolate_vol(expiries, tenors, strike_offsets)
+
+        # d(vol) / d(strike offset) by a central difference of one basis point along the smile
+        h = BASIS_POINT_CONVERSION ** 2
+
+        smile_slopes = (swaption_vol_surface.interpolate_vol(expiries, tenors, strike_offsets + h)
+                        - swaption_vol_surface.interpolate_vol(expiries, tenors, strike_offsets - h)) / (2 * h)
+
+        option_types = np.asarray(swap_payer_receivers, dtype=float)
+
+        l = np.asarray(notionals, dtype=float) * np.asarray(long_shorts, dtype=float) * annuities
+
+        vegas = black_vega(forward_swap_rates, strikes, vols, expiries)
+
+        return BlackGreeks(
+            present_value=l * black_price(forward_swap_rates, strikes, vols, expiries, option_types),
+            delta=l * (black_delta(forward_swap_rates, strikes, vols, expiries, option_types) - vegas * smile_slopes),
+            gamma=l * black_gamma(forward_swap_rates, strikes, vols, expiries),
+            vega=l * vegas,
+            theta=l * black_theta(forward_swap_rates, strikes, vols, expiries)
+        )
+
+    @staticmethod
+    def curve_sensitivities_batch(libor_curve: LiborCurve, swaption_vol_surface: AbsSwaptionSurface, notionals,
+                                  strikes, swaption_expiries, swap_tenors_years, swap_cash_flow_frequencies,
+                                  swap_payer_receivers, long_shorts=LongShort.LONG) -> np.ndarray:
+        """
+        First order sensitivities of a book of swaptions to the curve's spot rates, from the Black greeks and the
+        interpolation weights of the curve, the vol surface is only read
+        :return: d(value) / d(spot rate) of shape (swaptions, curve points)
+        """
+        expiries = np.atleast_1d(np.asarray(swaption_expiries, dtype=float))
+
+        tenors = np.broadcast_to(np.asarray(swap_tenors_years, dtype=float), expiries.shape)
+
+        greeks = InterestRateSwaption.greeks_batch(libor_curve, swaption_vol_surface, notionals, strikes, expiries,
+                                                   tenors, swap_cash_flow_frequencies, swap_payer_receivers,
+                                                   long_shorts)
+
+        return InterestRateSwaption._curve_sensitivities(libor_curve, greeks, expiries, tenors,
+                                                         swap_cash_flow_frequencies)
+
+    @staticmethod
+    def node_sensitivities_batch(libor_curve: LiborCurve, swaption_vol_surface: AbsSwaptionSurface, notionals,
+                                 strikes, swaption_expiries, swap_tenors_years, swap_cash_flow_frequencies,
+                                 swap_payer_receivers, long_shorts=LongShort.LONG):
+        """
+        First order sensitivities of a book of swaptions to the curve's spot rates and to the vol surface's points,
+        from the Black greeks and the interpolation weights of the curve and the surface
+        :return: d(value) / d(spot rate) of shape (swaptions, curve points) and d(value) / d(vol) of shape
+        (swaptions, surface points)
+        """
+        expiries = np.atleast_1d(np.asarray(swaption_expiries, dtype=float))
+
+        tenors = np.broadcast_to(np.asarray(swap_tenors_years, dtype=float), expiries.shape)
+
+        greeks = InterestRateSwaption.greeks_batch(libor_curve, swaption_vol_surface, notionals, strikes, expiries,
+                                                   tenors, swap_cash_flow_frequencies, swap_payer_receivers,
+                                                   long_shorts)
+
+        curve_sensitivities = InterestRateSwaption._curve_sensitivities(libor_curve, greeks, expiries, tenors,
+                                                                        swap_cash_flow_frequencies)
+
+        vol_sensitivities = greeks.vega[:, None] * swaption_vol_surface.interpolation_weights(expiries, tenors)
 
-        return l * a * (s_0 * norm.cdf(d_1 * self._payer_receiver) - s_k * norm.cdf(d_2 * self._payer_receiver))
+        return curve_sensitivities, vol_sensitivities
+
+    @staticmethod
+    def _curve_sensitivities(libor_curve: LiborCurve, greeks: BlackGreeks, expiries: np.ndarray, tenors: np.ndarray,
+                             swap_cash_flow_frequencies) -> np.ndarray:
+
+        forward_swap_rates, annuities = InterestRateSwaption._forward_swap_rates_and_annuities(
+            libor_curve, expiries, tenors, swap_cash_flow_frequencies)
+
+        times, schedule_mask, m = InterestRateSwaption._fixed_leg_schedules(expiries, tenors,
+                                                                            swap_cash_flow_frequencies)
+
+        # d(discount factor) / d(spot rate at node j) = -t D(t) w_j(t)
+        def discount_factor_sensitivities(t):
+            return (-1 * t * libor_curve.interpolate_discount_factor(t))[..., None] * libor_curve.interpolation_weights(t)
+
+        annuity_sensitivities = np.sum(np.where(schedule_mask[..., None], discount_factor_sensitivities(times), 0),
+                                       axis=1) / m[:, None]
+
+        forward_swap_rate_sensitivities = (
+            (discount_factor_sensitivities(expiries) - discount_factor_sensitivities(expiries + tenors))
+            - forward_swap_rates[:, None] * annuity_sensitivities) / annuities[:, None]
+
+        # value = l A B(S) so dV = l B dA + l A B'(S) dS
+        return ((greeks.present_value / annuities)[:, None] * annuity_sensitivities
+                + greeks.delta[:, None] * forward_swap_rate_sensitivities)
+
+    @staticmethod
+    def forward_swap_rates_batch(libor_curve: AbsCurve, swaption_expiries, swap_tenors_years,
+                                 swap_cash_flow_frequencies) -> np.ndarray:
+
+        expiries = np.atleast_1d(np.asarray(swaption_expiries, dtype=float))
+
+        tenors = np.broadcast_to(np.asarray(swap_tenors_years, dtype=float), expiries.shape)
+
+        forward_swap_rates, _ = InterestRateSwaption._forward_swap_rates_and_annuities(
+            libor_curve, expiries, tenors, swap_cash_flow_frequencies)
+
+        return forward_swap_rates
+
+    @staticmethod
+    def _forward_swap_rates_and_annuities(libor_curve: AbsCurve, expiries: np.ndarray, tenors: np.ndarray,
+                                          swap_cash_flow_frequencies):
+
+        end_times = expiries + tenors
+
+        times, schedule_mask, m = InterestRateSwaption._fixed_leg_schedules(expiries, tenors,
+                                                                            swap_cash_flow_frequencies)
+
+        discount_factors = libor_curve.interpolate_discount_factor(times)
+
+        annuities = np.sum(np.where(schedule_mask, discount_factors, 0), axis=-1) / m
+
+        forward_swap_rates = (libor_curve.interpolate_discount_factor(expiries)
+                              - libor_curve.interpolate_discount_factor(end_times)) / annuities
+
+        return forward_swap_rates, annuities
+
+    @staticmethod
+    def _fixed_leg_schedules(expiries: np.ndarray, tenors: np.ndarray, swap_cash_flow_frequencies):
+        """
+        Fixed leg schedules padded to the longest swap, counted back from the end time as in InterestRateSwap
+        :return: payment times and validity mask of shape (swaptions, max payments), and the frequencies
+        """
+        m = np.broadcast_to(np.asarray(swap_cash_flow_frequencies, dtype=float), expiries.shape)
+
+        number_of_cash_flows = np.rint(tenors * m).astype(int)
+
+        periods_before_end = number_of_cash_flows[:, None] - 1 - np.arange(number_of_cash_flows.max())
+
+        schedule_mask = periods_before_end >= 0
+
+        times = (expiries + tenors)[:, None] - np.where(schedule_mask, periods_before_end, 0) / m[:, None]
+
+        return times, schedule_mask, m
+
+    @classmethod
+    def present_value_book(cls, swaptions: List['InterestRateSwaption'], libor_curve: AbsCurve,
+                           swaption_vol_surface: AbsSwaptionSurface):
+
+        return cls.present_value_batch(
+            libor_curve, swaption_vol_surface,
+            [swaption.notional for swaption in swaptions],
+            [swaption.strike for swaption in swaptions],
+            [swaption.swaption_expiry for swaption in swaptions],
+            [swaption.swap_tenor_years for swaption in swaptions],
+            [int(swaption.underlying_swap.cash_flow_frequency) for swaption in swaptions],
+            [int(swaption.payer_receiver) for swaption in swaptions],
+            [int(swaption.long_short) for swaption in swaptions]
+        )
 
     def cash_flow_report(self, libor_curve: LiborCurve, swaption_vol_surface: AbsSwaptionSurface):
 
@@ -63,7 +287,7 @@ class InterestRateSwaption:
 
         s_k = self._strike
 
-        vol = swaption_vol_surface.interpolate_vol(self._swaption_expiry, self._swap_tenor_years)
+        vol = swaption_vol_surface.interpolate_vol(self._swaption_expiry, self._swap_tenor_years, s_k - s_0)
 
         d_1 = (log(s_0 / s_k) + 0.5 * self._swaption_expiry * vol ** 2) / (vol * sqrt(self._swaption_expiry))
 
@@ -99,31 +323,9 @@ class InterestRateSwaption:
 
     def gamma_curve_risk(self, libor_curve: LiborCurve, swaption_vol_surface):
 
-        npv_1_map = dict()
-
-        bumped_1_curve_map = libor_curve.bump_curve_by_instrument(n_bps_bump=1)
-
-        npv_0 = self.present_value(libor_curve, swaption_vol_surface)
+        ladder = curve_risk_ladder(partial(self.present_value, swaption_vol_surface=swaption_vol_surface), libor_curve)
 
-        for node, bumped_curve in bumped_1_curve_map.items():
-            npv_1_map[node] = self.present_value(bumped_curve, swaption_vol_surface)
-
-        npv_2_map = dict()
-
-        bumped_2_curve_map = libor_curve.bump_curve_by_instrument(n_bps_bump=2)
-
-        for node, bumped_curve in bumped_2_curve_map.items():
-            npv_2_map[node] = self.present_value(bumped_curve, swaption_vol_surface)
-
-        assert set(npv_1_map.keys()) == set(npv_2_map.keys())
-
-        delta_1_map = {node: npv_2_map[node] - npv_1_map[node] for node in npv_1_map.keys()}
-
-        delta_0_map = {node: npv_1 - npv_0 for node, npv_1 in npv_1_map.items()}
-
-        gamma_map = {node: delta_1_map[node] - delta_0_map[node] for node in delta_0_map.keys()}
-
-        return gamma_map
+        return ladder.gamma[1]
 
     def surface_vega_risk(self, libor_curve, swaption_vol_surface: AbsSwaptionSurface):
 
@@ -137,3 +339,64 @@ class InterestRateSwaption:
             npv_map[expiry_tenor_tuple] = bump_npv - npv
 
         return npv_map
+
+    def greeks(self, libor_curve: AbsCurve, swaption_vol_surface: AbsSwaptionSurface) -> BlackGreeks:
+
+        return BlackGreeks(*(float(value[0]) for value in astuple(self.greeks_batch(
+            libor_curve, swaption_vol_surface, self._notional, self._strike, self._swaption_expiry,
+            self._swap_tenor_years, int(self._underlying_swap.cash_flow_frequency), int(self._payer_receiver),
+            int(self._long_short)))))
+
+    def analytic_curve_risk(self, libor_curve: LiborCurve, swaption_vol_surface: AbsSwaptionSurface,
+                            n_bps_bump=1) -> Dict[str, float]:
+        """
+        First order equivalent of first_order_curve_risk without repricing
+        """
+        curve_sensitivities = self.curve_sensitivities_batch(
+            libor_curve, swaption_vol_surface, self._notional, self._strike, self._swaption_expiry,
+            self._swap_tenor_years, int(self._underlying_swap.cash_flow_frequency), int(self._payer_receiver),
+            int(self._long_short))
+
+        return libor_curve.instrument_risk(curve_sensitivities[0], n_bps_bump)
+
+    def analytic_vega_risk(self, libor_curve: LiborCurve, swaption_vol_surface: AbsSwaptionSurface,
+                           n_bps_bump=1) -> Dict[tuple, float]:
+        """
+        First order equivalent of surface_vega_risk without repricing, keyed by (expiry, tenor) surface point
+        """
+        _, vol_sensitivities = self.node_sensitivities_batch(
+            libor_curve, swaption_vol_surface, self._notional, self._strike, self._swaption_expiry,
+            self._swap_tenor_years, int(self._underlying_swap.cash_flow_frequency), int(self._payer_receiver),
+            int(self._long_short))
+
+        risk = vol_sensitivities[0] * n_bps_bump * BASIS_POINT_CONVERSION ** 2
+
+        return {tuple(point): vega for point, vega in zip(swaption_vol_surface.points, risk)}
+
+    @property
+    def underlying_swap(self):
+        return self._underlying_swap
+
+    @property
+    def notional(self):
+        return self._notional
+
+    @property
+    def strike(self):
+        return self._strike
+
+    @property
+    def swaption_expiry(self):
+        return self._swaption_expiry
+
+    @property
+    def swap_tenor_years(self):
+        return self._swap_tenor_years
+
+    @property
+    def payer_receiver(self):
+        return self._payer_receiver
+
+    @property
+    def long_short(self):
+        return self._long_short
@@ -3,7 +3,7 @@ from setuptools import setup
 setup(
     name='quant',
     version='0.0.1',
-    packages=['utils', 'product', 'vol_surface', 'yield_curve', 'yield_curve.libor_curve_builder'],
+    packages=['utils', 'product', 'vol_surface', 'yield_curve', 'yield_curve.libor_curve_builder', 'portfolio', 'model'],
     url='',
     license='',
     author='CodeWithLuke',
@@ -1,9 +1,11 @@
+import numpy as np
 import pytest
 
+from product.bond.bond_universe import BondUniverse
 from product.bond.fixed_rate_bond import FixedRateBond
 from product.bond.zero_coupon_bond import ZeroCouponBond
 from utils.constants import UNIT_TEST_ABS_TOLERANCE, UNIT_TEST_REL_TOLERANCE
-from utils.enum import CashFlowFrequency
+from utils.enum import CashFlowFrequency, InterpolationType
 from yield_curve.libor_curve import LiborCurve
 
 
@@ -36,3 +38,72 @@ def test_bond_price_to_yield_fixed_rate():
     yield_rate = test_bond.price_to_yield(price)
 
     assert yield_rate == pytest.approx(0.07813, abs=UNIT_TEST_ABS_TOLERANCE, rel=UNIT_TEST_REL_TOLERANCE)
+
+
+# bonds of different lengths are padded, the padding must stay inside the cubic spline's range
+@pytest.mark.parametrize("interpolation_type", [InterpolationType.LINEAR, InterpolationType.CUBIC_SPLINE])
+def test_bond_universe_analytics(interpolation_type):
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate, interpolation_type)
+
+    bonds = [
+        FixedRateBond(100000, 2.5, CashFlowFrequency.SEMI_ANNUAL, 0.07),
+        FixedRateBond(10000, 4, CashFlowFrequency.QUARTERLY, 0.03),
+        FixedRateBond(10000, 1, CashFlowFrequency.ANNUAL, 0.05),
+        ZeroCouponBond(10000, 0.5),
+    ]
+
+    prices = np.array([98000, 9800, 10100, 9910])
+
+    universe = BondUniverse(bonds)
+
+    analytics = universe.analytics(prices, curve)
+
+    assert not np.any(np.isnan(analytics.z_spread))
+    assert analytics.yield_rate == pytest.approx([bond.price_to_yield(price) for bond, price in zip(bonds, prices)])
+    assert analytics.z_spread == pytest.approx(
+        [bond.z_spread(price, curve) for bond, price in zip(bonds, prices)], abs=1E-10)
+    assert analytics.duration[:3] == pytest.approx(
+        [bond.duration_from_yield(y) for bond, y in zip(bonds[:3], analytics.yield_rate)])
+    assert analytics.duration[3] == pytest.approx(bonds[3].get_bond_duration_from_yield(analytics.yield_rate[3]))
+
+    assert universe.yield_to_price(analytics.yield_rate) == pytest.approx(prices)
+    assert universe.present_value(curve, analytics.z_spread) == pytest.approx(prices)
+    assert universe.present_value(curve) == pytest.approx([bond.present_value(curve) for bond in bonds])
+
+    bump = 1E-05
+    second_difference = (universe.yield_to_price(analytics.yield_rate + bump) - 2 * prices
+                         + universe.yield_to_price(analytics.yield_rate - bump)) / bump ** 2
+
+    assert analytics.convexity == pytest.approx(second_difference, rel=1E-04)
+
+
+@pytest.mark.parametrize("interpolation_type", [InterpolationType.LINEAR, InterpolationType.CUBIC_SPLINE])
+def test_bond_key_rate_durations(interpolation_type):
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate, interpolation_type)
+
+    bonds = [FixedRateBond(10000, 3, CashFlowFrequency.SEMI_ANNUAL, 0.05), ZeroCouponBond(10000, 1.75)]
+
+    durations = BondUniverse(bonds).key_rate_durations(curve)
+
+    bump = 1E-06
+
+    for i, bond in enumerate(bonds):
+        present_value = bond.present_value(curve)
+
+        assert list(bond.key_rate_durations(curve).values()) == pytest.approx(durations[i])
+
+        for j in range(len(curve.curve_times)):
+            spot_rates = curve.spot_rates.copy()
+            spot_rates[j] += bump
+
+            bumped_curve = LiborCurve.from_arrays(curve.curve_times, spot_rates, interpolation_type)
+
+            finite_difference = -(bond.present_value(bumped_curve) - present_value) / (bump * present_value)
+
+            assert durations[i, j] == pytest.approx(finite_difference, rel=1E-04, abs=1E-08)
@@ -1,8 +1,10 @@
+import numpy as np
 import pytest
 
 from product.cancellable_swap import CancellableSwap
 from product.interest_rate_swap import InterestRateSwap
-from utils.enum import CashFlowFrequency
+from product.interest_rate_swaption import InterestRateSwaption
+from utils.enum import CashFlowFrequency, PayerReceiver
 from vol_surface.swaption_vol_surface.atm_swaption_vol_surface import AtmSwaptionVolSurface
 from yield_curve.libor_curve import LiborCurve
 
@@ -66,3 +68,56 @@ def test_cancellable_swap_gamma_risk():
     cs_obj = CancellableSwap(1000000, par_swap.swap_rate, 2, 3)
 
     assert cs_obj.gamma_curve_risk(curve, vol)
+
+
+def test_cancellable_swap_bermudan_valuation():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rates = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rates)
+
+    vol = AtmSwaptionVolSurface.from_csv(r"tests/data/vol_surfaces/sample_swaption_vols.csv")
+
+    par_swap = InterestRateSwap.par_swap(curve, 1000000, 5, CashFlowFrequency.SEMI_ANNUAL)
+
+    cs_obj = CancellableSwap(1000000, par_swap.swap_rate, 2, 5)
+
+    tree = cs_obj.calibrate_hull_white_tree(curve, vol)
+
+    exercise_times = np.array([2, 2.5, 3, 3.5, 4])
+
+    tree_prices = tree.european_swaption_values(curve, exercise_times, 5, par_swap.swap_rate,
+                                                CashFlowFrequency.SEMI_ANNUAL, PayerReceiver.RECEIVER)
+
+    black_prices = InterestRateSwaption.present_value_batch(curve, vol, 1, par_swap.swap_rate, exercise_times,
+                                                            5 - exercise_times, CashFlowFrequency.SEMI_ANNUAL,
+                                                            PayerReceiver.RECEIVER)
+
+    assert tree_prices == pytest.approx(black_prices, rel=2E-02)
+
+    # more exercise dates can only add value to the cancellation right
+    assert cs_obj.bermudan_present_value(curve, tree) > cs_obj.present_value(curve, vol)
+
+    # a single exercise date is the European case
+    assert tree.bermudan_swaption_value(curve, [3], 5, par_swap.swap_rate, CashFlowFrequency.SEMI_ANNUAL,
+                                        PayerReceiver.RECEIVER) == pytest.approx(tree_prices[2])
+
+
+def test_cancellable_swap_bermudan_delta_risk():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rates = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rates)
+
+    vol = AtmSwaptionVolSurface.from_csv(r"tests/data/vol_surfaces/sample_swaption_vols.csv")
+
+    par_swap = InterestRateSwap.par_swap(curve, 1000000, 3, CashFlowFrequency.SEMI_ANNUAL)
+
+    cs_obj = CancellableSwap(1000000, par_swap.swap_rate, 2, 3)
+
+    tree = cs_obj.calibrate_hull_white_tree(curve, vol)
+
+    report = cs_obj.bermudan_first_order_curve_risk(curve, tree)
+
+    assert report.keys() == cs_obj.first_order_curve_risk(curve, vol).keys()
+    assert report["IR_SWAP_3Y"] != 0
@@ -1,8 +1,17 @@
+import gc
+import weakref
+
+import numpy as np
 import pytest
 
-from product.cap_floor import Caplet
+from product.cap_floor import Cap, Caplet
 from utils.constants import UNIT_TEST_ABS_TOLERANCE, UNIT_TEST_REL_TOLERANCE
+from utils.enum import CapFloor, CashFlowFrequency, LongShort
+from vol_surface.cap_vol_surface.cap_const_vol_surface import CapConstVolSurface
+from vol_surface.cap_vol_surface.cap_vol_surface import CapVolSurface
+from vol_surface.cap_vol_surface.caplet_vol_surface import CapletVolSurface
 from yield_curve.flat_curve import FlatCurve
+from yield_curve.libor_curve import LiborCurve
 
 
 def test_caplet_present_value():
@@ -14,3 +23,235 @@ def test_caplet_present_value():
 
     assert caplet.present_value(curve, vol) == pytest.approx(5.162, abs=UNIT_TEST_ABS_TOLERANCE,
                                                              rel=UNIT_TEST_REL_TOLERANCE)
+
+
+def _market_curve():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4}
+    return LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+
+@pytest.mark.parametrize("maturity, payment_frequency, cap_floor", [(1, CashFlowFrequency.QUARTERLY, CapFloor.CAP),
+                                                                    (3, CashFlowFrequency.SEMI_ANNUAL, CapFloor.CAP),
+                                                                    (5, CashFlowFrequency.QUARTERLY, CapFloor.CAP),
+                                                                    (3, CashFlowFrequency.QUARTERLY, CapFloor.FLOOR)])
+def test_cap_present_value_matches_caplets(maturity, payment_frequency, cap_floor):
+    curve = _market_curve()
+
+    vol = CapConstVolSurface(0.2)
+
+    cap = Cap.get_par_cap(curve, 10000, maturity, payment_frequency, cap_floor)
+
+    period = 1 / payment_frequency
+
+    expected_reset_dates = []
+    i = 1
+
+    while round(period * i) < maturity:
+        expected_reset_dates.append(period * i)
+        i += 1
+
+    assert list(cap.reset_dates) == pytest.approx(expected_reset_dates)
+
+    caplet_values = [cap.build_caplet(reset_date).present_value(curve, 0.2) for reset_date in expected_reset_dates]
+
+    assert cap.present_value(curve, vol) == pytest.approx(sum(caplet_values))
+
+
+def test_floor_present_value_matches_floorlet_strip():
+    curve = _market_curve()
+
+    floor = Cap(10000, 0.04, 3, CashFlowFrequency.SEMI_ANNUAL, CapFloor.FLOOR)
+
+    floorlets = [Caplet(10000, 0.04, reset_date, reset_date + 0.5, CapFloor.FLOOR) for reset_date in
+                 floor.reset_dates]
+
+    expected = sum(floorlet.present_value(curve, 0.2) for floorlet in floorlets)
+
+    # a long floor struck above the forwards is worth more than its intrinsic value
+    intrinsic = sum(10000 * 0.5 * curve.interpolate_discount_factor(reset_date + 0.5)
+                    * max(0.04 - curve.interpolate_forward_rate(reset_date, 0.5), 0) for reset_date in floor.reset_dates)
+
+    assert expected > intrinsic > 0
+
+    assert floor.present_value(curve, CapConstVolSurface(0.2)) == pytest.approx(expected)
+
+    assert Cap.present_value_batch(curve, CapConstVolSurface(0.2), 10000, 0.04, 3, CashFlowFrequency.SEMI_ANNUAL,
+                                   CapFloor.FLOOR) == pytest.approx(np.array([expected]))
+
+
+def test_cap_present_value_book():
+    curve = _market_curve()
+
+    vol = CapVolSurface.from_csv(r"tests/data/vol_surfaces/simple_cap_vol.csv")
+
+    caps = [
+        Cap(10000, 0.04, 2, CashFlowFrequency.QUARTERLY),
+        Cap(5000, 0.035, 5, CashFlowFrequency.SEMI_ANNUAL, CapFloor.FLOOR),
+        Cap(20000, 0.045, 3, CashFlowFrequency.QUARTERLY, CapFloor.CAP, LongShort.SHORT),
+    ]
+
+    present_values = Cap.present_value_book(caps, curve, vol)
+
+    assert present_values == pytest.approx([cap.present_value(curve, vol) for cap in caps])
+
+    bumped_curve_set = curve.bump_curve_by_instrument()
+
+    bumped_present_values = Cap.present_value_book(caps, bumped_curve_set, vol)
+
+    for i, bumped_curve in enumerate(bumped_curve_set.values()):
+        assert bumped_present_values[i] == pytest.approx([cap.present_value(bumped_curve, vol) for cap in caps])
+
+
+def test_cap_implied_vol_surface():
+    curve = _market_curve()
+
+    vol = CapVolSurface.from_csv(r"tests/data/vol_surfaces/simple_cap_vol.csv")
+
+    maturities = [1, 2, 3]
+
+    caps = [Cap.get_par_cap(curve, 10000, maturity, CashFlowFrequency.QUARTERLY) for maturity in maturities]
+
+    premiums = [cap.present_value(curve, vol) for cap in caps]
+
+    implied_surface = CapVolSurface.from_market_premiums(curve, maturities, premiums, notional=10000,
+                                                         payment_frequency=CashFlowFrequency.QUARTERLY)
+
+    assert implied_surface.interpolate_vol(np.array(maturities)) == pytest.approx(
+        vol.interpolate_vol(np.array(maturities)))
+
+    floor_premiums = Cap.present_value_batch(curve, vol, 10000, 0.03, maturities, CashFlowFrequency.QUARTERLY,
+                                             CapFloor.FLOOR)
+
+    implied_vols = Cap.implied_vol_batch(curve, floor_premiums, 10000, 0.03, maturities, CashFlowFrequency.QUARTERLY,
+                                         CapFloor.FLOOR)
+
+    assert implied_vols == pytest.approx(vol.interpolate_vol(np.array(maturities)))
+
+
+@pytest.mark.parametrize("strike_rate", [0.04, None])
+def test_caplet_vol_stripping(strike_rate):
+    curve = _market_curve()
+
+    vol = CapVolSurface.from_csv(r"tests/data/vol_surfaces/simple_cap_vol.csv")
+
+    caplet_vol_surface = CapletVolSurface.from_cap_vol_surface(curve, vol, CashFlowFrequency.QUARTERLY, strike_rate)
+
+    assert CapletVolSurface.from_cap_vol_surface(curve, vol, CashFlowFrequency.QUARTERLY,
+                                                 strike_rate) is caplet_vol_surface
+
+    # a surface stripped from a moved curve carries its own vols
+    moved_surface = CapletVolSurface.from_cap_vol_surface(curve.parallel_bump_curve(50), vol,
+                                                          CashFlowFrequency.QUARTERLY, strike_rate)
+
+    assert not moved_surface.vols == pytest.approx(caplet_vol_surface.vols)
+
+    for maturity in vol.expiries:
+        if strike_rate is None:
+            cap = Cap.get_par_cap(curve, 10000, maturity, CashFlowFrequency.QUARTERLY)
+        else:
+            cap = Cap(10000, strike_rate, maturity, CashFlowFrequency.QUARTERLY)
+
+        assert cap.present_value(curve, caplet_vol_surface) == pytest.approx(cap.present_value(curve, vol))
+
+    # the first segment's caplets carry the first cap's flat vol
+    assert caplet_vol_surface.interpolate_vol(0.25) == pytest.approx(vol.interpolate_vol(vol.expiries[0]))
+
+
+def test_cap_analytic_risk_caplet_vol_surface():
+    curve = _market_curve()
+
+    vol = CapletVolSurface([1, 2, 3], [0.2, 0.22, 0.21])
+
+    cap = Cap(10000, 0.04, 3, CashFlowFrequency.SEMI_ANNUAL)
+
+    npv = cap.present_value(curve, vol)
+
+    curve_risk = cap.analytic_curve_risk(curve, vol, n_bps_bump=0.01)
+
+    for node, bumped_curve in curve.iter_bumped_curves(0.01):
+        assert curve_risk[node] == pytest.approx(cap.present_value(bumped_curve, vol) - npv, rel=1E-03, abs=1E-06)
+
+    _, vol_sensitivities = Cap.node_sensitivities_batch(curve, vol, 10000, 0.04, 3,
+                                                        int(CashFlowFrequency.SEMI_ANNUAL))
+
+    h = 1E-06
+
+    for i in range(3):
+        bumped_vols = [0.2, 0.22, 0.21]
+
+        bumped_vols[i] += h
+
+        assert vol_sensitivities[0, i] == pytest.approx(
+            (cap.present_value(curve, CapletVolSurface([1, 2, 3], bumped_vols)) - npv) / h, rel=1E-04)
+
+    assert cap.analytic_vega_risk(curve, vol) == pytest.approx(
+        {1.: vol_sensitivities[0, 0] * 1E-04, 2.: vol_sensitivities[0, 1] * 1E-04, 3.: vol_sensitivities[0, 2] * 1E-04})
+
+    const_vol = CapConstVolSurface(0.2)
+
+    const_vega_risk = cap.analytic_vega_risk(curve, const_vol)
+
+    assert list(const_vega_risk.values()) == pytest.approx([cap.greeks(curve, const_vol).vega * 1E-04])
+    assert list(const_vega_risk.values()) == pytest.approx(
+        [cap.present_value(curve, CapConstVolSurface(0.2001)) - cap.present_value(curve, const_vol)], rel=1E-03)
+
+    assert Cap.curve_sensitivities_batch(curve, CapConstVolSurface(0.2), 10000, 0.04, 3, 2) == pytest.approx(
+        Cap.node_sensitivities_batch(curve, CapVolSurface([3], [20]), 10000, 0.04, 3, 2)[0])
+
+
+@pytest.mark.parametrize("cap_floor, long_short", [(CapFloor.CAP, LongShort.LONG), (CapFloor.FLOOR, LongShort.SHORT)])
+def test_cap_greeks(cap_floor, long_short):
+    curve = _market_curve()
+
+    vol = CapVolSurface([1, 2, 3, 4], [20, 22, 21, 19])
+
+    cap = Cap(10000, 0.04, 3, CashFlowFrequency.SEMI_ANNUAL, cap_floor, long_short)
+
+    greeks = cap.greeks(curve, vol)
+
+    caplet_greeks = [cap.build_caplet(reset_date).greeks(curve, vol.interpolate_vol(3)) for reset_date in
+                     cap.reset_dates]
+
+    assert greeks.present_value == pytest.approx(cap.present_value(curve, vol))
+    assert greeks.delta == pytest.approx(sum(caplet.delta for caplet in caplet_greeks))
+    assert greeks.theta == pytest.approx(sum(caplet.theta for caplet in caplet_greeks))
+
+    h = 1E-06
+
+    assert greeks.vega == pytest.approx((cap.present_value(curve, CapVolSurface([1, 2, 3, 4], [20, 22, 21 + 100 * h, 19]))
+                                         - cap.present_value(curve, vol)) / h, rel=1E-04)
+
+    curve_risk = cap.analytic_curve_risk(curve, vol, n_bps_bump=0.01)
+
+    npv = cap.present_value(curve, vol)
+
+    for node, bumped_curve in curve.iter_bumped_curves(0.01):
+        assert curve_risk[node] == pytest.approx(cap.present_value(bumped_curve, vol) - npv, rel=1E-03, abs=1E-06)
+
+    vega_risk = cap.analytic_vega_risk(curve, vol)
+
+    for expiry, bumped_surface in vol.iter_bumped_surfaces(1):
+        assert vega_risk[expiry] == pytest.approx(cap.present_value(curve, bumped_surface) - npv, rel=1E-03, abs=1E-09)
+
+
+def test_caplet_vol_stripping_cache_does_not_keep_curves():
+    curve = _market_curve()
+
+    vol = CapVolSurface.from_csv(r"tests/data/vol_surfaces/simple_cap_vol.csv")
+
+    caplet_vol_surface = CapletVolSurface.from_cap_vol_surface(curve, vol, CashFlowFrequency.QUARTERLY, 0.04)
+
+    vol.vols[0] += 0.01
+
+    assert CapletVolSurface.from_cap_vol_surface(curve, vol, CashFlowFrequency.QUARTERLY,
+                                                 0.04) is not caplet_vol_surface
+
+    curve_reference = weakref.ref(curve)
+
+    del curve
+
+    gc.collect()
+
+    assert curve_reference() is None
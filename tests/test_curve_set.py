@@ -0,0 +1,114 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from utils.enum import InterpolationType
+from yield_curve.curve_set import CurveSet
+from yield_curve.curve_snapshot import write_curve_snapshot, load_curve_snapshot
+from yield_curve.libor_curve import LiborCurve
+
+
+def _market_curve(interpolation_type=InterpolationType.LINEAR):
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2}
+    return LiborCurve.from_market_quotes(deposits, futures, swap_rate, interpolation_type=interpolation_type)
+
+
+@pytest.mark.parametrize("interpolation_type", [InterpolationType.LINEAR, InterpolationType.CUBIC_SPLINE])
+def test_bumped_curve_set_matches_curves(interpolation_type):
+    curve = _market_curve(interpolation_type)
+
+    curve_set = curve.bump_curve_by_instrument()
+
+    assert curve_set.is_shared_grid
+
+    times = np.linspace(0.05, 4.0, 50)
+
+    discount_factors = curve_set.interpolate_discount_factor(times)
+
+    assert discount_factors.shape == (len(curve_set), len(times))
+
+    for i, (node, bumped_curve) in enumerate(curve_set.items()):
+        assert discount_factors[i] == pytest.approx(bumped_curve.interpolate_discount_factor(times))
+
+
+def test_ragged_curve_set():
+    short_curve = LiborCurve([{'time': 0.5, 'spot_rate': 0.02}, {'time': 2.0, 'spot_rate': 0.03}])
+
+    curve = _market_curve()
+
+    curve_set = CurveSet.from_curves({'short': short_curve, 'market': curve})
+
+    assert not curve_set.is_shared_grid
+
+    times = np.array([0.01, 0.25, 0.5, 1.3, 2.0, 3.7, 10.0])
+
+    spot_rates = curve_set.interpolate_curve(times)
+
+    assert spot_rates[0] == pytest.approx(short_curve.interpolate_curve(times))
+    assert spot_rates[1] == pytest.approx(curve.interpolate_curve(times))
+    assert curve_set['short'] is short_curve
+
+
+def test_parallel_bump_curve_set():
+    curve = _market_curve()
+
+    curve_set = curve.parallel_bump_curve([1, 2])
+
+    assert curve_set.names == [1, 2]
+    assert curve_set.interpolate_curve(3.0) == pytest.approx(
+        [curve.parallel_bump_curve(1).interpolate_curve(3.0), curve.parallel_bump_curve(2).interpolate_curve(3.0)])
+
+
+def test_curve_snapshot_round_trip(tmp_path):
+    curve = _market_curve()
+
+    curves = {
+        date(2023, 1, 3): curve,
+        date(2023, 1, 2): curve.parallel_bump_curve(5),
+        date(2023, 1, 4): LiborCurve([{'time': 0.5, 'spot_rate': 0.02}, {'time': 2.0, 'spot_rate': 0.03}])
+    }
+
+    path = tmp_path / "curves.bin"
+
+    write_curve_snapshot(path, curves)
+
+    snapshot = load_curve_snapshot(path)
+
+    assert snapshot.names == sorted(curves.keys())
+
+    times = np.linspace(0.1, 5, 20)
+
+    discount_factors = snapshot.interpolate_discount_factor(times)
+
+    for i, curve_date in enumerate(snapshot.names):
+        assert discount_factors[i] == pytest.approx(curves[curve_date].interpolate_discount_factor(times))
+        assert snapshot[curve_date].interpolate_curve(times) == pytest.approx(
+            curves[curve_date].interpolate_curve(times))
+
+    assert isinstance(snapshot.spot_rates.base, np.memmap)
+    assert np.shares_memory(snapshot[date(2023, 1, 4)].spot_rates, snapshot.spot_rates)
+
+
+def test_cubic_curve_snapshot_round_trip(tmp_path):
+    curve = _market_curve(InterpolationType.CUBIC_SPLINE)
+
+    curves = {date(2023, 1, 2): curve, date(2023, 1, 3): curve.parallel_bump_curve(5)}
+
+    path = tmp_path / "curves.bin"
+
+    write_curve_snapshot(path, curves)
+
+    snapshot = load_curve_snapshot(path)
+
+    assert snapshot.is_shared_grid
+    assert snapshot.interpolation_type == InterpolationType.CUBIC_SPLINE
+
+    times = np.linspace(0.1, 4, 20)
+
+    spot_rates = snapshot.interpolate_curve(times)
+
+    for i, curve_date in enumerate(snapshot.names):
+        assert spot_rates[i] == pytest.approx(curves[curve_date].interpolate_curve(times))
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from model.libor_market_model import CancellableSwapPayoff, LiborMarketModel
+from product.cancellable_swap import CancellableSwap
+from product.cap_floor import Cap
+from product.interest_rate_swap import InterestRateSwap
+from product.interest_rate_swaption import InterestRateSwaption
+from utils.black_model import black_price
+from utils.enum import CashFlowFrequency, PayerReceiver
+from vol_surface.cap_vol_surface.cap_const_vol_surface import CapConstVolSurface
+from vol_surface.swaption_vol_surface.swaption_flat_surface import SwaptionFlatVolSurface
+from yield_curve.libor_curve import LiborCurve
+
+
+def _market_curve():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4}
+    return LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+
+def test_lmm_cap_present_value():
+    curve = _market_curve()
+
+    model = LiborMarketModel.from_cap_vol_surface(curve, CapConstVolSurface(0.2), 5, CashFlowFrequency.SEMI_ANNUAL)
+
+    cap = Cap(10000, 0.045, 5, CashFlowFrequency.SEMI_ANNUAL)
+
+    result = model.cap_present_value(cap, num_paths=20000, seed=1)
+
+    # Black on the model's simple compounded forwards
+    k = (cap.reset_dates * 2).round().astype(int)
+
+    expected = np.sum(10000 * 0.5 * curve.interpolate_discount_factor(cap.payoff_dates)
+                      * black_price(model.initial_forwards[k], 0.045, 0.2, cap.reset_dates))
+
+    assert abs(result.present_value - expected) < 4 * result.standard_error
+
+    assert result.present_value == pytest.approx(cap.present_value(curve, CapConstVolSurface(0.2)), rel=5E-02)
+
+
+def test_lmm_swaption_and_cancellable_swap_present_value():
+    curve = _market_curve()
+
+    vol = SwaptionFlatVolSurface(0.2)
+
+    model = LiborMarketModel.from_swaption_vol_surface(curve, vol, 5, CashFlowFrequency.SEMI_ANNUAL,
+                                                       correlation_decay=1E-04)
+
+    swaption = InterestRateSwaption(10000, 0.045, 2, 3, CashFlowFrequency.SEMI_ANNUAL, PayerReceiver.PAYER)
+
+    result = model.swaption_present_value(swaption, num_paths=20000, seed=1)
+
+    assert abs(result.present_value - swaption.present_value(curve, vol)) < 4 * result.standard_error
+
+    par_swap = InterestRateSwap.par_swap(curve, 1000000, 5, CashFlowFrequency.SEMI_ANNUAL)
+
+    cs_obj = CancellableSwap(1000000, par_swap.swap_rate, 2, 5)
+
+    result = model.cancellable_swap_present_value(cs_obj, num_paths=20000, seed=1)
+
+    assert abs(result.present_value - cs_obj.present_value(curve, vol)) < 4 * result.standard_error
+
+    # without vol the swap cash flows are deterministic and an out of the money cancellation right is worthless
+    zero_vol_model = LiborMarketModel.from_cap_vol_surface(curve, CapConstVolSurface(1E-10), 5,
+                                                           CashFlowFrequency.SEMI_ANNUAL)
+
+    off_market_swap = CancellableSwap(1000000, par_swap.swap_rate - 0.01, 2, 5)
+
+    result = zero_vol_model.present_value(CancellableSwapPayoff(off_market_swap, zero_vol_model.tenor_times),
+                                          num_paths=100, seed=1)
+
+    assert result.present_value == pytest.approx(off_market_swap.underlying_swap.present_value(curve), abs=1E-02)
+
+
+def test_lmm_chunks_are_reproducible():
+    curve = _market_curve()
+
+    model = LiborMarketModel.from_cap_vol_surface(curve, CapConstVolSurface(0.2), 3, CashFlowFrequency.QUARTERLY,
+                                                  steps_per_period=2)
+
+    cap = Cap(10000, 0.04, 3, CashFlowFrequency.QUARTERLY)
+
+    serial = model.cap_present_value(cap, num_paths=4000, chunk_size=1000, seed=7)
+
+    pooled = model.cap_present_value(cap, num_paths=4000, chunk_size=1000, seed=7, max_workers=2)
+
+    assert pooled.present_value == serial.present_value
+    assert pooled.standard_error == serial.standard_error
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from portfolio.cash_flow_matrix import CashFlowMatrix
+from portfolio.risk_engine import BookRiskEngine
+from product.bond.fixed_rate_bond import FixedRateBond
+from product.bond.zero_coupon_bond import ZeroCouponBond
+from product.cancellable_swap import CancellableSwap
+from product.cap_floor import Cap
+from product.interest_rate_swap import InterestRateSwap
+from product.interest_rate_swaption import InterestRateSwaption
+from utils.enum import CashFlowFrequency, PayerReceiver
+from vol_surface.cap_vol_surface.cap_vol_surface import CapVolSurface
+from vol_surface.swaption_vol_surface.atm_swaption_vol_surface import AtmSwaptionVolSurface
+from yield_curve.libor_curve import LiborCurve
+
+
+def _market_curve():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4}
+    return LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+
+def _linear_book():
+    return [
+        InterestRateSwap(10000, 2, CashFlowFrequency.QUARTERLY, 0.03),
+        InterestRateSwap(5000, 3, CashFlowFrequency.SEMI_ANNUAL, 0.04, PayerReceiver.RECEIVER, start_time=1),
+        FixedRateBond(10000, 2, CashFlowFrequency.SEMI_ANNUAL, coupon_rate=0.07),
+        ZeroCouponBond(10000, 0.5),
+    ]
+
+
+def test_cash_flow_matrix_present_values():
+    curve = _market_curve()
+
+    book = _linear_book()
+
+    cash_flow_matrix = CashFlowMatrix(book)
+
+    present_values = cash_flow_matrix.present_values(curve)
+
+    assert present_values == pytest.approx([trade.present_value(curve) for trade in book])
+    assert cash_flow_matrix.book_value(curve) == pytest.approx(sum(present_values))
+    assert len(cash_flow_matrix.times) == len(np.unique(cash_flow_matrix.times))
+
+
+def test_cash_flow_matrix_bumped_curves():
+    curve = _market_curve()
+
+    book = _linear_book()
+
+    bumped_curve_set = curve.bump_curve_by_instrument()
+
+    present_values = CashFlowMatrix(book).present_values(bumped_curve_set)
+
+    assert present_values.shape == (len(book), len(bumped_curve_set))
+
+    for j, bumped_curve in enumerate(bumped_curve_set.values()):
+        assert present_values[:, j] == pytest.approx([trade.present_value(bumped_curve) for trade in book])
+
+
+def test_book_risk_engine():
+    curve = _market_curve()
+
+    swaption_vol = AtmSwaptionVolSurface.from_csv(r"tests/data/vol_surfaces/sample_swaption_vols.csv")
+
+    cap_vol = CapVolSurface.from_csv(r"tests/data/vol_surfaces/simple_cap_vol.csv")
+
+    par_swap = InterestRateSwap.par_swap(curve, 1000000, 3, CashFlowFrequency.SEMI_ANNUAL)
+
+    book = _linear_book() + [
+        InterestRateSwaption(10000, 0.062, 1, 3, CashFlowFrequency.SEMI_ANNUAL, PayerReceiver.PAYER),
+        Cap(10000, 0.04, 3, CashFlowFrequency.QUARTERLY),
+        CancellableSwap(1000000, par_swap.swap_rate, 2, 3),
+    ]
+
+    engine = BookRiskEngine(book, curve, swaption_vol, cap_vol)
+
+    curve_risk = engine.curve_risk()
+
+    assert curve_risk.shape == (len(book), len(curve.instrument_node_names))
+
+    for node, bumped_curve in curve.bump_curve_by_instrument().items():
+        assert curve_risk[node][:4].to_numpy() == pytest.approx(
+            [trade.present_value(bumped_curve) - trade.present_value(curve) for trade in book[:4]], abs=1E-08)
+
+    assert curve_risk.loc[4].to_dict() == pytest.approx(book[4].first_order_curve_risk(curve, swaption_vol))
+    assert curve_risk.loc[6].to_dict() == pytest.approx(book[6].first_order_curve_risk(curve, swaption_vol))
+
+    swaption_vega = engine.swaption_vega_risk()
+
+    assert swaption_vega.loc[4].to_dict() == pytest.approx(book[4].surface_vega_risk(curve, swaption_vol))
+    assert swaption_vega.loc[6].to_dict() == pytest.approx(book[6].surface_vega_risk(curve, swaption_vol))
+    assert np.all(swaption_vega.loc[[0, 1, 2, 3, 5]].to_numpy() == 0)
+
+    cap_vega = engine.cap_vega_risk()
+
+    assert np.all(cap_vega.drop(index=5).to_numpy() == 0)
+    assert cap_vega.loc[5, 3.0] > 0
@@ -1,12 +1,18 @@
+import numpy as np
+import pandas as pd
 import pytest
 
 from product.interest_rate_swap import InterestRateSwap
+from utils.black_model import black_implied_vol, black_price
+from utils.sabr_model import calibrate_sabr, sabr_vol
 from utils.constants import UNIT_TEST_ABS_TOLERANCE, UNIT_TEST_REL_TOLERANCE
-from utils.enum import CashFlowFrequency, PayerReceiver
+from utils.enum import CashFlowFrequency, LongShort, PayerReceiver
 from vol_surface.swaption_vol_surface.atm_swaption_vol_surface import AtmSwaptionVolSurface
 from yield_curve.flat_curve import FlatCurve
 from yield_curve.libor_curve import LiborCurve
 from vol_surface.swaption_vol_surface.swaption_flat_surface import SwaptionFlatVolSurface
+from vol_surface.swaption_vol_surface.swaption_vol_cube import SwaptionVolCube
+from vol_surface.swaption_vol_surface.sabr_swaption_vol_surface import SabrSwaptionVolSurface
 from product.interest_rate_swaption import InterestRateSwaption
 
 
@@ -67,3 +73,359 @@ def test_swaption_vega_risk():
     report = swaption_obj.surface_vega_risk(curve, vol)
 
     assert report
+
+
+def test_swaption_present_value_book():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+    vol = AtmSwaptionVolSurface.from_csv(r"tests/data/vol_surfaces/sample_swaption_vols.csv")
+
+    swaptions = [
+        InterestRateSwaption(10000, 0.062, 1, 3, CashFlowFrequency.SEMI_ANNUAL, PayerReceiver.PAYER),
+        InterestRateSwaption(5000, 0.04, 2, 2, CashFlowFrequency.QUARTERLY, PayerReceiver.RECEIVER),
+        InterestRateSwaption(20000, 0.05, 1.5, 1, CashFlowFrequency.ANNUAL, PayerReceiver.PAYER, LongShort.SHORT),
+    ]
+
+    present_values = InterestRateSwaption.present_value_book(swaptions, curve, vol)
+
+    assert present_values == pytest.approx([swaption.present_value(curve, vol) for swaption in swaptions])
+
+    bumped_curve_set = curve.bump_curve_by_instrument()
+
+    bumped_present_values = InterestRateSwaption.present_value_book(swaptions, bumped_curve_set, vol)
+
+    for i, bumped_curve in enumerate(bumped_curve_set.values()):
+        assert bumped_present_values[i] == pytest.approx(
+            [swaption.present_value(bumped_curve, vol) for swaption in swaptions])
+
+
+def test_black_implied_vol():
+    forwards = np.array([0.03, 0.03, 0.05, 0.04])
+
+    strikes = np.array([0.03, 0.05, 0.02, 0.04])
+
+    expiries = np.array([1, 5, 0.25, 10])
+
+    option_types = np.array([1, 1, -1, -1])
+
+    vols = np.array([0.2, 0.35, 0.6, 0.05])
+
+    premiums = black_price(forwards, strikes, vols, expiries, option_types)
+
+    implied_vols = black_implied_vol(premiums, 1, forwards, strikes, expiries, option_types)
+
+    assert implied_vols == pytest.approx(vols)
+
+    # below intrinsic value
+    assert np.isnan(black_implied_vol(0.01, 1, 0.05, 0.03, 1)[0])
+
+
+def test_swaption_implied_vol_surface():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+    vol = AtmSwaptionVolSurface.from_csv(r"tests/data/vol_surfaces/sample_swaption_vols.csv")
+
+    expiries = [0.25, 1, 2]
+
+    tenors = [1, 2, 3]
+
+    premiums = [[InterestRateSwaption.from_forward_swap(
+        InterestRateSwap.par_swap(curve, 10000, tenor, CashFlowFrequency.SEMI_ANNUAL, start_time=expiry)
+    ).present_value(curve, vol) for tenor in tenors] for expiry in expiries]
+
+    implied_surface = AtmSwaptionVolSurface.from_market_premiums(curve, expiries, tenors, premiums, notional=10000)
+
+    for expiry in expiries:
+        for tenor in tenors:
+            assert implied_surface.interpolate_vol(expiry, tenor) == pytest.approx(vol.interpolate_vol(expiry, tenor))
+
+
+def test_swaption_vol_surface_interpolation():
+    vol = AtmSwaptionVolSurface.from_market_data([1, 2], [1, 2, 3], [[20, 18, 16], [22, 20, 17]])
+
+    assert vol.interpolate_vol(2, 3) == pytest.approx(0.17)
+
+    # bilinear within a grid cell
+    assert vol.interpolate_vol(1.5, 1.5) == pytest.approx(0.2)
+
+    assert vol.interpolate_vol(1.5, 2.5) == pytest.approx((0.18 + 0.16 + 0.2 + 0.17) / 4)
+
+    assert np.isnan(vol.interpolate_vol(0.5, 2))
+
+    vols = vol.interpolate_vol(np.array([[1, 2], [1.5, 1.5]]), np.array([1, 3]))
+
+    assert vols.shape == (2, 2) and vols == pytest.approx(np.array([[0.2, 0.17], [0.21, 0.165]]))
+
+    # points that are not a full grid are interpolated on their triangulation
+    scattered = AtmSwaptionVolSurface(np.array([[1., 1.], [1., 3.], [2., 1.], [2., 3.], [1.5, 2.]]),
+                                      np.array([0.2, 0.16, 0.22, 0.17, 0.19]))
+
+    assert scattered.interpolate_vol(np.array([1., 1.5, 2.]), np.array([3., 2., 1.])) == pytest.approx(
+        np.array([0.16, 0.19, 0.22]))
+
+
+@pytest.mark.parametrize("points_dropped", [0, 1])
+def test_swaption_vol_surface_bump_overlays(points_dropped):
+    full = AtmSwaptionVolSurface.from_csv(r"tests/data/vol_surfaces/sample_swaption_vols.csv")
+
+    # dropping a point leaves a scattered set interpolated on its triangulation
+    points, data = full._points[points_dropped:], full._data[points_dropped:]
+
+    vol = AtmSwaptionVolSurface(points, data)
+
+    expiries, tenors = np.array([0.7, 2.2, 1., 4.5]), np.array([1.5, 6., 3.5, 9.])
+
+    weights = vol.interpolation_weights(expiries, tenors)
+
+    assert weights.shape == (4, len(data))
+    assert np.sum(weights, axis=-1) == pytest.approx(np.ones(4))
+    assert weights @ data == pytest.approx(vol.interpolate_vol(expiries, tenors))
+
+    for i, (point, bumped_surface) in enumerate(vol.iter_bumped_surfaces(10)):
+        data_bumped = data.copy()
+        data_bumped[i] += 10 * 1E-04
+
+        assert bumped_surface.interpolate_vol(expiries, tenors) == pytest.approx(
+            AtmSwaptionVolSurface(points, data_bumped).interpolate_vol(expiries, tenors))
+
+    assert np.all(np.isnan(vol.interpolation_weights(0.01, 1.)))
+
+
+def test_swaption_greeks():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+    vol = AtmSwaptionVolSurface.from_csv(r"tests/data/vol_surfaces/sample_swaption_vols.csv")
+
+    swaption_obj = InterestRateSwaption(10000, 0.042, 1.5, 2.5, CashFlowFrequency.SEMI_ANNUAL, PayerReceiver.RECEIVER,
+                                        LongShort.SHORT)
+
+    greeks = swaption_obj.greeks(curve, vol)
+
+    npv = swaption_obj.present_value(curve, vol)
+
+    assert greeks.present_value == pytest.approx(npv)
+
+    forward_swap_rate = swaption_obj.underlying_swap.par_rate(curve)
+
+    annuity = np.sum(curve.interpolate_discount_factor(np.array(swaption_obj.underlying_swap.times_of_cash_flows))) / 2
+
+    def _black(forward=forward_swap_rate, sigma=vol.interpolate_vol(1.5, 2.5), expiry=1.5):
+        return -10000 * annuity * black_price(forward, 0.042, sigma, expiry, -1)
+
+    h = 1E-05
+
+    assert greeks.delta == pytest.approx((_black(forward_swap_rate + h) - _black(forward_swap_rate - h)) / (2 * h))
+    assert greeks.gamma == pytest.approx(
+        (_black(forward_swap_rate + h) - 2 * npv + _black(forward_swap_rate - h)) / h ** 2, rel=1E-04)
+    assert greeks.theta == pytest.approx((_black(expiry=1.5 - h) - _black(expiry=1.5 + h)) / (2 * h))
+
+    curve_risk = swaption_obj.analytic_curve_risk(curve, vol, n_bps_bump=0.01)
+
+    for node, bumped_curve in curve.iter_bumped_curves(0.01):
+        assert curve_risk[node] == pytest.approx(swaption_obj.present_value(bumped_curve, vol) - npv, rel=1E-03,
+                                                 abs=1E-06)
+
+    vega_risk = swaption_obj.analytic_vega_risk(curve, vol)
+
+    assert sum(vega_risk.values()) == pytest.approx(greeks.vega * 1E-04)
+
+    for point, bumped_surface in vol.iter_bumped_surfaces(1):
+        assert vega_risk[point] == pytest.approx(swaption_obj.present_value(curve, bumped_surface) - npv, rel=1E-03,
+                                                 abs=1E-09)
+
+
+def test_swaption_analytic_curve_risk_flat_surface():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+    vol = SwaptionFlatVolSurface(0.2)
+
+    swaption_obj = InterestRateSwaption(10000, 0.04, 1, 3, CashFlowFrequency.SEMI_ANNUAL, PayerReceiver.PAYER)
+
+    curve_risk = swaption_obj.analytic_curve_risk(curve, vol, n_bps_bump=0.01)
+
+    npv = swaption_obj.present_value(curve, vol)
+
+    for node, bumped_curve in curve.iter_bumped_curves(0.01):
+        assert curve_risk[node] == pytest.approx(swaption_obj.present_value(bumped_curve, vol) - npv, rel=1E-03,
+                                                 abs=1E-06)
+
+    _, vol_sensitivities = InterestRateSwaption.node_sensitivities_batch(
+        curve, vol, 10000, 0.04, 1, 3, int(CashFlowFrequency.SEMI_ANNUAL), int(PayerReceiver.PAYER))
+
+    assert vol_sensitivities[0] == pytest.approx([swaption_obj.greeks(curve, vol).vega])
+
+
+def _linear_vol_cube():
+    expiries, tenors, strike_offsets = np.array([0.5, 1., 2., 5.]), np.array([1., 2., 5.]), np.array([-0.01, 0., 0.01])
+
+    expiry_grid, tenor_grid, strike_grid = np.meshgrid(expiries, tenors, strike_offsets, indexing='ij')
+
+    return SwaptionVolCube(expiries, tenors, strike_offsets, 0.2 - 0.005 * expiry_grid + 0.002 * tenor_grid
+                           - 2 * strike_grid)
+
+
+def test_swaption_vol_cube_interpolation(tmp_path):
+    cube = _linear_vol_cube()
+
+    expiries, tenors = np.array([0.7, 1.5, 4., 2.]), np.array([1.2, 3., 4.5, 2.])
+
+    strike_offsets = np.array([-0.004, 0.002, 0.03, -0.02])
+
+    expected = 0.2 - 0.005 * expiries + 0.002 * tenors - 2 * np.clip(strike_offsets, -0.01, 0.01)
+
+    assert cube.interpolate_vol(expiries, tenors, strike_offsets) == pytest.approx(expected)
+
+    assert cube.interpolate_vol(1.5, 3.) == pytest.approx(0.2 - 0.0075 + 0.006)
+
+    assert np.isnan(cube.interpolate_vol(6., 2., 0.))
+
+    weights = cube.interpolation_weights(expiries, tenors)
+
+    for point_index in range(len(cube.points)):
+        assert cube.point_weight(expiries, tenors, point_index) == pytest.approx(weights[:, point_index],
+                                                                               nan_ok=True)
+
+    path = tmp_path / "cube.bin"
+
+    cube.write(path)
+
+    loaded = SwaptionVolCube.load(path)
+
+    assert isinstance(loaded.vols, np.memmap)
+    assert loaded.interpolate_vol(expiries, tenors, strike_offsets) == pytest.approx(expected)
+
+    expiry_grid, tenor_grid, strike_grid = np.meshgrid(cube.expiries, cube.tenors, cube.strike_offsets, indexing='ij')
+
+    csv_path = tmp_path / "cube.csv"
+
+    pd.DataFrame({'Expiry': expiry_grid.ravel(), 'Tenor': tenor_grid.ravel(), 'StrikeOffset': strike_grid.ravel(),
+                  'Vol': 100 * cube.vols.ravel()}).sample(frac=1, random_state=0).to_csv(csv_path, index=False)
+
+    assert SwaptionVolCube.from_csv(csv_path).vols == pytest.approx(cube.vols)
+
+
+def test_swaption_vol_cube_pricing():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+    cube = _linear_vol_cube()
+
+    swaption_obj = InterestRateSwaption(10000, 0.05, 1, 2, CashFlowFrequency.SEMI_ANNUAL, PayerReceiver.PAYER)
+
+    strike_offset = 0.05 - swaption_obj.underlying_swap.par_rate(curve)
+
+    smile_vol = SwaptionFlatVolSurface(cube.interpolate_vol(1, 2, strike_offset))
+
+    npv = swaption_obj.present_value(curve, cube)
+
+    assert npv == pytest.approx(swaption_obj.present_value(curve, smile_vol))
+
+    assert InterestRateSwaption.present_value_book([swaption_obj], curve, cube) == pytest.approx(np.array([npv]))
+
+    # the vol moves along the smile as the forward swap rate moves against the strike
+    curve_risk = swaption_obj.analytic_curve_risk(curve, cube, n_bps_bump=0.01)
+
+    for node, bumped_curve in curve.iter_bumped_curves(0.01):
+        assert curve_risk[node] == pytest.approx(swaption_obj.present_value(bumped_curve, cube) - npv, rel=1E-03,
+                                                 abs=1E-06)
+
+    vega_risk = swaption_obj.analytic_vega_risk(curve, cube)
+
+    for point, bumped_surface in cube.iter_bumped_surfaces(1):
+        assert vega_risk[point] == pytest.approx(swaption_obj.present_value(curve, bumped_surface) - npv, rel=1E-03,
+                                                 abs=1E-09)
+
+
+def test_sabr_swaption_vol_surface():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4, 7.0: 4.6, 10.0: 4.8}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+    expiries, tenors = np.array([0.5, 1., 2., 5.]), np.array([1., 2., 5.])
+
+    strike_offsets = np.array([-0.02, -0.01, -0.005, 0., 0.005, 0.01, 0.02])
+
+    expiry_grid, tenor_grid = np.meshgrid(expiries, tenors, indexing='ij')
+
+    forward_swap_rates = InterestRateSwaption.forward_swap_rates_batch(curve, expiry_grid.ravel(), tenor_grid.ravel(),
+                                                                       2).reshape(expiry_grid.shape)
+
+    alphas = 0.04 + 0.002 * expiry_grid
+    rhos = -0.3 + 0.05 * tenor_grid
+    nus = 0.5 - 0.05 * expiry_grid
+
+    market_vols = sabr_vol(forward_swap_rates[..., None], forward_swap_rates[..., None] + strike_offsets,
+                           expiry_grid[..., None], alphas[..., None], 0.5, rhos[..., None], nus[..., None])
+
+    cube = SwaptionVolCube(expiries, tenors, strike_offsets, market_vols)
+
+    surface = SabrSwaptionVolSurface.calibrate(forward_swap_rates, cube, beta=0.5)
+
+    assert surface.alphas == pytest.approx(alphas, rel=1E-06)
+    assert surface.rhos == pytest.approx(rhos, abs=1E-06)
+    assert surface.nus == pytest.approx(nus, rel=1E-06)
+    assert np.all(surface.calibration_errors < 1E-08)
+    assert np.all(surface.calibration_converged)
+
+    assert surface.interpolate_vol(expiry_grid[..., None], tenor_grid[..., None], strike_offsets) == pytest.approx(
+        market_vols)
+
+    # a warm start from the previous day's smiles fits a moved market
+    moved_cube = SwaptionVolCube(expiries, tenors, strike_offsets, market_vols + 0.001)
+
+    warm_surface = SabrSwaptionVolSurface.calibrate(forward_swap_rates, moved_cube, beta=0.5,
+                                                   initial_surface=surface)
+
+    assert np.all(warm_surface.calibration_errors < 1E-04)
+
+    swaption_obj = InterestRateSwaption(10000, 0.05, 1.5, 3, CashFlowFrequency.SEMI_ANNUAL, PayerReceiver.PAYER)
+
+    strike_offset = 0.05 - swaption_obj.underlying_swap.par_rate(curve)
+
+    assert swaption_obj.present_value(curve, surface) == pytest.approx(swaption_obj.present_value(
+        curve, SwaptionFlatVolSurface(surface.interpolate_vol(1.5, 3, strike_offset))))
+
+    short_cube = SwaptionVolCube(expiries[:-1], tenors, strike_offsets, market_vols[:-1])
+
+    with pytest.raises(ValueError):
+        SabrSwaptionVolSurface.calibrate(forward_swap_rates[:-1], short_cube, initial_surface=surface)
+
+    with pytest.raises(ValueError):
+        SabrSwaptionVolSurface.calibrate(forward_swap_rates, short_cube)
+
+
+def test_calibrate_sabr_noisy_long_expiries():
+    rng = np.random.default_rng(1)
+
+    expiries = np.repeat([10., 15., 20., 30.], 25)
+
+    forwards = rng.uniform(0.01, 0.06, len(expiries))
+
+    alphas, rhos, nus = rng.uniform(0.02, 0.08, len(expiries)), rng.uniform(-0.7, 0.5, len(expiries)), rng.uniform(
+        0.05, 0.6, len(expiries))
+
+    strikes = forwards[:, None] + np.array([-0.02, -0.01, -0.005, -0.0025, 0., 0.0025, 0.005, 0.01, 0.02])
+
+    market_vols = sabr_vol(forwards[:, None], strikes, expiries[:, None], alphas[:, None], 0.5, rhos[:, None],
+                           nus[:, None]) + rng.normal(0, 0.005, strikes.shape)
+
+    _, errors, converged = calibrate_sabr(forwards, strikes, expiries, market_vols, beta=0.5)
+
+    # every fit from the default start lands within the noise of the quotes, half a vol point
+    assert np.all(errors < 0.01)
+    assert np.mean(converged) > 0.9
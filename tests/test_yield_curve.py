@@ -1,8 +1,20 @@
+from datetime import date
+from functools import partial
+
+import numpy as np
 import pytest
 
+from product.interest_rate_swap import InterestRateSwap
+from product.interest_rate_swaption import InterestRateSwaption
 from utils.constants import *
-from utils.enum import CashFlowFrequency
+from utils.enum import BumpScheme, CashFlowFrequency, CurveInstrument, InterpolationType, PayerReceiver
+from utils.utils import discount_to_spot_rate, spot_rate_to_discount
+from vol_surface.swaption_vol_surface.swaption_flat_surface import SwaptionFlatVolSurface
+from yield_curve.curve_cache import CurveCache
+from yield_curve.flat_curve import FlatCurve
+from yield_curve.historical_curve_builder import build_historical_curves
 from yield_curve.libor_curve import LiborCurve
+from yield_curve.risk_ladder import curve_risk_ladder
 from yield_curve.spot_rate_point import SpotRatePoint
 
 
@@ -74,3 +86,339 @@ def test_forward_rate_calc():
         rhs = ((1 + s2 / float(m)) ** (m * t2))
 
         assert lhs == pytest.approx(rhs, abs=UNIT_TEST_ABS_TOLERANCE, rel=UNIT_TEST_REL_TOLERANCE)
+
+
+@pytest.mark.parametrize("interpolation_type", [InterpolationType.LINEAR, InterpolationType.CUBIC_SPLINE])
+def test_array_interpolation_matches_scalar(interpolation_type):
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate, interpolation_type=interpolation_type)
+
+    times = np.linspace(0.1, 3.5, 35)
+
+    spot_rates = curve.interpolate_curve(times)
+    discount_factors = curve.interpolate_discount_factor(times)
+    forward_rates = curve.interpolate_forward_rate(times, 0.25)
+
+    assert spot_rates.shape == discount_factors.shape == forward_rates.shape == times.shape
+
+    for i, t in enumerate(times):
+        assert spot_rates[i] == pytest.approx(curve.interpolate_curve(t))
+        assert discount_factors[i] == pytest.approx(curve.interpolate_discount_factor(t))
+        assert forward_rates[i] == pytest.approx(curve.interpolate_forward_rate(t, 0.25))
+
+
+def test_flat_curve_array_interpolation():
+    curve = FlatCurve(0.05)
+
+    times = np.array([0.5, 1.0, 2.0])
+
+    assert curve.interpolate_curve(times) == pytest.approx([0.05] * 3)
+    assert curve.interpolate_discount_factor(times) == pytest.approx(np.exp(-0.05 * times))
+    assert curve.interpolate_forward_rate(times, 0.5) == pytest.approx([0.05] * 3)
+
+
+def test_incremental_bump_matches_full_rebuild():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+    bumped_curves = curve.bump_curve_by_instrument(n_bps_bump=2)
+
+    assert len(bumped_curves) == len(deposits) + len(futures) + len(swap_rate)
+
+    for node, bumped_curve in bumped_curves.items():
+        full_rebuild = LiborCurve.from_market_data_dict(bumped_curve.market_quotes)
+
+        assert bumped_curve._t == pytest.approx(full_rebuild._t)
+        assert bumped_curve._s == pytest.approx(full_rebuild._s, abs=FLOAT_EQ_THRESHOLD)
+
+    assert curve.market_quotes[CurveInstrument.IR_SWAP] == swap_rate
+
+
+def test_rebuild_with_new_tenors_bootstraps_in_full():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+    market_data = {CurveInstrument.CASH_DEPOSIT: deposits, CurveInstrument.IR_FUTURES: futures,
+                   CurveInstrument.IR_SWAP: {**swap_rate, 7.0: 4.6}}
+
+    rebuilt_curve = curve.rebuild_from_market_data(market_data)
+
+    full_rebuild = LiborCurve.from_market_data_dict(market_data)
+
+    assert rebuilt_curve._t == pytest.approx(full_rebuild._t)
+    assert rebuilt_curve._s == pytest.approx(full_rebuild._s)
+    assert rebuilt_curve.market_quotes[CurveInstrument.IR_SWAP] == market_data[CurveInstrument.IR_SWAP]
+
+    del market_data[CurveInstrument.IR_SWAP][1.0]
+
+    assert curve.rebuild_from_market_data(market_data)._s == pytest.approx(
+        LiborCurve.from_market_data_dict(market_data)._s)
+
+
+def test_rebuild_from_reordered_quotes_matches_full_rebuild():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+    market_data = {CurveInstrument.CASH_DEPOSIT: dict(reversed(deposits.items())),
+                   CurveInstrument.IR_FUTURES: dict(reversed(futures.items())),
+                   CurveInstrument.IR_SWAP: dict(reversed({**swap_rate, 4.0: 4.25}.items()))}
+
+    rebuilt_curve = curve.rebuild_from_market_data(market_data)
+
+    full_rebuild = LiborCurve.from_market_data_dict(market_data)
+
+    assert rebuilt_curve._t == pytest.approx(full_rebuild._t)
+    assert rebuilt_curve._s == pytest.approx(full_rebuild._s, abs=FLOAT_EQ_THRESHOLD)
+
+
+def test_curve_jacobian_matches_bumped_curves():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4, 7.0: 4.6}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+    jacobian = curve.jacobian
+
+    bumped_curves = curve.bump_curve_by_instrument(n_bps_bump=0.01)
+
+    assert list(bumped_curves.keys()) == curve.instrument_node_names
+
+    for j, bumped_curve in enumerate(bumped_curves.values()):
+        finite_difference = (bumped_curve._s - curve._s) / (0.01 * BASIS_POINT_CONVERSION)
+
+        assert jacobian[:, j] == pytest.approx(finite_difference, abs=1E-06)
+
+
+def test_instrument_risk_from_zero_rate_sensitivities():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+    swap = InterestRateSwap(10000, 2, CashFlowFrequency.QUARTERLY, 0.03)
+
+    npv = swap.present_value(curve)
+
+    zero_rate_sensitivities = []
+    for i in range(len(curve._t)):
+        spot_rates = curve._s.copy()
+        spot_rates[i] += 1E-06
+        bumped_curve = LiborCurve([{'time': t, 'spot_rate': s} for t, s in zip(curve._t, spot_rates)])
+        zero_rate_sensitivities.append((swap.present_value(bumped_curve) - npv) / 1E-06)
+
+    report = curve.instrument_risk(np.array(zero_rate_sensitivities))
+
+    assert report['IR_SWAP_2Y'] == pytest.approx(swap.first_order_curve_risk(curve)['IR_SWAP_2Y'], rel=1E-02)
+
+
+def test_discount_factor_table():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+    table_curve = curve.with_discount_factor_table(time_step=1 / 365, max_time=10)
+
+    assert curve.discount_factor_table is None
+
+    times = np.linspace(0, 12, 1001)
+
+    error = np.abs(table_curve.interpolate_discount_factor(times) - curve.interpolate_discount_factor(times))
+
+    assert error.max() <= table_curve.discount_factor_table.max_error + FLOAT_EQ_THRESHOLD
+    assert error[times > 0.5].max() < FLOAT_EQ_THRESHOLD
+    assert table_curve.interpolate_discount_factor(2.5) == pytest.approx(curve.interpolate_discount_factor(2.5))
+
+
+def test_long_dated_curve_bootstrap():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4, 7.0: 4.6, 10.0: 4.75, 20.0: 4.9, 30.0: 4.95,
+                 50.0: 4.9}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+    assert curve._t[-1] == 50.0
+    assert np.all(np.diff(curve.interpolate_discount_factor(np.linspace(0.5, 50, 100))) < 0)
+
+    bumped_curve = curve.bump_curve_by_instrument(n_bps_bump=0.01)['IR_SWAP_30Y']
+
+    finite_difference = (bumped_curve._s - curve._s) / (0.01 * BASIS_POINT_CONVERSION)
+
+    assert curve.jacobian[:, curve.instrument_node_names.index('IR_SWAP_30Y')] == pytest.approx(
+        finite_difference, abs=1E-06)
+
+
+@pytest.mark.parametrize("swap_rate", [
+    {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4, 7.0: 4.6, 10.0: 4.75, 20.0: 4.9, 30.0: 4.95, 50.0: 4.9},
+    {1.5: 3.3, 2.5: 3.8, 4.0: 4.2, 6.5: 4.5, 12.5: 4.8, 27.5: 4.95, 40.0: 4.85}
+])
+def test_long_dated_bootstrap_matches_scalar_recursion(swap_rate):
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+    previous_t, previous_s = curve._t[:-len(swap_rate)], curve._s[:-len(swap_rate)]
+
+    swap_t, swap_s = np.array(list(swap_rate.keys())), np.array(list(swap_rate.values()))
+
+    # the scalar recursion the vectorised long end replaced: walk the semi-annual grid one discount factor at a time
+    def discount_factor_from_swap_rate(swap_quote, discount_factors_sum):
+        return (2 - swap_quote / 100 * discount_factors_sum) / (2 + swap_quote / 100)
+
+    discount_factors_sum, iter_t = 0., 0.5
+
+    discount_factor = spot_rate_to_discount(np.interp(iter_t, previous_t, previous_s, right=np.nan, left=0), iter_t)
+
+    while not np.isnan(discount_factor):
+        discount_factors_sum += discount_factor
+
+        iter_t += 0.5
+
+        discount_factor = spot_rate_to_discount(np.interp(iter_t, previous_t, previous_s, right=np.nan, left=1),
+                                                iter_t)
+
+    reference_spot_rates = []
+
+    for t in swap_t:
+        while abs(t - iter_t) > FLOAT_EQ_THRESHOLD:
+            discount_factors_sum += discount_factor_from_swap_rate(np.interp(iter_t, swap_t, swap_s),
+                                                                   discount_factors_sum)
+
+            iter_t += 0.5
+
+        reference_spot_rates.append(discount_to_spot_rate(
+            discount_factor_from_swap_rate(np.interp(t, swap_t, swap_s), discount_factors_sum), t))
+
+    assert curve._s[-len(swap_rate):] == pytest.approx(reference_spot_rates, abs=FLOAT_EQ_THRESHOLD)
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_build_historical_curves(max_workers):
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2}
+
+    market_data_history = dict()
+
+    for i in range(5, 0, -1):
+        market_data_history[date(2023, 1, i + 1)] = {
+            CurveInstrument.CASH_DEPOSIT: deposits, CurveInstrument.IR_FUTURES: futures,
+            CurveInstrument.IR_SWAP: {t: quote + i / 100 for t, quote in swap_rate.items()}
+        }
+
+    curves, chunk_timings = build_historical_curves(market_data_history, max_workers=max_workers, chunk_size=2)
+
+    assert list(curves.keys()) == sorted(market_data_history.keys())
+    assert [timing.num_curves for timing in chunk_timings] == [2, 2, 1]
+
+    for curve_date, curve in curves.items():
+        expected_curve = LiborCurve.from_market_data_dict(market_data_history[curve_date])
+        assert curve.spot_rates == pytest.approx(expected_curve.spot_rates)
+
+
+def test_curve_cache():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2}
+
+    curve_cache = CurveCache(max_size=2)
+
+    curve = LiborCurve.from_market_quotes(deposits, futures, swap_rate, curve_cache=curve_cache)
+
+    reordered_swap_rate = dict(reversed(list(swap_rate.items())))
+
+    assert LiborCurve.from_market_quotes(deposits, futures, reordered_swap_rate, curve_cache=curve_cache) is curve
+    assert (curve_cache.hits, curve_cache.misses) == (1, 1)
+
+    bumped_curve = curve.parallel_bump_curve(1)
+
+    assert curve.parallel_bump_curve(1) is bumped_curve
+    assert (curve_cache.hits, curve_cache.misses, curve_cache.evictions) == (2, 2, 0)
+
+    curve.parallel_bump_curve(2)
+
+    assert curve_cache.evictions == 1 and len(curve_cache) == 2
+
+    with pytest.raises(ValueError):
+        curve.spot_rates[0] = 0.
+
+    curve.market_quotes[CurveInstrument.IR_SWAP][1.0] = 10.
+
+    assert curve.market_quotes[CurveInstrument.IR_SWAP][1.0] == 3.0
+
+
+def _ladder_curve():
+    deposits = {1 / 52: 2.0, 1 / 12: 2.2, 1 / 6: 2.27, 1 / 4: 2.36}
+    futures = {6 / 12: 97.4, 9 / 12: 97.0}
+    swap_rate = {1.0: 3.0, 2.0: 3.6, 3.0: 3.95, 4.0: 4.2, 5.0: 4.4}
+    return LiborCurve.from_market_quotes(deposits, futures, swap_rate)
+
+
+def test_bump_quotes_matches_single_bumps():
+    curve = _ladder_curve()
+
+    swap = InterestRateSwap(10000, 4, CashFlowFrequency.SEMI_ANNUAL, 0.04)
+
+    for node, bumped_curve in curve.iter_bumped_curves(2):
+        assert swap.present_value(curve.bump_quotes({node: 2})) == pytest.approx(swap.present_value(bumped_curve))
+
+    with pytest.raises(ValueError):
+        curve.bump_quotes({"IR_SWAP_7Y": 1})
+
+
+def test_curve_risk_ladder():
+    curve = _ladder_curve()
+
+    swaption = InterestRateSwaption(10000, 0.042, 1, 3, CashFlowFrequency.SEMI_ANNUAL, PayerReceiver.PAYER)
+
+    price = partial(swaption.present_value, swaption_vol_surface=SwaptionFlatVolSurface(0.2))
+
+    npv = price(curve)
+
+    forward = curve_risk_ladder(price, curve, bump_sizes=(1, 2), cross_gamma=True)
+
+    central = curve_risk_ladder(price, curve, bump_sizes=(1,), scheme=BumpScheme.CENTRAL, cross_gamma=True)
+
+    for node, bumped_1, bumped_2 in zip(curve.instrument_node_names, curve.iter_bumped_curves(1),
+                                        curve.iter_bumped_curves(2)):
+        npv_1, npv_2 = price(bumped_1[1]), price(bumped_2[1])
+
+        assert forward.delta[1][node] == pytest.approx(npv_1 - npv)
+        assert forward.delta[2][node] == pytest.approx(npv_2 - npv)
+        assert forward.gamma[1][node] == pytest.approx((npv_2 - npv_1) - (npv_1 - npv))
+
+        assert central.delta[1][node] == pytest.approx(forward.delta[1][node], abs=1E-02)
+        assert central.gamma[1][node] == pytest.approx(forward.gamma[1][node], abs=1E-03)
+
+    assert swaption.gamma_curve_risk(curve, SwaptionFlatVolSurface(0.2)) == pytest.approx(forward.gamma[1])
+
+    for ladder in (forward, central):
+        cross_gamma = ladder.cross_gamma[1].to_numpy()
+
+        assert cross_gamma == pytest.approx(cross_gamma.T)
+        assert np.diag(cross_gamma) == pytest.approx(np.array(list(ladder.gamma[1].values())))
+
+    assert central.cross_gamma[1].loc["IR_SWAP_2Y", "IR_SWAP_4Y"] == pytest.approx(
+        forward.cross_gamma[1].loc["IR_SWAP_2Y", "IR_SWAP_4Y"], abs=1E-03)
+
+
+def test_curve_risk_ladder_worker_pool():
+    curve = _ladder_curve()
+
+    swaption = InterestRateSwaption(10000, 0.042, 1, 3, CashFlowFrequency.SEMI_ANNUAL, PayerReceiver.PAYER)
+
+    price = partial(swaption.present_value, swaption_vol_surface=SwaptionFlatVolSurface(0.2))
+
+    serial = curve_risk_ladder(price, curve, cross_gamma=True)
+
+    pooled = curve_risk_ladder(price, curve, cross_gamma=True, max_workers=2)
+
+    assert pooled.cross_gamma[1].to_numpy() == pytest.approx(serial.cross_gamma[1].to_numpy())
@@ -0,0 +1,80 @@
+"""
+Binary container for a few numeric arrays that are loaded back zero-copy with np.memmap.
+
+Layout (little endian):
+    header      8s magic, uint32 version, uint32 number of arrays
+    descriptors per array: 8s dtype string, uint32 ndim, 4 x uint64 shape, uint64 byte offset
+    data        each array in C order, starting on a 64 byte boundary
+"""
+import struct
+from typing import List
+
+import numpy as np
+
+ARRAY_FILE_VERSION = 1
+
+_HEADER = struct.Struct('<8sII')
+
+_DESCRIPTOR = struct.Struct('<8sI4QQ')
+
+_MAX_NDIM = 4
+
+_ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def write_array_file(path, magic: bytes, arrays: List[np.ndarray]):
+    arrays = [np.ascontiguousarray(array) for array in arrays]
+
+    assert all(array.ndim <= _MAX_NDIM for array in arrays)
+
+    offset = _align(_HEADER.size + _DESCRIPTOR.size * len(arrays))
+
+    descriptors = []
+
+    for array in arrays:
+        shape = array.shape + (0,) * (_MAX_NDIM - array.ndim)
+        descriptors.append(_DESCRIPTOR.pack(array.dtype.newbyteorder('<').str.encode(), array.ndim, *shape, offset))
+        offset = _align(offset + array.nbytes)
+
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(magic, ARRAY_FILE_VERSION, len(arrays)))
+
+        for descriptor in descriptors:
+            f.write(descriptor)
+
+        for array, descriptor in zip(arrays, descriptors):
+            f.seek(_DESCRIPTOR.unpack(descriptor)[-1])
+            f.write(array.astype(array.dtype.newbyteorder('<'), copy=False).tobytes())
+
+
+def read_array_file(path, magic: bytes) -> List[np.ndarray]:
+    """
+    :return: read-only memory-mapped arrays in the order they were written
+    """
+    with open(path, 'rb') as f:
+        file_magic, version, num_arrays = _HEADER.unpack(f.read(_HEADER.size))
+
+        if file_magic != magic:
+            raise ValueError(f"{path} is not a {magic} file.")
+
+        if version != ARRAY_FILE_VERSION:
+            raise ValueError(f"Unsupported file version {version}.")
+
+        descriptors = [_DESCRIPTOR.unpack(f.read(_DESCRIPTOR.size)) for _ in range(num_arrays)]
+
+    arrays = []
+
+    for dtype, ndim, *shape, offset in descriptors:
+        shape = tuple(shape[:ndim])
+
+        if 0 in shape:
+            arrays.append(np.empty(shape, dtype=np.dtype(dtype.rstrip(b'\0').decode())))
+        else:
+            arrays.append(np.memmap(path, dtype=np.dtype(dtype.rstrip(b'\0').decode()), mode='r', offset=offset,
+                                    shape=shape))
+
+    return arrays
@@ -0,0 +1,171 @@
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.special import ndtr
+
+
+@dataclass
+class BlackGreeks:
+    """
+    Black value and sensitivities of an option or of arrays of options: delta and gamma to the forward, vega to the
+    vol (per unit of vol) and theta to the passage of time (per year) with the forward, vol and discounting held
+    """
+    present_value: np.ndarray
+    delta: np.ndarray
+    gamma: np.ndarray
+    vega: np.ndarray
+    theta: np.ndarray
+
+
+def black_d1_d2(forward, strike, vol, expiry):
+    """
+    Black d1 and d2, all arguments broadcast against each other
+    """
+    total_vol = vol * np.sqrt(expiry)
+
+    d_1 = (np.log(forward / strike) + 0.5 * total_vol ** 2) / total_vol
+
+    return d_1, d_1 - total_vol
+
+
+def black_price(forward, strike, vol, expiry, option_type=1):
+    """
+    Undiscounted Black price per unit of annuity
+    :param option_type: 1 for a call (payer / cap), -1 for a put (receiver / floor), may be an array
+    """
+    d_1, d_2 = black_d1_d2(forward, strike, vol, expiry)
+
+    return option_type * (forward * ndtr(option_type * d_1) - strike * ndtr(option_type * d_2))
+
+
+def black_vega(forward, strike, vol, expiry):
+    """
+    Undiscounted Black vega per unit of annuity, the same for calls and puts
+    """
+    d_1, _ = black_d1_d2(forward, strike, vol, expiry)
+
+    return forward * np.exp(-0.5 * d_1 ** 2) * np.sqrt(expiry / (2 * np.pi))
+
+
+def black_delta(forward, strike, vol, expiry, option_type=1):
+    """
+    Undiscounted Black d(price) / d(forward) per unit of annuity
+    """
+    d_1, _ = black_d1_d2(forward, strike, vol, expiry)
+
+    return option_type * ndtr(option_type * d_1)
+
+
+def black_gamma(forward, strike, vol, expiry):
+    """
+    Undiscounted Black d2(price) / d(forward)2 per unit of annuity, the same for calls and puts
+    """
+    d_1, _ = black_d1_d2(forward, strike, vol, expiry)
+
+    return np.exp(-0.5 * d_1 ** 2) / (forward * vol * np.sqrt(2 * np.pi * expiry))
+
+
+def black_theta(forward, strike, vol, expiry):
+    """
+    Undiscounted Black price change per unit of annuity as a year passes, i.e. -d(price) / d(expiry), the same for
+    calls and puts
+    """
+    d_1, _ = black_d1_d2(forward, strike, vol, expiry)
+
+    return -1 * forward * vol * np.exp(-0.5 * d_1 ** 2) / np.sqrt(8 * np.pi * expiry)
+
+
+def black_implied_vol(premiums, weights, forwards, strikes, expiries, option_types=1, initial_vol=0.2,
+                      max_vol=5., tolerance=1E-10, max_iterations=100):
+    """
+    Flat Black vols implied from premiums of strips of options, such as swaptions (one option per premium) or caps
+    (one caplet per reset). Solved with a Halley iteration on the whole array that falls back to bisection on a
+    per element bracket whenever a step leaves the bracket; converged elements are masked out of later iterations
+    :param premiums: array of shape (n,)
+    :param weights: discounting and notional of every option, broadcast to (n, k), zero weight pads a strip
+    :param forwards: (n, k)
+    :param strikes: (n, k)
+    :param expiries: (n, k)
+    :param option_types: 1 for calls, -1 for puts, broadcast to (n, k)
+    :return: implied vols of shape (n,), nan where the premium is outside the no-arbitrage bounds or did not converge
+    """
+    premiums = np.atleast_1d(np.asarray(premiums, dtype=float))
+
+    n = len(premiums)
+
+    shape = np.broadcast_shapes(*(_as_strip(a, n).shape for a in (weights, forwards, strikes, expiries,
+                                                                   option_types)))
+
+    weights, forwards, strikes, expiries, option_types = (np.broadcast_to(_as_strip(a, n), shape) for a in (
+        weights, forwards, strikes, expiries, option_types))
+
+    lower_bound = np.sum(weights * np.maximum(option_types * (forwards - strikes), 0), axis=-1)
+
+    upper_bound = np.sum(weights * np.where(option_types > 0, forwards, strikes), axis=-1)
+
+    vols = np.full(n, float(initial_vol))
+
+    low = np.zeros(n)
+
+    high = np.full(n, float(max_vol))
+
+    active = (premiums > lower_bound) & (premiums < upper_bound)
+
+    converged = np.zeros(n, dtype=bool)
+
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+
+        i = np.flatnonzero(active)
+
+        vol = vols[i][:, None]
+
+        d_1, d_2 = black_d1_d2(forwards[i], strikes[i], vol, expiries[i])
+
+        vega_k = weights[i] * forwards[i] * np.exp(-0.5 * d_1 ** 2) * np.sqrt(expiries[i] / (2 * np.pi))
+
+        price = np.sum(weights[i] * black_price(forwards[i], strikes[i], vol, expiries[i], option_types[i]), axis=-1)
+
+        vega = np.sum(vega_k, axis=-1)
+
+        volga = np.sum(vega_k * d_1 * d_2, axis=-1) / vols[i]
+
+        error = price - premiums[i]
+
+        # price is increasing in vol so the sign of the error tightens the bracket
+        high[i] = np.where(error > 0, vols[i], high[i])
+        low[i] = np.where(error > 0, low[i], vols[i])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = 2 * error * vega / (2 * vega ** 2 - error * volga)
+
+        new_vol = vols[i] - step
+
+        bisect = ~np.isfinite(new_vol) | (new_vol <= low[i]) | (new_vol >= high[i])
+
+        new_vol = np.where(bisect, 0.5 * (low[i] + high[i]), new_vol)
+
+        # converged once the vol error implied by the price error, the step or the bracket is within tolerance
+        done = ((np.abs(error) <= tolerance * vega) | (np.abs(new_vol - vols[i]) <= tolerance)
+                | (high[i] - low[i] <= tolerance))
+
+        vols[i] = np.where(done, vols[i], new_vol)
+
+        converged[i] = done
+
+        active[i] = ~done
+
+    return np.where(converged, vols, np.nan)
+
+
+def _as_strip(a, n):
+    """
+    Broadcasts a per premium (n,) argument or a strip (n, k) argument to two dimensions
+    """
+    a = np.asarray(a, dtype=float)
+
+    if a.ndim < 2:
+        a = np.broadcast_to(a, (n,))[:, None]
+
+    return a
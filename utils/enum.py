@@ -65,4 +65,9 @@ class TenorUnit(StrEnum):
 class DateRollingConvention(Enum):
     MODIFIED_FOLLOWING = 0
     PREVIOUS = 1
-    FOLLOWING = 2
\ No newline at end of file
+    FOLLOWING = 2
+
+
+class BumpScheme(Enum):
+    FORWARD = 0
+    CENTRAL = 1
@@ -0,0 +1,188 @@
+import numpy as np
+
+# |z| below which z / x(z) is replaced by its expansion
+_SMALL_Z = 1E-07
+
+# bounds keeping the Levenberg-Marquardt steps inside a sensible parameter region
+_MAX_ABS_RHO = 0.9999
+
+_MAX_NU = 10.
+
+# rho and nu of the candidate starts of a calibration without initial parameters
+_START_RHOS = np.array([-0.5, 0., 0.5])
+
+_START_NUS = np.array([0.1, 0.3, 0.6, 1.])
+
+
+def sabr_vol(forward, strike, expiry, alpha, beta, rho, nu):
+    """
+    Hagan's lognormal (Black) vol approximation of the SABR model, all arguments broadcast against each other
+    :return: Black vols, nan where the forward or the strike is not positive
+    """
+    forward, strike = np.asarray(forward, dtype=float), np.asarray(strike, dtype=float)
+
+    valid = (forward > 0) & (strike > 0)
+
+    forward, strike = np.where(valid, forward, 1.), np.where(valid, strike, 1.)
+
+    one_minus_beta = 1 - beta
+
+    log_moneyness = np.log(forward / strike)
+
+    forward_strike_power = (forward * strike) ** (one_minus_beta / 2)
+
+    z = nu / alpha * forward_strike_power * log_moneyness
+
+    x = np.log((np.sqrt(1 - 2 * rho * z + z ** 2) + z - rho) / (1 - rho))
+
+    small = np.abs(z) < _SMALL_Z
+
+    z_over_x = np.where(small, 1 - rho * z / 2, z / np.where(small, 1., x))
+
+    denominator = forward_strike_power * (1 + one_minus_beta ** 2 / 24 * log_moneyness ** 2
+                                          + one_minus_beta ** 4 / 1920 * log_moneyness ** 4)
+
+    correction = 1 + (one_minus_beta ** 2 / 24 * alpha ** 2 / forward_strike_power ** 2
+                      + rho * beta * nu * alpha / (4 * forward_strike_power)
+                      + (2 - 3 * rho ** 2) / 24 * nu ** 2) * expiry
+
+    return np.where(valid, alpha / denominator * z_over_x * correction, np.nan)
+
+
+def calibrate_sabr(forwards, strikes, expiries, market_vols, beta=0.5, initial_parameters=None, max_iterations=100,
+                   tolerance=1E-12):
+    """
+    Fits alpha, rho and nu of many smiles at once, for a fixed beta, with a Levenberg-Marquardt iteration on the
+    whole array: every smile keeps its own damping and smiles that have converged are masked out of later
+    iterations. The parameters are solved in log alpha, atanh rho and log nu so every step stays admissible.
+    :param forwards: array of shape (smiles,)
+    :param strikes: (smiles, strikes)
+    :param expiries: (smiles,)
+    :param market_vols: (smiles, strikes), nan for missing quotes
+    :param initial_parameters: (smiles, 3) alpha, rho, nu to start from, e.g. the previous calibration. By default
+    every smile starts from the best of a small grid of rho and nu, alpha matching the at-the-money vol
+    :return: parameters of shape (smiles, 3), the root mean square vol error of every smile and whether its fit
+    converged, a fit stopped by the iteration limit or a damping blow up is not converged
+    """
+    forwards = np.atleast_1d(np.asarray(forwards, dtype=float))
+
+    strikes = np.asarray(strikes, dtype=float)
+
+    expiries = np.broadcast_to(np.asarray(expiries, dtype=float), forwards.shape)
+
+    market_vols = np.asarray(market_vols, dtype=float)
+
+    quoted = ~np.isnan(market_vols) & (strikes > 0) & (forwards[:, None] > 0)
+
+    market_vols = np.where(quoted, market_vols, 0)
+
+    num_quotes = np.maximum(np.sum(quoted, axis=-1), 1)
+
+    if initial_parameters is None:
+        initial_parameters = _initial_parameters(forwards, strikes, expiries, market_vols, quoted, beta)
+
+    theta = _to_unconstrained(np.asarray(initial_parameters, dtype=float))
+
+    def _residuals(theta_, i):
+        alpha, rho, nu = (p[:, None] for p in _to_parameters(theta_).T)
+
+        model_vols = sabr_vol(forwards[i, None], strikes[i], expiries[i, None], alpha, beta, rho, nu)
+
+        return np.where(quoted[i], model_vols - market_vols[i], 0)
+
+    active = np.all(np.isfinite(theta), axis=-1) & quoted.any(axis=-1)
+
+    damping = np.full(len(forwards), 1E-03)
+
+    converged = np.zeros(len(forwards), dtype=bool)
+
+    step = 1E-07
+
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+
+        i = np.flatnonzero(active)
+
+        residuals = _residuals(theta[i], i)
+
+        cost = np.sum(residuals ** 2, axis=-1)
+
+        # forward difference jacobian, one batched evaluation per parameter
+        jacobian = np.stack([(_residuals(theta[i] + step * np.eye(3)[p], i) - residuals) / step for p in range(3)],
+                            axis=-1)
+
+        normal = np.einsum('nkp,nkq->npq', jacobian, jacobian)
+
+        gradient = np.einsum('nkp,nk->np', jacobian, residuals)
+
+        damped = normal + damping[i, None, None] * (np.eye(3) * np.diagonal(normal, axis1=1, axis2=2)[:, None]
+                                                    + 1E-12 * np.eye(3))
+
+        delta = -1 * np.linalg.solve(damped, gradient[..., None])[..., 0]
+
+        trial = theta[i] + delta
+
+        trial_cost = np.sum(_residuals(trial, i) ** 2, axis=-1)
+
+        improved = np.isfinite(trial_cost) & (trial_cost < cost)
+
+        theta[i[improved]] = trial[improved]
+
+        damping[i] = np.where(improved, damping[i] / 10, damping[i] * 10)
+
+        stalled = damping[i] > 1E+10
+
+        converged[i] = ((improved & (cost - trial_cost <= tolerance * (1 + cost)))
+                        | (np.max(np.abs(delta), axis=-1) <= tolerance))
+
+        active[i[converged[i] | stalled]] = False
+
+    parameters = _to_parameters(theta)
+
+    alpha, rho, nu = (p[:, None] for p in parameters.T)
+
+    errors = np.where(quoted, sabr_vol(forwards[:, None], strikes, expiries[:, None], alpha, beta, rho, nu)
+                      - market_vols, 0)
+
+    return parameters, np.sqrt(np.sum(errors ** 2, axis=-1) / num_quotes), converged
+
+
+def _initial_parameters(forwards, strikes, expiries, market_vols, quoted, beta):
+    """
+    Best start of a grid of rho and nu for every smile, alpha of each candidate set by a few fixed point steps so
+    that the model matches the at-the-money vol
+    """
+    atm_vols = np.array([np.interp(f, k[q], v[q]) if q.any() else np.nan
+                         for f, k, v, q in zip(forwards, strikes, market_vols, quoted)])
+
+    rho_grid, nu_grid = (g.ravel() for g in np.meshgrid(_START_RHOS, _START_NUS, indexing='ij'))
+
+    alphas = np.broadcast_to((atm_vols * forwards ** (1 - beta))[:, None], (len(forwards), len(rho_grid))).copy()
+
+    for _ in range(3):
+        alphas *= atm_vols[:, None] / sabr_vol(forwards[:, None], forwards[:, None], expiries[:, None], alphas, beta,
+                                               rho_grid, nu_grid)
+
+    model_vols = sabr_vol(forwards[:, None, None], strikes[:, None], expiries[:, None, None], alphas[..., None], beta,
+                          rho_grid[:, None], nu_grid[:, None])
+
+    costs = np.sum(np.where(quoted[:, None], model_vols - market_vols[:, None], 0) ** 2, axis=-1)
+
+    best = np.argmin(np.where(np.isfinite(costs), costs, np.inf), axis=-1)
+
+    return np.stack([alphas[np.arange(len(forwards)), best], rho_grid[best], nu_grid[best]], axis=-1)
+
+
+def _to_unconstrained(parameters: np.ndarray) -> np.ndarray:
+    alpha, rho, nu = parameters.T
+
+    return np.stack([np.log(alpha), np.arctanh(np.clip(rho, -_MAX_ABS_RHO, _MAX_ABS_RHO)),
+                     np.log(np.clip(nu, 1E-06, _MAX_NU))], axis=-1)
+
+
+def _to_parameters(theta: np.ndarray) -> np.ndarray:
+    log_alpha, atanh_rho, log_nu = theta.T
+
+    return np.stack([np.exp(log_alpha), np.clip(np.tanh(atanh_rho), -_MAX_ABS_RHO, _MAX_ABS_RHO),
+                     np.exp(np.minimum(log_nu, np.log(_MAX_NU)))], axis=-1)
@@ -1,13 +1,106 @@
-from math import exp, log
+import numpy as np
 
 
-def spot_rate_to_discount(r: float, t: float) -> float:
-    return exp(-1 * r * t)
+def spot_rate_to_discount(r, t):
+    return np.exp(-1 * r * t)
 
 
-def discount_to_spot_rate(z: float, t: float) -> float:
-    return -1 * log(z) / t
+def discount_to_spot_rate(z, t):
+    return -1 * np.log(z) / t
 
 
 def future_price_to_forward_rate(future_price):
     return (100 - future_price) / 100
+
+
+def linear_interpolation_weights(x, xp):
+    """
+    Weights w such that np.interp(x, xp, fp) == w @ fp, with the same flat extrapolation as np.interp
+    :param x: times to interpolate at
+    :param xp: increasing node times
+    :return: array of shape (len(x), len(xp))
+    """
+    x = np.atleast_1d(np.asarray(x, dtype=float))
+    xp = np.asarray(xp, dtype=float)
+
+    weights = np.zeros((len(x), len(xp)))
+
+    if len(xp) == 1:
+        weights[:, 0] = 1
+        return weights
+
+    lower = np.clip(np.searchsorted(xp, x, side='right') - 1, 0, len(xp) - 2)
+
+    upper_weight = np.clip((x - xp[lower]) / (xp[lower + 1] - xp[lower]), 0, 1)
+
+    rows = np.arange(len(x))
+
+    weights[rows, lower] = 1 - upper_weight
+    weights[rows, lower + 1] += upper_weight
+
+    return weights
+
+
+def interpolation_cells(knots, x):
+    """
+    Grid cell of every x for linear interpolation between increasing knots
+    :return: lower and upper knot index, the fraction of the way through the cell (outside [0, 1] beyond the knots)
+    and whether x is outside the knots
+    """
+    knots = np.asarray(knots, dtype=float)
+    x = np.asarray(x, dtype=float)
+
+    if len(knots) == 1:
+        zeros = np.zeros(x.shape, dtype=int)
+        return zeros, zeros, np.zeros(x.shape), x != knots[0]
+
+    lower = np.clip(np.searchsorted(knots, x, side='right') - 1, 0, len(knots) - 2)
+
+    fraction = (x - knots[lower]) / (knots[lower + 1] - knots[lower])
+
+    return lower, lower + 1, fraction, (x < knots[0]) | (x > knots[-1])
+
+
+def bilinear_interpolation_weights(x, y, x_knots, y_knots):
+    """
+    Weights of every node of an x_knots x y_knots grid in the bilinear interpolation at (x, y), nan outside the grid
+    :return: array of shape broadcast(x, y).shape + (len(x_knots) * len(y_knots),), nodes in x major order
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+
+    (i, i_up, u, x_outside), (j, j_up, v, y_outside) = (interpolation_cells(x_knots, x.ravel()),
+                                                        interpolation_cells(y_knots, y.ravel()))
+
+    weights = np.zeros((x.size, len(x_knots), len(y_knots)))
+
+    rows = np.arange(x.size)
+
+    for x_index, x_weight in ((i, 1 - u), (i_up, u)):
+        for y_index, y_weight in ((j, 1 - v), (j_up, v)):
+            weights[rows, x_index, y_index] += x_weight * y_weight
+
+    weights[x_outside | y_outside] = np.nan
+
+    return weights.reshape(x.shape + (len(x_knots) * len(y_knots),))
+
+
+def bilinear_point_weight(x, y, x_knots, y_knots, x_index: int, y_index: int):
+    """
+    Weight of the single node (x_index, y_index) in the bilinear interpolation at (x, y), nan outside the grid, i.e.
+    one column of bilinear_interpolation_weights without building the others
+    :return: array of shape broadcast(x, y).shape
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+
+    weight = np.ones(x.shape)
+
+    outside = np.zeros(x.shape, dtype=bool)
+
+    for knots, z, index in ((x_knots, x, x_index), (y_knots, y, y_index)):
+        lower, upper, fraction, z_outside = interpolation_cells(knots, z)
+
+        weight *= np.where(lower == index, 1 - fraction, 0) + np.where(upper == index, fraction, 0)
+
+        outside |= z_outside
+
+    return np.where(outside, np.nan, weight)
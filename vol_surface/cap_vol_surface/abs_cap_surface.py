@@ -1,7 +1,44 @@
 from abc import ABC, abstractmethod
 
+import numpy as np
+
+
 class AbsCapSurface(ABC):
 
     @abstractmethod
     def interpolate_vol(self, expiry):
         pass
+
+    def caplet_vols(self, maturity, reset_dates):
+        """
+        Vols applied to the caplets of a cap of the given maturity, flat across the caplets unless a surface
+        carries a caplet term structure
+        """
+        return np.broadcast_to(self.interpolate_vol(maturity), np.broadcast_shapes(np.shape(maturity),
+                                                                                  np.shape(reset_dates)))
+
+    @abstractmethod
+    def interpolation_weights(self, expiry):
+        """
+        Weight of every surface node in the vols returned by interpolate_vol
+        :return: array of shape expiry.shape + (nodes,)
+        """
+        pass
+
+    @property
+    @abstractmethod
+    def expiries(self):
+        """
+        Expiry of every surface node, in the order of interpolation_weights
+        """
+        pass
+
+    def caplet_vol_weights(self, maturity, reset_dates):
+        """
+        Weight of every surface node in the vols of caplet_vols
+        :return: array of shape broadcast(maturity, reset_dates).shape + (nodes,)
+        """
+        weights = self.interpolation_weights(maturity)
+
+        return np.broadcast_to(weights, np.broadcast_shapes(np.shape(maturity), np.shape(reset_dates))
+                               + weights.shape[-1:])
@@ -1,3 +1,5 @@
+import numpy as np
+
 from vol_surface.cap_vol_surface.abs_cap_surface import AbsCapSurface
 
 
@@ -8,3 +10,13 @@ class CapConstVolSurface(AbsCapSurface):
 
     def interpolate_vol(self, expiry):
         return self._vol
+
+    def interpolation_weights(self, expiry):
+        return np.ones(np.shape(expiry) + (1,))
+
+    @property
+    def expiries(self):
+        """
+        The constant vol is a single node covering every expiry
+        """
+        return np.array([np.inf])
@@ -1,6 +1,10 @@
 import numpy as np
 import pandas as pd
 
+from product.cap_floor import Cap
+from utils.constants import BASIS_POINT_CONVERSION
+from utils.enum import CapFloor, CashFlowFrequency
+from utils.utils import linear_interpolation_weights
 from vol_surface.cap_vol_surface.abs_cap_surface import AbsCapSurface
 
 
@@ -10,6 +14,22 @@ class CapVolSurface (AbsCapSurface):
         self._t = np.array(expiries)
         self._vol = np.array(vols) / 100
 
+    @classmethod
+    def from_market_premiums(cls, libor_curve, expiries, premiums, strike_rates=None, notional: float = 1.,
+                             payment_frequency: CashFlowFrequency = CashFlowFrequency.SEMI_ANNUAL,
+                             cap_floor: CapFloor = CapFloor.CAP):
+        """
+        Flat cap vols implied from cap premiums, at-the-money strikes are used when strike_rates is None
+        """
+        if strike_rates is None:
+            strike_rates = [Cap.get_par_cap(libor_curve, notional, expiry, payment_frequency).strike_rate
+                            for expiry in expiries]
+
+        vols = Cap.implied_vol_batch(libor_curve, premiums, notional, strike_rates, expiries, payment_frequency,
+                                     cap_floor)
+
+        return cls(expiries, 100 * vols)
+
     @classmethod
     def from_csv(cls, path):
         df = pd.read_csv(path)
@@ -25,3 +45,36 @@ class CapVolSurface (AbsCapSurface):
     def interpolate_vol(self, t):
         s_interp = np.interp(t, self._t, self._vol)
         return s_interp
+
+    def interpolation_weights(self, t):
+        """
+        :return: array of shape t.shape + (expiries,), the weights of np.interp in interpolate_vol
+        """
+        t = np.asarray(t, dtype=float)
+
+        return linear_interpolation_weights(t.ravel(), self._t).reshape(t.shape + (len(self._t),))
+
+    def bump_surface(self, n_bps_bump=1):
+
+        return dict(self.iter_bumped_surfaces(n_bps_bump))
+
+    def iter_bumped_surfaces(self, n_bps_bump=1):
+        """
+        Yields (expiry, surface with that expiry's vol bumped) one surface at a time
+        """
+        bump = n_bps_bump * BASIS_POINT_CONVERSION ** 2
+
+        for i, expiry in enumerate(self._t):
+            vols = self._vol.copy()
+
+            vols[i] += bump
+
+            yield float(expiry), CapVolSurface(self._t.copy(), 100 * vols)
+
+    @property
+    def expiries(self):
+        return self._t
+
+    @property
+    def vols(self):
+        return self._vol
@@ -0,0 +1,152 @@
+from weakref import WeakKeyDictionary
+
+import numpy as np
+
+from product.cap_floor import Cap
+from utils.black_model import black_implied_vol, black_price
+from utils.constants import FLOAT_EQ_THRESHOLD
+from utils.enum import CashFlowFrequency
+from vol_surface.cap_vol_surface.abs_cap_surface import AbsCapSurface
+from vol_surface.cap_vol_surface.cap_vol_surface import CapVolSurface
+from yield_curve.abs_curve import AbsCurve
+
+# stripped surfaces by cap vol surface then by curve, an entry goes with either of them so nothing is kept alive
+_STRIPPED_SURFACES = WeakKeyDictionary()
+
+
+class CapletVolSurface(AbsCapSurface):
+    """
+    Piecewise constant caplet vols, the caplets added between consecutive cap maturities share one vol
+    """
+
+    def __init__(self, reset_breaks, caplet_vols):
+        """
+        :param reset_breaks: last reset date of each segment of caplets
+        :param caplet_vols: vol of the caplets of each segment
+        """
+        self._reset_breaks = np.array(reset_breaks, dtype=float)
+
+        self._caplet_vols = np.array(caplet_vols, dtype=float)
+
+    @classmethod
+    def from_cap_vol_surface(cls, libor_curve: AbsCurve, cap_vol_surface: CapVolSurface,
+                             payment_frequency: CashFlowFrequency = CashFlowFrequency.SEMI_ANNUAL,
+                             strike_rate: float = None):
+        """
+        Strips caplet vols from the flat vols of caps at every maturity of the surface. With a common strike the
+        segments are independent and are all solved at once, at-the-money strikes (strike_rate None) differ per
+        maturity and are solved segment by segment. Stripped surfaces are reused while the curve and the cap vol
+        surface live, keyed on the surface's vols so a surface changed in place is stripped again.
+        """
+        stripped_surfaces = _STRIPPED_SURFACES.setdefault(cap_vol_surface, WeakKeyDictionary()).setdefault(
+            libor_curve, dict())
+
+        key = (int(payment_frequency), strike_rate, np.asarray(cap_vol_surface.expiries, dtype=float).tobytes(),
+               np.asarray(cap_vol_surface.vols, dtype=float).tobytes())
+
+        if key not in stripped_surfaces:
+            stripped_surfaces[key] = cls._strip_caplet_vols(libor_curve, cap_vol_surface, payment_frequency,
+                                                            strike_rate)
+
+        return stripped_surfaces[key]
+
+    @classmethod
+    def _strip_caplet_vols(cls, libor_curve: AbsCurve, cap_vol_surface: CapVolSurface,
+                           payment_frequency: CashFlowFrequency, strike_rate: float):
+        maturities = np.asarray(cap_vol_surface.expiries, dtype=float)
+
+        periods = np.full(len(maturities), 1 / payment_frequency)
+
+        reset_dates, reset_mask = Cap.reset_date_schedules(maturities, periods)
+
+        # caplets of each cap that are not in the previous cap
+        segment_mask = reset_mask & ~np.vstack([np.zeros_like(reset_mask[:1]), reset_mask[:-1]])
+
+        assert np.all(segment_mask.any(axis=1)), "Cap maturities must be at least one caplet apart."
+
+        reset_breaks = np.max(np.where(segment_mask, reset_dates, 0), axis=1)
+
+        # every row of the schedule is the same grid, kept two dimensional to broadcast against the segments
+        reset_dates = reset_dates[:1]
+
+        forward_rates = libor_curve.interpolate_forward_rate(reset_dates, periods[0])
+
+        weights = periods[0] * libor_curve.interpolate_discount_factor(reset_dates + periods[0])
+
+        if strike_rate is not None:
+            cap_premiums = Cap.present_value_batch(libor_curve, cap_vol_surface, 1., strike_rate, maturities,
+                                                   payment_frequency)
+
+            segment_premiums = np.diff(cap_premiums, prepend=0.)
+
+            caplet_vols = black_implied_vol(segment_premiums, np.where(segment_mask, weights, 0), forward_rates,
+                                            strike_rate, reset_dates)
+
+            return cls(reset_breaks, caplet_vols)
+
+        strike_rates = np.array([Cap.get_par_cap(libor_curve, 1., maturity, payment_frequency).strike_rate
+                                 for maturity in maturities])
+
+        cap_premiums = Cap.present_value_batch(libor_curve, cap_vol_surface, 1., strike_rates, maturities,
+                                               payment_frequency)
+
+        reset_segments = np.argmax(segment_mask, axis=0)
+
+        caplet_vols = np.full(len(maturities), np.nan)
+
+        for j in range(len(maturities)):
+            # caplets of the earlier segments are priced at this cap's strike with their stripped vols
+            stripped_mask = reset_mask[j] & ~segment_mask[j]
+
+            segment_vols = caplet_vols[reset_segments]
+
+            stripped_premium = np.sum(np.where(stripped_mask, weights * black_price(forward_rates, strike_rates[j],
+                                                                                    segment_vols, reset_dates), 0))
+
+            caplet_vols[j] = black_implied_vol(cap_premiums[j] - stripped_premium,
+                                               np.where(segment_mask[j], weights, 0), forward_rates, strike_rates[j],
+                                               reset_dates)[0]
+
+        return cls(reset_breaks, caplet_vols)
+
+    def interpolate_vol(self, expiry):
+        """
+        Vol of the caplet resetting at expiry, flat beyond the last segment
+        """
+        return self._caplet_vols[self._segments(expiry)]
+
+    def caplet_vols(self, maturity, reset_dates):
+        return np.broadcast_to(self.interpolate_vol(reset_dates), np.broadcast_shapes(np.shape(maturity),
+                                                                                     np.shape(reset_dates)))
+
+    def interpolation_weights(self, expiry):
+        """
+        :return: array of shape expiry.shape + (segments,), one for the segment of the caplet resetting at expiry
+        """
+        return (self._segments(expiry)[..., None] == np.arange(len(self._caplet_vols))).astype(float)
+
+    def caplet_vol_weights(self, maturity, reset_dates):
+        weights = self.interpolation_weights(reset_dates)
+
+        return np.broadcast_to(weights, np.broadcast_shapes(np.shape(maturity), np.shape(reset_dates))
+                               + weights.shape[-1:])
+
+    def _segments(self, expiry):
+        segments = np.searchsorted(self._reset_breaks, np.asarray(expiry, dtype=float) - FLOAT_EQ_THRESHOLD)
+
+        return np.minimum(segments, len(self._caplet_vols) - 1)
+
+    @property
+    def expiries(self):
+        """
+        Last reset date of each segment, keying the segments' vols
+        """
+        return self._reset_breaks
+
+    @property
+    def reset_breaks(self):
+        return self._reset_breaks
+
+    @property
+    def vols(self):
+        return self._caplet_vols
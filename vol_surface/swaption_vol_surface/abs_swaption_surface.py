@@ -4,9 +4,28 @@ from abc import ABC, abstractmethod
 class AbsSwaptionSurface(ABC):
 
     @abstractmethod
-    def interpolate_vol(self, expiry, tenor):
+    def interpolate_vol(self, expiry, tenor, strike_offset=0.):
+        """
+        :param strike_offset: strike minus forward swap rate, surfaces without a smile ignore it
+        """
         pass
 
     @abstractmethod
     def bump_surface(self, n_bps_bump=1):
         pass
+
+    @abstractmethod
+    def interpolation_weights(self, expiry, tenor):
+        """
+        Weight of every surface point in the vols returned by interpolate_vol
+        :return: array of shape broadcast(expiry, tenor).shape + (points,)
+        """
+        pass
+
+    def point_weight(self, expiry, tenor, point_index: int):
+        """
+        Weight of a single surface point in the vols returned by interpolate_vol, surfaces on a grid compute it from
+        the bracketing cell alone
+        :return: array of shape broadcast(expiry, tenor).shape
+        """
+        return self.interpolation_weights(expiry, tenor)[..., point_index]
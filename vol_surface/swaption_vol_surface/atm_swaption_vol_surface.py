@@ -2,19 +2,36 @@ from typing import List
 
 import numpy as np
 import pandas as pd
-from scipy.interpolate import griddata
+from scipy.interpolate import LinearNDInterpolator, RegularGridInterpolator
 
+from product.interest_rate_swaption import InterestRateSwaption
 from utils.constants import BASIS_POINT_CONVERSION
+from utils.enum import CashFlowFrequency, PayerReceiver
+from utils.utils import bilinear_point_weight
 from vol_surface.swaption_vol_surface.abs_swaption_surface import AbsSwaptionSurface
+from vol_surface.swaption_vol_surface.bumped_swaption_vol_surface import BumpedSwaptionVolSurface
 
 
 class AtmSwaptionVolSurface(AbsSwaptionSurface):
+    """
+    Linear interpolation of ATM vols over (expiry, tenor), nan outside the quoted points. The interpolator is built
+    once: bilinear when the points form a full expiry x tenor grid, on a Delaunay triangulation otherwise. Bumped
+    surfaces are overlays on this one and share its interpolator.
+    """
 
     def __init__(self, points: np.array, data: np.array):
 
         self._points = points
         self._data = data
 
+        self._expiries, self._tenors, self._grid_indices = self._grid_layout(np.asarray(points, dtype=float))
+
+        if self._grid_indices is not None:
+            self._interpolator = RegularGridInterpolator((self._expiries, self._tenors), self._grid_data(data),
+                                                         bounds_error=False, fill_value=np.nan)
+        else:
+            self._interpolator = LinearNDInterpolator(points, data)
+
     @classmethod
     def from_market_data(cls, expiries: List[float], tenors: List[float], vol_data: List[List[float]]):
 
@@ -29,6 +46,23 @@ class AtmSwaptionVolSurface(AbsSwaptionSurface):
 
         return cls(np.array(points), np.array(data))
 
+    @classmethod
+    def from_market_premiums(cls, libor_curve, expiries: List[float], tenors: List[float],
+                             premiums: List[List[float]], notional: float = 1.,
+                             cash_flow_frequency: CashFlowFrequency = CashFlowFrequency.SEMI_ANNUAL):
+        """
+        Surface of Black vols implied from premiums of at-the-money payer swaptions, premiums[i][j] being the
+        premium of the expiries[i] into tenors[j] swaption
+        """
+        expiry_grid, tenor_grid = np.meshgrid(np.asarray(expiries, dtype=float), np.asarray(tenors, dtype=float),
+                                              indexing='ij')
+
+        vols = InterestRateSwaption.implied_vol_batch(libor_curve, np.ravel(premiums), notional, None,
+                                                      expiry_grid.ravel(), tenor_grid.ravel(), cash_flow_frequency,
+                                                      PayerReceiver.PAYER)
+
+        return cls.from_market_data(expiries, tenors, 100 * vols.reshape(expiry_grid.shape))
+
     @classmethod
     def from_csv(cls, path):
         df = pd.read_csv(path, index_col=0)
@@ -43,20 +77,133 @@ class AtmSwaptionVolSurface(AbsSwaptionSurface):
 
         return cls.from_market_data(expiries, tenors, vol_data)
 
-    def interpolate_vol(self, expiry, tenor):
-        return griddata(self._points, self._data, (np.array([expiry]), np.array([tenor])))[0]
+    def interpolate_vol(self, expiry, tenor, strike_offset=0.):
+        """
+        :param expiry: a time or an array of times, broadcast against tenor
+        :param strike_offset: ignored, the surface is flat in strike
+        """
+        expiry, tenor = np.broadcast_arrays(np.asarray(expiry, dtype=float), np.asarray(tenor, dtype=float))
+
+        vols = self._interpolator(np.stack([expiry, tenor], axis=-1).reshape(-1, 2)).reshape(expiry.shape)
+
+        return vols if vols.ndim else vols.item()
 
     def bump_surface(self, n_bps_bump=1):
 
-        bumped_surfaces = {}
+        return dict(self.iter_bumped_surfaces(n_bps_bump))
 
+    def iter_bumped_surfaces(self, n_bps_bump=1):
+        """
+        Yields ((expiry, tenor), surface with that point bumped) one surface at a time
+        """
         bump = n_bps_bump * BASIS_POINT_CONVERSION ** 2
 
         for i, point in enumerate(self._points):
-            data = self._data.copy()
+            yield tuple(point), BumpedSwaptionVolSurface(self, i, bump)
+
+    def interpolation_weights(self, expiry, tenor) -> np.ndarray:
+        """
+        Weight of every surface point in the interpolated vol, so that interpolate_vol = weights @ data and a vol
+        bump on point i moves the interpolated vol by bump * weights[..., i]
+        :return: array of shape broadcast(expiry, tenor).shape + (points,), nan rows outside the surface
+        """
+        expiry, tenor = np.broadcast_arrays(np.asarray(expiry, dtype=float), np.asarray(tenor, dtype=float))
+
+        query = np.stack([expiry, tenor], axis=-1).reshape(-1, 2)
+
+        if self._grid_indices is not None:
+            columns, corner_weights, outside = self._grid_weights(query)
+        else:
+            columns, corner_weights, outside = self._triangulation_weights(query)
+
+        weights = np.zeros((len(query), len(self._data)))
+
+        weights[np.arange(len(query))[:, None], columns] = corner_weights
+
+        weights[outside] = np.nan
+
+        return weights.reshape(expiry.shape + (len(self._data),))
+
+    def point_weight(self, expiry, tenor, point_index: int):
+        if self._grid_indices is None:
+            return super().point_weight(expiry, tenor, point_index)
+
+        return bilinear_point_weight(expiry, tenor, self._expiries, self._tenors,
+                                     *divmod(self._grid_indices[point_index], len(self._tenors)))
+
+    def _grid_weights(self, query: np.ndarray):
+        """
+        Bilinear weights on the four corners of each query's grid cell
+        """
+        cells, fractions = list(), list()
+
+        outside = np.zeros(len(query), dtype=bool)
+
+        for axis, knots in enumerate((self._expiries, self._tenors)):
+            x = query[:, axis]
+
+            cell = np.clip(np.searchsorted(knots, x, side='right') - 1, 0, len(knots) - 2)
+
+            cells.append(cell)
+
+            fractions.append((x - knots[cell]) / (knots[cell + 1] - knots[cell]))
+
+            outside |= (x < knots[0]) | (x > knots[-1])
+
+        (i, j), (u, v) = cells, fractions
+
+        corner_grid_indices = np.stack([i * len(self._tenors) + j, (i + 1) * len(self._tenors) + j,
+                                        i * len(self._tenors) + j + 1, (i + 1) * len(self._tenors) + j + 1], axis=-1)
+
+        corner_weights = np.stack([(1 - u) * (1 - v), u * (1 - v), (1 - u) * v, u * v], axis=-1)
+
+        point_of_grid_index = np.empty(len(self._grid_indices), dtype=int)
+
+        point_of_grid_index[self._grid_indices] = np.arange(len(self._grid_indices))
+
+        return point_of_grid_index[corner_grid_indices], corner_weights, outside
+
+    def _triangulation_weights(self, query: np.ndarray):
+        """
+        Barycentric weights on the vertices of the Delaunay simplex containing each query
+        """
+        triangulation = self._interpolator.tri
+
+        simplices = triangulation.find_simplex(query)
+
+        transforms = triangulation.transform[simplices]
+
+        barycentric = np.einsum('nij,nj->ni', transforms[:, :2], query - transforms[:, 2])
+
+        corner_weights = np.concatenate([barycentric, 1 - np.sum(barycentric, axis=-1, keepdims=True)], axis=-1)
+
+        return triangulation.simplices[simplices], corner_weights, simplices < 0
+
+    @property
+    def points(self):
+        return self._points
+
+    def _grid_data(self, data: np.ndarray) -> np.ndarray:
+        grid_data = np.empty((len(self._expiries), len(self._tenors)))
+
+        grid_data.flat[self._grid_indices] = data
+
+        return grid_data
+
+    @staticmethod
+    def _grid_layout(points: np.ndarray):
+        """
+        :return: sorted expiries, sorted tenors and the flat grid index of every point, the indices are None when the
+        points are not a full expiry x tenor grid with at least two expiries and two tenors
+        """
+        expiries, expiry_indices = np.unique(points[:, 0], return_inverse=True)
+
+        tenors, tenor_indices = np.unique(points[:, 1], return_inverse=True)
 
-            data[i] += bump
+        grid_indices = expiry_indices * len(tenors) + tenor_indices
 
-            bumped_surfaces[tuple(point)] = AtmSwaptionVolSurface(self._points.copy(), data)
+        if (len(expiries) < 2 or len(tenors) < 2 or len(points) != len(expiries) * len(tenors)
+                or len(np.unique(grid_indices)) != len(points)):
+            return expiries, tenors, None
 
-        return bumped_surfaces
+        return expiries, tenors, grid_indices
@@ -0,0 +1,43 @@
+from vol_surface.swaption_vol_surface.abs_swaption_surface import AbsSwaptionSurface
+
+
+class BumpedSwaptionVolSurface(AbsSwaptionSurface):
+    """
+    A base surface with the vol of one of its points bumped, stored as the base plus the bump times that point's
+    interpolation weight so that no data is copied and the base interpolator is reused
+    """
+
+    def __init__(self, base_surface, point_index: int, bump: float):
+        self._base_surface = base_surface
+
+        self._point_index = point_index
+
+        self._bump = bump
+
+    def interpolate_vol(self, expiry, tenor, strike_offset=0.):
+        weight = self._base_surface.point_weight(expiry, tenor, self._point_index)
+
+        vols = self._base_surface.interpolate_vol(expiry, tenor, strike_offset) + self._bump * weight
+
+        return vols if vols.ndim else vols.item()
+
+    def interpolation_weights(self, expiry, tenor):
+        """
+        A parallel bump leaves the weights of the base surface unchanged
+        """
+        return self._base_surface.interpolation_weights(expiry, tenor)
+
+    def bump_surface(self, n_bps_bump=1):
+        raise NotImplementedError("Bumping an already bumped surface is not supported.")
+
+    @property
+    def base_surface(self):
+        return self._base_surface
+
+    @property
+    def point_index(self):
+        return self._point_index
+
+    @property
+    def bump(self):
+        return self._bump
@@ -0,0 +1,186 @@
+import numpy as np
+
+from utils.constants import BASIS_POINT_CONVERSION
+from utils.sabr_model import calibrate_sabr, sabr_vol
+from utils.utils import bilinear_interpolation_weights, bilinear_point_weight, interpolation_cells
+from vol_surface.swaption_vol_surface.abs_swaption_surface import AbsSwaptionSurface
+from vol_surface.swaption_vol_surface.bumped_swaption_vol_surface import BumpedSwaptionVolSurface
+from vol_surface.swaption_vol_surface.swaption_vol_cube import SwaptionVolCube
+
+
+class SabrSwaptionVolSurface(AbsSwaptionSurface):
+    """
+    A SABR smile, with a common beta, for every (expiry, tenor) point of a grid. A vol is the bilinear interpolation
+    over expiry and tenor of the smiles of the surrounding points, each read at its own forward swap rate plus the
+    strike offset, nan outside the grid.
+    """
+
+    def __init__(self, expiries, tenors, forward_swap_rates, alphas, rhos, nus, beta: float = 0.5,
+                 calibration_errors=None, calibration_converged=None):
+        """
+        :param forward_swap_rates: array of shape (expiries, tenors), as are the SABR parameters
+        :param calibration_errors: root mean square vol error of every smile's fit
+        :param calibration_converged: whether every smile's fit converged
+        """
+        self._expiries = np.asarray(expiries, dtype=float)
+
+        self._tenors = np.asarray(tenors, dtype=float)
+
+        self._forward_swap_rates = np.asarray(forward_swap_rates, dtype=float)
+
+        self._alphas = np.asarray(alphas, dtype=float)
+
+        self._rhos = np.asarray(rhos, dtype=float)
+
+        self._nus = np.asarray(nus, dtype=float)
+
+        self._beta = beta
+
+        self._calibration_errors = calibration_errors
+
+        self._calibration_converged = calibration_converged
+
+        shape = (len(self._expiries), len(self._tenors))
+
+        assert all(a.shape == shape for a in (self._forward_swap_rates, self._alphas, self._rhos, self._nus)), shape
+
+    @classmethod
+    def calibrate(cls, forward_swap_rates, vol_cube: SwaptionVolCube, beta: float = 0.5,
+                  initial_surface: 'SabrSwaptionVolSurface' = None, **solver_kwargs):
+        """
+        Fits the smiles of every (expiry, tenor) point of a vol cube in one batched Levenberg-Marquardt, strikes with
+        a non positive rate are left out
+        :param forward_swap_rates: array of shape (expiries, tenors) on the grid of the vol cube, e.g. from
+        InterestRateSwaption.forward_swap_rates_batch
+        :param initial_surface: surface on the same grid to start from, e.g. the previous day's calibration
+        """
+        expiry_grid, tenor_grid = np.meshgrid(vol_cube.expiries, vol_cube.tenors, indexing='ij')
+
+        if np.shape(forward_swap_rates) != expiry_grid.shape:
+            raise ValueError("Forward swap rates must be on the grid of the vol cube.")
+
+        forward_swap_rates = np.asarray(forward_swap_rates, dtype=float).ravel()
+
+        strikes = forward_swap_rates[:, None] + vol_cube.strike_offsets
+
+        market_vols = np.asarray(vol_cube.vols, dtype=float).reshape(len(forward_swap_rates), -1)
+
+        initial_parameters = None
+
+        if initial_surface is not None:
+            if not (np.array_equal(initial_surface.expiries, vol_cube.expiries)
+                    and np.array_equal(initial_surface.tenors, vol_cube.tenors)):
+                raise ValueError("Initial surface must be on the grid of the vol cube.")
+
+            initial_parameters = np.stack([initial_surface.alphas.ravel(), initial_surface.rhos.ravel(),
+                                           initial_surface.nus.ravel()], axis=-1)
+
+        parameters, errors, converged = calibrate_sabr(forward_swap_rates, strikes, expiry_grid.ravel(), market_vols,
+                                                       beta, initial_parameters, **solver_kwargs)
+
+        alphas, rhos, nus = (p.reshape(expiry_grid.shape) for p in parameters.T)
+
+        return cls(vol_cube.expiries, vol_cube.tenors, forward_swap_rates.reshape(expiry_grid.shape), alphas, rhos,
+                   nus, beta, errors.reshape(expiry_grid.shape), converged.reshape(expiry_grid.shape))
+
+    def interpolate_vol(self, expiry, tenor, strike_offset=0.):
+        """
+        Arguments are broadcast against each other
+        """
+        expiry, tenor, strike_offset = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (
+            expiry, tenor, strike_offset)))
+
+        (i, i_up, u, expiry_outside), (j, j_up, v, tenor_outside) = (
+            interpolation_cells(self._expiries, expiry.ravel()), interpolation_cells(self._tenors, tenor.ravel()))
+
+        vols = np.zeros(expiry.size)
+
+        for expiry_index, expiry_weight in ((i, 1 - u), (i_up, u)):
+            for tenor_index, tenor_weight in ((j, 1 - v), (j_up, v)):
+                forward_swap_rates = self._forward_swap_rates[expiry_index, tenor_index]
+
+                smile_vols = sabr_vol(forward_swap_rates, forward_swap_rates + strike_offset.ravel(),
+                                      self._expiries[expiry_index], self._alphas[expiry_index, tenor_index],
+                                      self._beta, self._rhos[expiry_index, tenor_index],
+                                      self._nus[expiry_index, tenor_index])
+
+                weights = expiry_weight * tenor_weight
+
+                # smiles that do not contribute may be unusable, e.g. left uncalibrated
+                vols += np.where(weights > 0, weights * smile_vols, 0)
+
+        vols[expiry_outside | tenor_outside] = np.nan
+
+        vols = vols.reshape(expiry.shape)
+
+        return vols if vols.ndim else vols.item()
+
+    def interpolation_weights(self, expiry, tenor) -> np.ndarray:
+        """
+        Bilinear weight of every (expiry, tenor) point, a bump of a point shifting its whole smile
+        :return: array of shape broadcast(expiry, tenor).shape + (points,), points following the points property
+        """
+        return bilinear_interpolation_weights(expiry, tenor, self._expiries, self._tenors)
+
+    def point_weight(self, expiry, tenor, point_index: int):
+
+        return bilinear_point_weight(expiry, tenor, self._expiries, self._tenors,
+                                     *divmod(point_index, len(self._tenors)))
+
+    def bump_surface(self, n_bps_bump=1):
+
+        return dict(self.iter_bumped_surfaces(n_bps_bump))
+
+    def iter_bumped_surfaces(self, n_bps_bump=1):
+        """
+        Yields ((expiry, tenor), surface with that point's smile shifted in parallel) one overlay at a time
+        """
+        bump = n_bps_bump * BASIS_POINT_CONVERSION ** 2
+
+        for i, point in enumerate(self.points):
+            yield tuple(point), BumpedSwaptionVolSurface(self, i, bump)
+
+    @property
+    def points(self) -> np.ndarray:
+        """
+        (expiry, tenor) of every smile, expiry major
+        """
+        expiry_grid, tenor_grid = np.meshgrid(self._expiries, self._tenors, indexing='ij')
+
+        return np.stack([expiry_grid.ravel(), tenor_grid.ravel()], axis=-1)
+
+    @property
+    def expiries(self):
+        return self._expiries
+
+    @property
+    def tenors(self):
+        return self._tenors
+
+    @property
+    def forward_swap_rates(self):
+        return self._forward_swap_rates
+
+    @property
+    def alphas(self):
+        return self._alphas
+
+    @property
+    def rhos(self):
+        return self._rhos
+
+    @property
+    def nus(self):
+        return self._nus
+
+    @property
+    def beta(self):
+        return self._beta
+
+    @property
+    def calibration_errors(self):
+        return self._calibration_errors
+
+    @property
+    def calibration_converged(self):
+        return self._calibration_converged
@@ -1,3 +1,5 @@
+import numpy as np
+
 from vol_surface.swaption_vol_surface.abs_swaption_surface import AbsSwaptionSurface
 
 
@@ -5,8 +7,14 @@ class SwaptionFlatVolSurface(AbsSwaptionSurface):
     def __init__(self, vol: float):
         self._vol = vol
 
-    def interpolate_vol(self, expiry, tenor):
+    def interpolate_vol(self, expiry, tenor, strike_offset=0.):
         return self._vol
 
+    def interpolation_weights(self, expiry, tenor):
+        """
+        The flat vol is a single point weighted fully everywhere
+        """
+        return np.ones(np.broadcast_shapes(np.shape(expiry), np.shape(tenor)) + (1,))
+
     def bump_surface(self, n_bps_bump=1):
         raise NotImplementedError("Bumping Surface not supported for constant vol.")
\ No newline at end of file
@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+
+from utils.array_file import read_array_file, write_array_file
+from utils.constants import BASIS_POINT_CONVERSION
+from utils.utils import bilinear_interpolation_weights, bilinear_point_weight, interpolation_cells
+from vol_surface.swaption_vol_surface.abs_swaption_surface import AbsSwaptionSurface
+from vol_surface.swaption_vol_surface.bumped_swaption_vol_surface import BumpedSwaptionVolSurface
+
+SWAPTION_VOL_CUBE_MAGIC = b'QSWPCUBE'
+
+
+class SwaptionVolCube(AbsSwaptionSurface):
+    """
+    Black vols on a dense expiry x tenor x strike offset grid, the strike offset being the strike minus the forward
+    swap rate. Vols are interpolated trilinearly, nan outside the expiries and tenors and flat beyond the first and
+    last strike offsets. The vols array is used as given, a cube loaded from a file stays memory-mapped and lookups
+    only read the corners they need.
+    """
+
+    def __init__(self, expiries, tenors, strike_offsets, vols):
+        """
+        :param vols: array of shape (expiries, tenors, strike offsets), as decimals
+        """
+        self._expiries = np.asarray(expiries, dtype=float)
+
+        self._tenors = np.asarray(tenors, dtype=float)
+
+        self._strike_offsets = np.asarray(strike_offsets, dtype=float)
+
+        self._vols = vols
+
+        assert self._vols.shape == (len(self._expiries), len(self._tenors), len(self._strike_offsets)), vols.shape
+
+        assert all(np.all(np.diff(knots) > 0) for knots in (self._expiries, self._tenors, self._strike_offsets))
+
+    @classmethod
+    def from_csv(cls, path):
+        """
+        :param path: csv with one row per quote and columns Expiry, Tenor, StrikeOffset and Vol (in %), covering every
+        grid point
+        """
+        df = pd.read_csv(path)
+
+        cube = df.pivot_table(index=['Expiry', 'Tenor'], columns='StrikeOffset', values='Vol')
+
+        expiries = cube.index.levels[0].to_numpy(dtype=float)
+
+        tenors = cube.index.levels[1].to_numpy(dtype=float)
+
+        strike_offsets = cube.columns.to_numpy(dtype=float)
+
+        cube = cube.reindex(pd.MultiIndex.from_product([expiries, tenors]))
+
+        if cube.isna().to_numpy().any():
+            raise ValueError(f"{path} does not cover every expiry, tenor and strike offset.")
+
+        vols = cube.to_numpy(dtype=float).reshape(len(expiries), len(tenors), len(strike_offsets)) / 100
+
+        return cls(expiries, tenors, strike_offsets, vols)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Memory-maps a cube written by write, no vols are read until they are interpolated
+        """
+        expiries, tenors, strike_offsets, vols = read_array_file(path, SWAPTION_VOL_CUBE_MAGIC)
+
+        return cls(expiries, tenors, strike_offsets, vols)
+
+    def write(self, path):
+        write_array_file(path, SWAPTION_VOL_CUBE_MAGIC, [
+            self._expiries,
+            self._tenors,
+            self._strike_offsets,
+            np.asarray(self._vols, dtype=np.float64)
+        ])
+
+    def interpolate_vol(self, expiry, tenor, strike_offset=0.):
+        """
+        Arguments are broadcast against each other
+        """
+        expiry, tenor, strike_offset = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (
+            expiry, tenor, strike_offset)))
+
+        (i, i_up, u, expiry_outside), (j, j_up, v, tenor_outside) = (
+            interpolation_cells(self._expiries, expiry.ravel()), interpolation_cells(self._tenors, tenor.ravel()))
+
+        k, k_up, w, _ = interpolation_cells(self._strike_offsets, strike_offset.ravel())
+
+        w = np.clip(w, 0, 1)
+
+        vols = np.zeros(expiry.size)
+
+        for expiry_index, expiry_weight in ((i, 1 - u), (i_up, u)):
+            for tenor_index, tenor_weight in ((j, 1 - v), (j_up, v)):
+                for strike_index, strike_weight in ((k, 1 - w), (k_up, w)):
+                    vols += (expiry_weight * tenor_weight * strike_weight
+                             * self._vols[expiry_index, tenor_index, strike_index])
+
+        vols[expiry_outside | tenor_outside] = np.nan
+
+        vols = vols.reshape(expiry.shape)
+
+        return vols if vols.ndim else vols.item()
+
+    def interpolation_weights(self, expiry, tenor) -> np.ndarray:
+        """
+        Bilinear weight of every (expiry, tenor) point, a bump of a point shifting its whole smile
+        :return: array of shape broadcast(expiry, tenor).shape + (points,), points following the points property
+        """
+        return bilinear_interpolation_weights(expiry, tenor, self._expiries, self._tenors)
+
+    def point_weight(self, expiry, tenor, point_index: int):
+
+        return bilinear_point_weight(expiry, tenor, self._expiries, self._tenors,
+                                     *divmod(point_index, len(self._tenors)))
+
+    def bump_surface(self, n_bps_bump=1):
+
+        return dict(self.iter_bumped_surfaces(n_bps_bump))
+
+    def iter_bumped_surfaces(self, n_bps_bump=1):
+        """
+        Yields ((expiry, tenor), cube with that point's smile shifted in parallel) one overlay at a time
+        """
+        bump = n_bps_bump * BASIS_POINT_CONVERSION ** 2
+
+        for i, point in enumerate(self.points):
+            yield tuple(point), BumpedSwaptionVolSurface(self, i, bump)
+
+    @property
+    def points(self) -> np.ndarray:
+        """
+        (expiry, tenor) of every smile, expiry major
+        """
+        expiry_grid, tenor_grid = np.meshgrid(self._expiries, self._tenors, indexing='ij')
+
+        return np.stack([expiry_grid.ravel(), tenor_grid.ravel()], axis=-1)
+
+    @property
+    def expiries(self):
+        return self._expiries
+
+    @property
+    def tenors(self):
+        return self._tenors
+
+    @property
+    def strike_offsets(self):
+        return self._strike_offsets
+
+    @property
+    def vols(self):
+        return self._vols
@@ -1,11 +1,14 @@
 from abc import ABC, abstractmethod
-from math import log
+
+import numpy as np
 
 from utils.enum import CompoundingType
 
 
 class AbsCurve(ABC):
 
+    # t may be a float or an np.ndarray of times, array input returns an array of the same shape
+
     @abstractmethod
     def interpolate_curve(self, t):
         pass
@@ -23,11 +26,11 @@ class AbsCurve(ABC):
         pass
 
     def interpolate_forward_rate(self, t, term=1):
-        t_a = t
-        t_b = t + term
+        t_a = np.asarray(t)
+        t_b = t_a + term
 
         d_a = self.interpolate_discount_factor(t_a, compounding=CompoundingType.CONTINUOUS)
 
         d_b = self.interpolate_discount_factor(t_b, compounding=CompoundingType.CONTINUOUS)
 
-        return -1 * log(d_b / d_a) / term
\ No newline at end of file
+        return -1 * np.log(d_b / d_a) / term
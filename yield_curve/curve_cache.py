@@ -0,0 +1,81 @@
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Dict
+
+from utils.enum import CurveInstrument, InterpolationType
+from yield_curve.abs_curve import AbsCurve
+
+
+class CurveCache:
+    """
+    Bounded LRU cache of bootstrapped curves keyed by a hash of their market quotes and interpolation type.
+    Curves are shared between callers, LiborCurve keeps its arrays read-only and hands out copies of its quotes.
+    """
+
+    def __init__(self, max_size: int = 128):
+        assert max_size > 0
+
+        self._max_size = max_size
+
+        self._curves = OrderedDict()
+
+        self._hits = 0
+
+        self._misses = 0
+
+        self._evictions = 0
+
+    @staticmethod
+    def market_data_key(market_data: Dict[CurveInstrument, Dict[float, float]],
+                        interpolation_type: InterpolationType) -> str:
+        canonical_quotes = [interpolation_type.name]
+
+        for curve_instrument in sorted(market_data, key=lambda instrument: instrument.value):
+            canonical_quotes.append(curve_instrument.name)
+
+            canonical_quotes.extend(f"{float(t).hex()}:{float(quote).hex()}"
+                                    for t, quote in sorted(market_data[curve_instrument].items()))
+
+        return hashlib.sha256(";".join(canonical_quotes).encode()).hexdigest()
+
+    def get_or_build(self, key: str, build: Callable[[], AbsCurve]) -> AbsCurve:
+        if key in self._curves:
+            self._hits += 1
+
+            self._curves.move_to_end(key)
+
+            return self._curves[key]
+
+        self._misses += 1
+
+        curve = build()
+
+        self._curves[key] = curve
+
+        if len(self._curves) > self._max_size:
+            self._curves.popitem(last=False)
+
+            self._evictions += 1
+
+        return curve
+
+    def clear(self):
+        self._curves.clear()
+
+    def __contains__(self, key):
+        return key in self._curves
+
+    def __len__(self):
+        return len(self._curves)
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    @property
+    def evictions(self) -> int:
+        return self._evictions
@@ -0,0 +1,195 @@
+from collections.abc import Mapping
+from typing import Dict, Hashable, List
+
+import numpy as np
+from scipy.interpolate import CubicSpline
+
+from utils.enum import CompoundingType, InterpolationType
+from utils.utils import spot_rate_to_discount
+from yield_curve.abs_curve import AbsCurve
+
+
+class CurveSet(Mapping):
+    """
+    K curves held as stacked node arrays so that K curves x M times are interpolated in one numpy pass.
+
+    curve_times is either a shared (N,) node grid or a ragged (K, N) grid padded on the right with np.inf,
+    spot_rates is (K, N) with ragged rows padded with their last spot rate. Interpolation matches LiborCurve:
+    zero before the first node and flat after the last one.
+    """
+
+    def __init__(self, names: List[Hashable], curve_times: np.ndarray, spot_rates: np.ndarray,
+                 interpolation_type=InterpolationType.LINEAR, curves: Dict[Hashable, AbsCurve] = None):
+
+        self._names = list(names)
+
+        self._t = np.asarray(curve_times, dtype=float)
+
+        self._s = np.asarray(spot_rates, dtype=float)
+
+        assert self._s.ndim == 2 and self._s.shape[0] == len(self._names)
+
+        assert self._t.shape in (self._s.shape[1:], self._s.shape)
+
+        self._interpolation_type = interpolation_type
+
+        self._curves = curves
+
+        self._index = {name: i for i, name in enumerate(self._names)}
+
+        self._interpolator = None
+
+        if interpolation_type == InterpolationType.CUBIC_SPLINE:
+            if not self.is_shared_grid:
+                raise NotImplementedError("Cubic spline interpolation needs a shared node grid.")
+
+            self._interpolator = CubicSpline(self._t, self._s, axis=1, extrapolate=False)
+
+    @classmethod
+    def from_curves(cls, curves: Dict[Hashable, AbsCurve]):
+        names = list(curves.keys())
+
+        curve_times = [curves[name].curve_times for name in names]
+
+        spot_rates = [curves[name].spot_rates for name in names]
+
+        interpolation_types = {curves[name].interpolation_type for name in names}
+
+        assert len(interpolation_types) == 1, interpolation_types
+
+        if all(len(t) == len(curve_times[0]) and np.array_equal(t, curve_times[0]) for t in curve_times):
+            return cls(names, curve_times[0], np.array(spot_rates), interpolation_types.pop(), curves)
+
+        num_nodes = max(map(len, curve_times))
+
+        padded_times = np.full((len(names), num_nodes), np.inf)
+
+        padded_spot_rates = np.empty((len(names), num_nodes))
+
+        for i, (t, s) in enumerate(zip(curve_times, spot_rates)):
+            padded_times[i, :len(t)] = t
+            padded_spot_rates[i, :len(s)] = s
+            padded_spot_rates[i, len(s):] = s[-1]
+
+        return cls(names, padded_times, padded_spot_rates, interpolation_types.pop(), curves)
+
+    def interpolate_curve(self, t) -> np.ndarray:
+        """
+        :param t: float or array of times
+        :return: spot rates of shape (K,) + shape of t
+        """
+        t = np.asarray(t, dtype=float)
+
+        flat_t = t.reshape(-1)
+
+        if self._interpolation_type == InterpolationType.LINEAR:
+            spot_rates = self._interpolate_linear(flat_t)
+
+        elif self._interpolation_type == InterpolationType.CUBIC_SPLINE:
+            spot_rates = self._interpolator(flat_t)
+
+        else:
+            raise ValueError
+
+        return spot_rates.reshape((len(self),) + t.shape)
+
+    def interpolate_discount_factor(self, t, compounding=CompoundingType.CONTINUOUS) -> np.ndarray:
+        if compounding == CompoundingType.CONTINUOUS:
+            return spot_rate_to_discount(self.interpolate_curve(t), np.asarray(t))
+
+        else:
+            raise ValueError
+
+    def interpolate_forward_rate(self, t, term=1) -> np.ndarray:
+        d_a = self.interpolate_discount_factor(t)
+
+        d_b = self.interpolate_discount_factor(np.asarray(t) + term)
+
+        return -1 * np.log(d_b / d_a) / term
+
+    def _interpolate_linear(self, t: np.ndarray) -> np.ndarray:
+        num_nodes = self._s.shape[1]
+
+        if self.is_shared_grid:
+            lower = np.clip(np.searchsorted(self._t, t, side='right') - 1, 0, num_nodes - 2)
+
+            t_lower = self._t[lower]
+
+            upper_weight = np.clip((t - t_lower) / (self._t[lower + 1] - t_lower), 0, 1)
+
+            spot_rates = self._s[:, lower] * (1 - upper_weight) + self._s[:, lower + 1] * upper_weight
+
+            spot_rates[:, t < self._t[0]] = 0
+
+            return spot_rates
+
+        # one searchsorted for every curve, each curve's knots shifted past the previous one's and the padding moved
+        # beyond every query, so memory stays of the size of the result
+        padded = ~np.isfinite(self._t)
+
+        low = min(np.min(self._t), np.min(t, initial=np.inf))
+
+        high = max(np.max(np.where(padded, -np.inf, self._t)), np.max(t, initial=-np.inf))
+
+        offsets = (high - low + 1) * np.arange(len(self))[:, None]
+
+        shifted_knots = np.where(padded, high + 0.5, self._t) + offsets
+
+        flat_lower = np.searchsorted(shifted_knots.ravel(), (t[None, :] + offsets).ravel(), side='right')
+
+        lower = np.clip(flat_lower.reshape(len(self), -1) - num_nodes * np.arange(len(self))[:, None] - 1, 0,
+                        num_nodes - 2)
+
+        t_lower = np.take_along_axis(self._t, lower, axis=1)
+
+        # padded upper nodes sit at np.inf which gives a zero weight, i.e. flat extrapolation
+        upper_weight = np.clip((t - t_lower) / (np.take_along_axis(self._t, lower + 1, axis=1) - t_lower), 0, 1)
+
+        s_lower = np.take_along_axis(self._s, lower, axis=1)
+
+        spot_rates = s_lower + upper_weight * (np.take_along_axis(self._s, lower + 1, axis=1) - s_lower)
+
+        spot_rates[t[None, :] < self._t[:, :1]] = 0
+
+        return spot_rates
+
+    @property
+    def is_shared_grid(self) -> bool:
+        return self._t.ndim == 1
+
+    @property
+    def names(self) -> List[Hashable]:
+        return self._names
+
+    @property
+    def curve_times(self) -> np.ndarray:
+        return self._t
+
+    @property
+    def spot_rates(self) -> np.ndarray:
+        return self._s
+
+    @property
+    def interpolation_type(self) -> InterpolationType:
+        return self._interpolation_type
+
+    def __getitem__(self, name):
+        if self._curves is not None:
+            return self._curves[name]
+
+        # imported here as LiborCurve returns CurveSet from its bump methods
+        from yield_curve.libor_curve import LiborCurve
+
+        i = self._index[name]
+
+        num_nodes = self._s.shape[1] if self.is_shared_grid else np.count_nonzero(np.isfinite(self._t[i]))
+
+        curve_times = self._t if self.is_shared_grid else self._t[i, :num_nodes]
+
+        return LiborCurve.from_arrays(curve_times, self._s[i, :num_nodes], self._interpolation_type)
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
@@ -0,0 +1,45 @@
+from datetime import date
+from typing import Dict
+
+import numpy as np
+
+from utils.array_file import write_array_file, read_array_file
+from utils.enum import InterpolationType
+from yield_curve.curve_set import CurveSet
+from yield_curve.libor_curve import LiborCurve
+
+CURVE_SNAPSHOT_MAGIC = b'QCURVES\0'
+
+
+def write_curve_snapshot(path, curves: Dict[date, LiborCurve]):
+    """
+    Writes many dated curves to one binary file: the dates as ordinals, the curves' time grid, (nodes,) when it is
+    shared and otherwise (curves x nodes) padded the way CurveSet expects ragged grids, and the (curves x nodes)
+    float64 spot rates
+    """
+    dates = sorted(curves.keys())
+
+    interpolation_types = {curves[d].interpolation_type for d in dates}
+
+    assert len(interpolation_types) == 1, interpolation_types
+
+    curve_set = CurveSet.from_curves({d: curves[d] for d in dates})
+
+    write_array_file(path, CURVE_SNAPSHOT_MAGIC, [
+        np.array([interpolation_types.pop().value], dtype=np.int64),
+        np.array([d.toordinal() for d in dates], dtype=np.int64),
+        curve_set.curve_times.astype(np.float64),
+        curve_set.spot_rates.astype(np.float64)
+    ])
+
+
+def load_curve_snapshot(path) -> CurveSet:
+    """
+    Memory-maps a curve snapshot, no curve data is read until it is used. The returned CurveSet is keyed by date,
+    indexing it gives a LiborCurve on views of the mapped arrays.
+    """
+    interpolation_type, ordinals, curve_times, spot_rates = read_array_file(path, CURVE_SNAPSHOT_MAGIC)
+
+    dates = [date.fromordinal(ordinal) for ordinal in ordinals.tolist()]
+
+    return CurveSet(dates, curve_times, spot_rates, InterpolationType(int(interpolation_type[0])))
@@ -0,0 +1,75 @@
+from math import floor
+
+import numpy as np
+
+from yield_curve.abs_curve import AbsCurve
+
+
+class DiscountFactorTable:
+    """
+    Discount factors precomputed on a uniform time grid, looked up with index arithmetic and a linear blend
+    between the two neighbouring grid points instead of a binary search and an exp per call.
+    """
+
+    def __init__(self, curve: AbsCurve, time_step: float = 1 / 365, max_time: float = 50.):
+        self._time_step = time_step
+
+        num_steps = int(round(max_time / time_step))
+
+        self._max_time = num_steps * time_step
+
+        grid = np.arange(num_steps + 1) * time_step
+
+        self._discount_factors = curve.interpolate_discount_factor(grid)
+
+        # plain floats for the scalar path, indexing a list avoids creating numpy scalars
+        self._discount_factor_list = self._discount_factors.tolist()
+
+        self._last_index = len(self._discount_factor_list) - 2
+
+        # the blend error peaks half way between grid points, curve nodes are added to catch the kinks
+        check_times = grid[:-1] + time_step / 2
+
+        curve_times = getattr(curve, 'curve_times', np.array([]))
+
+        check_times = np.concatenate((check_times, curve_times[curve_times <= self._max_time]))
+
+        self._max_error = float(np.nanmax(np.abs(
+            self.lookup(check_times) - curve.interpolate_discount_factor(check_times))))
+
+    def covers(self, t):
+        if isinstance(t, float) or isinstance(t, int):
+            return 0 <= t <= self._max_time
+
+        return np.logical_and(np.asarray(t) >= 0, np.asarray(t) <= self._max_time)
+
+    def lookup(self, t):
+        if isinstance(t, float) or isinstance(t, int):
+            x = t / self._time_step
+            i = min(floor(x), self._last_index)
+            d_i = self._discount_factor_list[i]
+            return d_i + (x - i) * (self._discount_factor_list[i + 1] - d_i)
+
+        x = np.asarray(t) * (1 / self._time_step)
+
+        # truncation is floor as covered times are non negative
+        i = np.minimum(x.astype(np.intp), self._last_index)
+
+        d_i = self._discount_factors.take(i)
+
+        return d_i + (x - i) * (self._discount_factors.take(i + 1) - d_i)
+
+    @property
+    def max_error(self) -> float:
+        """
+        Maximum absolute discount factor error against the exact interpolation of the curve
+        """
+        return self._max_error
+
+    @property
+    def time_step(self) -> float:
+        return self._time_step
+
+    @property
+    def max_time(self) -> float:
+        return self._max_time
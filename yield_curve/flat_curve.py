@@ -1,3 +1,5 @@
+import numpy as np
+
 from utils.enum import CompoundingType
 from utils.utils import spot_rate_to_discount
 from yield_curve.abs_curve import AbsCurve
@@ -15,7 +17,10 @@ class FlatCurve(AbsCurve):
         raise NotImplementedError
 
     def interpolate_curve(self, t):
-        return self._spot_rate
+        if np.ndim(t) == 0:
+            return self._spot_rate
+
+        return np.full(np.shape(t), self._spot_rate)
 
     def interpolate_discount_factor(self, t, compounding=CompoundingType.CONTINUOUS):
-        return spot_rate_to_discount(self._spot_rate, t)
\ No newline at end of file
+        return spot_rate_to_discount(self._spot_rate, np.asarray(t))
@@ -0,0 +1,65 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Tuple
+
+from utils.enum import CurveInstrument, InterpolationType
+from yield_curve.libor_curve import LiborCurve
+
+
+@dataclass
+class ChunkTiming:
+    first_date: date
+    last_date: date
+    num_curves: int
+    seconds: float
+    process_id: int
+
+
+def _build_chunk(dated_market_data: List[Tuple[date, Dict[CurveInstrument, Dict[float, float]]]],
+                 interpolation_type: InterpolationType):
+    start = time.perf_counter()
+
+    curves = [(curve_date, LiborCurve.from_market_data_dict(market_data, interpolation_type=interpolation_type))
+              for curve_date, market_data in dated_market_data]
+
+    timing = ChunkTiming(dated_market_data[0][0], dated_market_data[-1][0], len(curves),
+                         time.perf_counter() - start, os.getpid())
+
+    return curves, timing
+
+
+def build_historical_curves(market_data_history: Dict[date, Dict[CurveInstrument, Dict[float, float]]],
+                            max_workers: int = None, chunk_size: int = 250,
+                            interpolation_type=InterpolationType.LINEAR
+                            ) -> Tuple[Dict[date, LiborCurve], List[ChunkTiming]]:
+    """
+    Bootstraps a curve for every date of a quote history, in chunks of chunk_size dates spread over a process pool
+    :param market_data_history: market data dicts, as taken by LiborCurve.from_market_data_dict, keyed by date
+    :param max_workers: process pool size, None uses the number of CPUs and 1 builds in this process
+    :param chunk_size: number of dates bootstrapped per task
+    :param interpolation_type:
+    :return: curves keyed by date in date order, and the timing of every chunk
+    """
+    dated_market_data = sorted(market_data_history.items(), key=lambda item: item[0])
+
+    chunks = [dated_market_data[i:i + chunk_size] for i in range(0, len(dated_market_data), chunk_size)]
+
+    if max_workers == 1:
+        results = [_build_chunk(chunk, interpolation_type) for chunk in chunks]
+
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_build_chunk, chunks, [interpolation_type] * len(chunks)))
+
+    curves = dict()
+
+    chunk_timings = []
+
+    for chunk_curves, timing in results:
+        curves.update(chunk_curves)
+        chunk_timings.append(timing)
+
+    return curves, chunk_timings
@@ -1,14 +1,17 @@
-from copy import deepcopy
+from copy import copy, deepcopy
 from dataclasses import asdict
-from typing import List, Dict, Union
+from typing import Dict, Iterator, List, Tuple, Union
 
 import numpy as np
 from scipy.interpolate import CubicSpline
 
 from utils.constants import BASIS_POINT_CONVERSION
 from utils.enum import CurveInstrument, InterpolationType, CompoundingType
-from utils.utils import *
+from utils.utils import linear_interpolation_weights, spot_rate_to_discount
 from yield_curve.abs_curve import AbsCurve
+from yield_curve.curve_cache import CurveCache
+from yield_curve.curve_set import CurveSet
+from yield_curve.discount_factor_table import DiscountFactorTable
 from yield_curve.libor_curve_builder.long_libor_curve_builder import LongLiborCurveBuilder
 from yield_curve.libor_curve_builder.mid_libor_curve_builder import MidLiborCurveBuilder
 from yield_curve.libor_curve_builder.short_libor_curve_builder import ShortLiborCurveBuilder
@@ -19,7 +22,8 @@ from yield_curve.spot_rate_point import SpotRatePoint
 class LiborCurve(AbsCurve):
 
     def __init__(self, curve_points: Union[List[SpotRatePoint], List[Dict[str, float]]],
-                 interpolation_type=InterpolationType.LINEAR, market_quotes: dict = None):
+                 interpolation_type=InterpolationType.LINEAR, market_quotes: dict = None,
+                 curve_builders: tuple = None, curve_cache: CurveCache = None):
 
         is_curve_point_data_obj = any([isinstance(curve_point, SpotRatePoint) for curve_point in curve_points])
 
@@ -38,36 +42,86 @@ class LiborCurve(AbsCurve):
 
         assert all(['time' in curve_point and 'spot_rate' in curve_point for curve_point in curve_points])
 
+        get_time = lambda curve_point: curve_point['time']
+        curve_times = np.array(list(map(get_time, curve_points)))
+
+        get_spot_rate = lambda curve_point: curve_point['spot_rate']
+        spot_rates = np.array(list(map(get_spot_rate, curve_points)))
+
+        self._initialise(curve_times, spot_rates, interpolation_type, market_quotes, curve_builders, curve_cache)
+
+    def _initialise(self, curve_times: np.ndarray, spot_rates: np.ndarray, interpolation_type: InterpolationType,
+                    market_quotes: dict, curve_builders: tuple, curve_cache: CurveCache):
         self._market_quotes = market_quotes
 
+        # (short, mid, long) builders the curve was bootstrapped with, kept for incremental re-bootstrapping
+        self._curve_builders = curve_builders
+
+        # cache the curve was built through, its bumped curves are cached there too
+        self._curve_cache = curve_cache
+
         self._interpolation_type = interpolation_type
 
         self._interpolator = None
 
-        get_time = lambda curve_point: curve_point['time']
-        self._t = np.array(list(map(get_time, curve_points)))
+        self._discount_factor_table = None
 
-        get_spot_rate = lambda curve_point: curve_point['spot_rate']
-        self._s = np.array(list(map(get_spot_rate, curve_points)))
+        # read-only views as curves may be shared through a CurveCache
+        self._t = curve_times.view()
+        self._t.setflags(write=False)
+
+        self._s = spot_rates.view()
+        self._s.setflags(write=False)
 
         if interpolation_type == InterpolationType.CUBIC_SPLINE:
             self._interpolator = CubicSpline(self._t, self._s, extrapolate=False)
 
-        self._yield_curve_points = dict(zip(self._t, self._s))
+        self._yield_curve_points = None
 
     @classmethod
-    def from_market_data_dict(cls, market_data: dict):
+    def from_arrays(cls, curve_times: np.ndarray, spot_rates: np.ndarray,
+                    interpolation_type=InterpolationType.LINEAR):
+        """
+        Builds the curve directly on the given time and spot rate arrays without copying them, e.g. rows of a
+        memory-mapped curve snapshot
+        """
+        curve = cls.__new__(cls)
+
+        curve._initialise(np.asarray(curve_times), np.asarray(spot_rates), interpolation_type, None, None, None)
+
+        return curve
+
+    @classmethod
+    def from_market_data_dict(cls, market_data: dict, interpolation_type=InterpolationType.LINEAR,
+                              curve_cache: CurveCache = None):
         assert all([curve_instrument in market_data for curve_instrument in (
             CurveInstrument.CASH_DEPOSIT, CurveInstrument.IR_FUTURES, CurveInstrument.IR_SWAP)])
 
         return cls.from_market_quotes(
             market_data[CurveInstrument.CASH_DEPOSIT], market_data[CurveInstrument.IR_FUTURES],
-            market_data[CurveInstrument.IR_SWAP]
+            market_data[CurveInstrument.IR_SWAP], interpolation_type=interpolation_type, curve_cache=curve_cache
         )
 
     @classmethod
     def from_market_quotes(cls, cash_libor_rates: Dict[float, float], eurodollar_futures_prices: Dict[float, float],
-                 market_swap_rates: Dict[float, float], interpolation_type=InterpolationType.LINEAR):
+                 market_swap_rates: Dict[float, float], interpolation_type=InterpolationType.LINEAR,
+                 curve_cache: CurveCache = None):
+        # private time-ordered copies so the curve cannot change if the caller's dicts do
+        cash_libor_rates = dict(sorted(cash_libor_rates.items()))
+        eurodollar_futures_prices = dict(sorted(eurodollar_futures_prices.items()))
+        market_swap_rates = dict(sorted(market_swap_rates.items()))
+
+        market_data = {
+            CurveInstrument.CASH_DEPOSIT: cash_libor_rates, CurveInstrument.IR_FUTURES: eurodollar_futures_prices,
+            CurveInstrument.IR_SWAP: market_swap_rates
+        }
+
+        if curve_cache is not None:
+            return curve_cache.get_or_build(
+                CurveCache.market_data_key(market_data, interpolation_type),
+                lambda: cls.from_market_quotes(cash_libor_rates, eurodollar_futures_prices, market_swap_rates,
+                                               interpolation_type)._with_curve_cache(curve_cache))
+
         # short yield_curve
         scb = ShortLiborCurveBuilder(cash_libor_rates)
 
@@ -77,20 +131,14 @@ class LiborCurve(AbsCurve):
 
         mid_curve_data = mcb.curve
 
-        curve_data = mid_curve_data
+        lcb = LongLiborCurveBuilder(mid_curve_data, market_swap_rates)
 
-        lcb = LongLiborCurveBuilder(curve_data, market_swap_rates)
+        curve_data = mid_curve_data + lcb.curve
 
-        curve_data += lcb.curve
+        return cls(curve_data, interpolation_type=interpolation_type, market_quotes=market_data,
+                   curve_builders=(scb, mcb, lcb))
 
-        market_data = {
-            CurveInstrument.CASH_DEPOSIT: cash_libor_rates, CurveInstrument.IR_FUTURES: eurodollar_futures_prices,
-            CurveInstrument.IR_SWAP: market_swap_rates
-        }
-
-        return cls(curve_data, interpolation_type=interpolation_type, market_quotes=market_data)
-
-    def interpolate_curve(self, t) -> float:
+    def interpolate_curve(self, t):
         if self._interpolation_type == InterpolationType.LINEAR:
             s_interp = np.interp(t, self._t, self._s, left=0)
             return s_interp
@@ -101,47 +149,119 @@ class LiborCurve(AbsCurve):
         else:
             raise ValueError
 
-    def interpolate_discount_factor(self, t, compounding=CompoundingType.CONTINUOUS):
-        if compounding == CompoundingType.CONTINUOUS:
-            return spot_rate_to_discount(self.interpolate_curve(t), t)
+    def interpolation_weights(self, t) -> np.ndarray:
+        """
+        Weights w such that interpolate_curve(t) == w @ spot_rates, i.e. d(spot rate at t) / d(spot rate at each node)
+        :return: array of shape t.shape + (number of curve points,)
+        """
+        t = np.asarray(t, dtype=float)
+
+        if self._interpolation_type == InterpolationType.LINEAR:
+            weights = linear_interpolation_weights(t.ravel(), self._t)
+
+            # interpolate_curve is zero before the first node
+            weights[t.ravel() < self._t[0]] = 0
+
+            return weights.reshape(t.shape + (len(self._t),))
+
+        elif self._interpolation_type == InterpolationType.CUBIC_SPLINE:
+            # the spline is linear in its data so interpolating the identity gives the weights
+            return CubicSpline(self._t, np.eye(len(self._t)), extrapolate=False)(t)
 
         else:
             raise ValueError
 
-    def interpolate_forward_rate(self, t, term=1):
-        t_a = t
-        t_b = t + term
+    def interpolate_discount_factor(self, t, compounding=CompoundingType.CONTINUOUS):
+        if compounding != CompoundingType.CONTINUOUS:
+            raise ValueError
+
+        if self._discount_factor_table is not None:
+            covered = self._discount_factor_table.covers(t)
 
-        d_a = self.interpolate_discount_factor(t_a, compounding=CompoundingType.CONTINUOUS)
+            if covered is True or np.all(covered):
+                return self._discount_factor_table.lookup(t)
 
-        d_b = self.interpolate_discount_factor(t_b, compounding=CompoundingType.CONTINUOUS)
+            if np.ndim(t) > 0 and np.any(covered):
+                t = np.asarray(t)
+                discount_factors = spot_rate_to_discount(self.interpolate_curve(t), t)
+                discount_factors[covered] = self._discount_factor_table.lookup(t[covered])
+                return discount_factors
 
-        return -1 * log(d_b / d_a) / term
+        t = np.asarray(t)
+        return spot_rate_to_discount(self.interpolate_curve(t), t)
 
-    def bump_curve_by_instrument(self, n_bps_bump=1):
-        bumped_curves = dict()
+    def with_discount_factor_table(self, time_step: float = 1 / 365, max_time: float = 50.):
+        """
+        Returns a copy of the curve that looks discount factors up from a precomputed uniform grid for times in
+        [0, max_time], e.g. daily out to 50Y. The table's max_error reports the largest discount factor error
+        against the exact interpolation so the grid resolution can be chosen.
+        """
+        curve = copy(self)
 
+        curve._discount_factor_table = DiscountFactorTable(self, time_step, max_time)
+
+        return curve
+
+    @property
+    def discount_factor_table(self) -> DiscountFactorTable:
+        return self._discount_factor_table
+
+    def bump_curve_by_instrument(self, n_bps_bump=1) -> CurveSet:
+
+        return CurveSet.from_curves(dict(self.iter_bumped_curves(n_bps_bump)))
+
+    def iter_bumped_curves(self, n_bps_bump=1) -> Iterator[Tuple[str, 'LiborCurve']]:
+        """
+        Yields (node name, curve rebuilt with that instrument's quote bumped) one curve at a time, so a caller can
+        stream through the bumps without holding every bumped curve
+        """
         market_data = self.market_quotes
 
         for curve_instrument, quotes in market_data.items():
 
-            market_data_copy = deepcopy(market_data)
-
             for time, quote in quotes.items():
-                curve_instrument_quotes_copy = deepcopy(market_data[curve_instrument])
+                curve_instrument_quotes_copy = dict(quotes)
 
                 curve_instrument_quotes_copy[time] += n_bps_bump * BASIS_POINT_CONVERSION
 
-                market_data_copy[curve_instrument] = curve_instrument_quotes_copy
+                market_data_copy = dict(market_data)
 
-                time_str = f"{round(time)}Y" if time.is_integer() else f"{round(time * 12)}M"
+                market_data_copy[curve_instrument] = curve_instrument_quotes_copy
 
-                bumped_curves["_".join((curve_instrument.name, time_str))] = LiborCurve.from_market_data_dict(
+                yield self.instrument_node_name(curve_instrument, time), self.rebuild_from_market_data(
                     market_data_copy)
 
-        return bumped_curves
+    def bump_quotes(self, node_bumps: Dict[str, float]) -> 'LiborCurve':
+        """
+        Curve rebuilt with several quotes bumped together
+        :param node_bumps: bump in bps keyed by instrument node name, as in instrument_node_names
+        """
+        market_data = self.market_quotes
+
+        bumped_nodes = 0
+
+        for curve_instrument, quotes in market_data.items():
+
+            for time in quotes:
+                node = self.instrument_node_name(curve_instrument, time)
+
+                if node in node_bumps:
+                    quotes[time] += node_bumps[node] * BASIS_POINT_CONVERSION
+
+                    bumped_nodes += 1
+
+        if bumped_nodes != len(node_bumps):
+            raise ValueError(f"Unknown curve nodes in {list(node_bumps)}.")
+
+        return self.rebuild_from_market_data(market_data)
 
     def parallel_bump_curve(self, n_bps_bump=1):
+        """
+        :param n_bps_bump: a bump size, or a list of bump sizes to get a CurveSet keyed by bump size
+        """
+        if np.ndim(n_bps_bump) > 0:
+            return CurveSet.from_curves({bump: self.parallel_bump_curve(bump) for bump in n_bps_bump})
+
         market_data = self.market_quotes
 
         market_data_copy = deepcopy(market_data)
@@ -153,17 +273,146 @@ class LiborCurve(AbsCurve):
 
                 market_data_copy[curve_instrument][time] = new_quote
 
-        return LiborCurve.from_market_data_dict(market_data_copy)
+        return self.rebuild_from_market_data(market_data_copy)
+
+    def rebuild_from_market_data(self, market_data: dict):
+        """
+        Re-bootstraps the curve for new market quotes, reusing the part of the bootstrap that the changed quotes
+        cannot affect. Deposits are independent of each other, futures are chained from the last deposit and the
+        swap pillars are chained from the futures, so a change only invalidates the points from it onwards. Quotes
+        on other tenors than the curve's are bootstrapped in full.
+        """
+        # time-ordered copies as in from_market_quotes, the builders pair the quotes with their tenors in order
+        market_data = {curve_instrument: dict(sorted(quotes.items()))
+                       for curve_instrument, quotes in market_data.items()}
+
+        if self._curve_builders is None or not self._has_same_tenors(market_data):
+            return LiborCurve.from_market_data_dict(market_data, interpolation_type=self._interpolation_type,
+                                                    curve_cache=self._curve_cache)
+
+        if self._curve_cache is not None:
+            return self._curve_cache.get_or_build(
+                CurveCache.market_data_key(market_data, self._interpolation_type),
+                lambda: self._rebuild_from_market_data(market_data))
+
+        return self._rebuild_from_market_data(market_data)
+
+    def _has_same_tenors(self, market_data: dict) -> bool:
+
+        return market_data.keys() == self._market_quotes.keys() and all(
+            list(market_data[curve_instrument]) == list(quotes)
+            for curve_instrument, quotes in self._market_quotes.items())
+
+    def _rebuild_from_market_data(self, market_data: dict):
+        scb, mcb, lcb = self._curve_builders
+
+        cash_changed = market_data[CurveInstrument.CASH_DEPOSIT] != self._market_quotes[CurveInstrument.CASH_DEPOSIT]
+
+        futures_changed = market_data[CurveInstrument.IR_FUTURES] != self._market_quotes[CurveInstrument.IR_FUTURES]
+
+        swaps_changed = market_data[CurveInstrument.IR_SWAP] != self._market_quotes[CurveInstrument.IR_SWAP]
+
+        if cash_changed:
+            scb = scb.rebuild_curve(market_data[CurveInstrument.CASH_DEPOSIT])
+
+            mcb = MidLiborCurveBuilder(market_data[CurveInstrument.IR_FUTURES], scb.curve)
+
+        elif futures_changed:
+            mcb = mcb.rebuild_curve(market_data[CurveInstrument.IR_FUTURES])
+
+        if cash_changed or futures_changed:
+            lcb = LongLiborCurveBuilder(mcb.curve, market_data[CurveInstrument.IR_SWAP])
+
+        elif swaps_changed:
+            lcb = lcb.rebuild_curve(market_data[CurveInstrument.IR_SWAP])
+
+        return LiborCurve(mcb.curve + lcb.curve, interpolation_type=self._interpolation_type,
+                          market_quotes=market_data, curve_builders=(scb, mcb, lcb), curve_cache=self._curve_cache)
+
+    def _with_curve_cache(self, curve_cache: CurveCache):
+        self._curve_cache = curve_cache
+
+        return self
+
+    @staticmethod
+    def instrument_node_name(curve_instrument: CurveInstrument, time: float) -> str:
+        time_str = f"{round(time)}Y" if time.is_integer() else f"{round(time * 12)}M"
+
+        return "_".join((curve_instrument.name, time_str))
+
+    @property
+    def instrument_node_names(self) -> List[str]:
+        return [self.instrument_node_name(curve_instrument, time)
+                for curve_instrument, quotes in self.market_quotes.items() for time in quotes]
+
+    @property
+    def jacobian(self) -> np.ndarray:
+        """
+        d(spot_rate) / d(market quote) carried through the bootstrap. Rows follow the curve points and columns
+        follow instrument_node_names, quotes are in their market units (% for deposits and swaps, price for futures)
+        """
+        if self._curve_builders is None:
+            raise ValueError("Jacobian is only available for curves bootstrapped from market quotes.")
+
+        scb, mcb, lcb = self._curve_builders
+
+        num_cash = len(self._market_quotes[CurveInstrument.CASH_DEPOSIT])
+        num_futures = len(self._market_quotes[CurveInstrument.IR_FUTURES])
+        num_swaps = len(self._market_quotes[CurveInstrument.IR_SWAP])
+
+        short_jacobian = np.zeros((len(scb.curve), num_cash + num_futures + num_swaps))
+        short_jacobian[:, :num_cash] = scb.quote_jacobian
+
+        mid_jacobian = mcb.short_curve_jacobian @ short_jacobian
+        mid_jacobian[:, num_cash:num_cash + num_futures] += mcb.quote_jacobian
+
+        previous_jacobian = np.vstack((short_jacobian, mid_jacobian))
+
+        long_jacobian = lcb.previous_curve_jacobian @ previous_jacobian
+        long_jacobian[:, num_cash + num_futures:] += lcb.quote_jacobian
+
+        return np.vstack((previous_jacobian, long_jacobian))
+
+    def instrument_risk(self, zero_rate_sensitivities: np.ndarray, n_bps_bump=1) -> Dict[str, float]:
+        """
+        Maps the sensitivities of a value to the curve's spot rates onto its market quotes, giving the first order
+        equivalent of repricing on every curve returned by bump_curve_by_instrument
+        :param zero_rate_sensitivities: d(value) / d(spot_rate) for each curve point
+        :param n_bps_bump:
+        :return: risk keyed by instrument node name
+        """
+        risk = np.asarray(zero_rate_sensitivities) @ self.jacobian * n_bps_bump * BASIS_POINT_CONVERSION
+
+        return dict(zip(self.instrument_node_names, risk))
 
     def is_extrapolated(self, t):
-        return t > max(self._t) or t < min(self._t)
+        return np.logical_or(np.asarray(t) > self._t.max(), np.asarray(t) < self._t.min())
 
     def __getitem__(self, time):
+        if self._yield_curve_points is None:
+            self._yield_curve_points = dict(zip(self._t, self._s))
+
         if time in self._yield_curve_points:
             return self._yield_curve_points[time]
         else:
             return self.interpolate_curve(time)
 
+    @property
+    def curve_times(self) -> np.ndarray:
+        return self._t
+
+    @property
+    def spot_rates(self) -> np.ndarray:
+        return self._s
+
+    @property
+    def interpolation_type(self) -> InterpolationType:
+        return self._interpolation_type
+
     @property
     def market_quotes(self) -> Dict[CurveInstrument, Dict[float, float]]:
-        return self._market_quotes
+        if self._market_quotes is None:
+            return None
+
+        # copies, the curve's own quotes must not change after it is built
+        return {curve_instrument: dict(quotes) for curve_instrument, quotes in self._market_quotes.items()}
@@ -1,16 +1,24 @@
+from copy import copy
 from typing import Dict, List
 
 import numpy as np
 
 from utils.constants import FLOAT_EQ_THRESHOLD
-from utils.utils import spot_rate_to_discount, discount_to_spot_rate
+from utils.utils import spot_rate_to_discount, discount_to_spot_rate, linear_interpolation_weights
+from yield_curve.libor_curve_builder.utils import first_changed_index
 
 
 class LongLiborCurveBuilder:
+    """
+    Bootstraps the swap pillars on a semi-annual grid. With a = 2 / (2 + swap_rate) the running sum of discount
+    factors follows S_k = a_k * (S_k-1 + 1), which is solved for the whole grid with cumulative products and sums.
+    """
     _key_f = lambda dp: dp['time']
 
     _val_f = lambda dp: dp['value']
 
+    _grid_step = 0.5
+
     def __init__(self, previous_libor_data_points: List[Dict[str, float]], swap_quotes: Dict[float, float]):
 
         self._swap_quotes = swap_quotes
@@ -19,27 +27,53 @@ class LongLiborCurveBuilder:
 
         self._s = np.array(list(swap_quotes.values()))
 
-        previous_points_t = []
-        previous_points_s = []
-        for point in previous_libor_data_points:
-            previous_points_t.append(point['time'])
-            previous_points_s.append(point['spot_rate'])
+        previous_points_t = np.array([point['time'] for point in previous_libor_data_points])
+        previous_points_s = np.array([point['spot_rate'] for point in previous_libor_data_points])
+
+        self._num_previous_points = len(previous_points_t)
+
+        num_inputs = self._num_previous_points + len(self._t)
+
+        # grid points covered by the previous curve
+        previous_grid = self._grid_step * np.arange(1, int(np.floor(previous_points_t[-1] / self._grid_step)) + 1)
+
+        previous_grid_spot_rates = np.interp(previous_grid, previous_points_t, previous_points_s, left=1)
+
+        if len(previous_grid):
+            previous_grid_spot_rates[0] = np.interp(previous_grid[0], previous_points_t, previous_points_s, left=0)
+
+        previous_grid_discount_factors = spot_rate_to_discount(previous_grid_spot_rates, previous_grid)
+
+        self._initial_discount_factors_sum = previous_grid_discount_factors.sum()
+
+        # d(discount_factors_sum) / d(previous spot rates, swap quotes)
+        self._initial_discount_factors_sum_gradient = np.zeros(num_inputs)
+
+        interpolated = previous_grid >= previous_points_t[0]
+
+        self._initial_discount_factors_sum_gradient[:self._num_previous_points] = -1 * (
+                previous_grid * previous_grid_discount_factors * interpolated) @ linear_interpolation_weights(
+            previous_grid, previous_points_t)
+
+        first_grid_time = self._grid_step * (len(previous_grid) + 1)
+
+        num_grid_points = int(round((self._t[-1] - first_grid_time) / self._grid_step)) + 1
 
-        previous_points_t = np.array(previous_points_t)
-        previous_points_s = np.array(previous_points_s)
+        self._grid = first_grid_time + self._grid_step * np.arange(num_grid_points)
 
-        self._discount_factors_sum = 0
+        self._pillar_indices = np.round((self._t - first_grid_time) / self._grid_step).astype(int)
 
-        self._iter_t = 0.5
+        assert np.all(np.abs(self._grid[self._pillar_indices] - self._t) < FLOAT_EQ_THRESHOLD), \
+            "Swap pillars must lie on the semi-annual grid after the previous curve."
 
-        discount_factor = spot_rate_to_discount(
-            np.interp(self._iter_t, previous_points_t, previous_points_s, right=np.nan, left=0), self._iter_t)
+        # running discount factor sum (and its gradient) after each grid point
+        self._discount_factors_sums = np.empty(num_grid_points)
 
-        while not np.isnan(discount_factor):
-            self._discount_factors_sum += discount_factor
-            self._iter_t += 0.5
-            discount_factor = spot_rate_to_discount(
-                np.interp(self._iter_t, previous_points_t, previous_points_s, right=np.nan, left=1), self._iter_t)
+        self._discount_factors_sum_gradients = np.empty((num_grid_points, num_inputs))
+
+        self.curve = []
+
+        self._gradients = np.empty((len(self._t), num_inputs))
 
         self.curve = self.build_curve()
 
@@ -47,32 +81,86 @@ class LongLiborCurveBuilder:
         y_interp = np.interp(t_interp, self._t, self._s)
         return y_interp
 
-    # scale swap rate
+    def build_curve(self, start_index=0):
+        # grid points up to the previous pillar do not depend on this pillar's quote
+        first_grid_index = 0 if start_index == 0 else self._pillar_indices[start_index - 1] + 1
+
+        if first_grid_index == 0:
+            previous_sum = self._initial_discount_factors_sum
+            previous_gradient = self._initial_discount_factors_sum_gradient
+        else:
+            previous_sum = self._discount_factors_sums[first_grid_index - 1]
+            previous_gradient = self._discount_factors_sum_gradients[first_grid_index - 1]
+
+        grid = self._grid[first_grid_index:]
+
+        swap_rates = self.interpolate_swap_rates(grid) / 100
+
+        a = 2 / (2 + swap_rates)
+
+        a_cumprod = np.cumprod(a)
 
-    def get_discount_factor_from_swap_rate(self, swap_quote):
+        a_cumprod_previous = np.concatenate(([1.], a_cumprod[:-1]))
 
-        swap_quote /= 100
+        sums = a_cumprod * (previous_sum + np.cumsum(1 / a_cumprod_previous))
 
-        discount_factor = (2 - swap_quote * self._discount_factors_sum) / (2 + swap_quote)
+        sums_previous = np.concatenate(([previous_sum], sums[:-1]))
 
-        return discount_factor
+        # dS_k = a_k dS_k-1 + (S_k-1 + 1) da_k with da_k = -a_k^2 / 2 d(swap_rate_k)
+        sum_increments = np.zeros((len(grid), len(previous_gradient)))
 
-    def build_curve(self):
-        long_curve = []
+        sum_increments[:, self._num_previous_points:] = ((sums_previous + 1) * -0.5 * a ** 2)[:, None] * \
+            linear_interpolation_weights(grid, self._t) / 100
 
-        for t, s in self._swap_quotes.items():
+        gradients = a_cumprod[:, None] * (
+                previous_gradient + np.cumsum(sum_increments / a_cumprod[:, None], axis=0))
 
-            while abs(t - self._iter_t) > FLOAT_EQ_THRESHOLD:
-                self._discount_factors_sum += self.get_discount_factor_from_swap_rate(
-                    self.interpolate_swap_rates(self._iter_t)
-                )
+        self._discount_factors_sums[first_grid_index:] = sums
 
-                self._iter_t += 0.5
+        self._discount_factors_sum_gradients[first_grid_index:] = gradients
 
-            spot_rate = discount_to_spot_rate(
-                self.get_discount_factor_from_swap_rate(self.interpolate_swap_rates(t)), t
-            )
+        gradients_previous = np.vstack((previous_gradient, gradients[:-1]))
 
-            long_curve.append({'time': t, 'spot_rate': spot_rate})
+        pillar_indices = self._pillar_indices[start_index:] - first_grid_index
+
+        pillar_times = self._t[start_index:]
+
+        discount_factors = sums[pillar_indices] - sums_previous[pillar_indices]
+
+        spot_rates = discount_to_spot_rate(discount_factors, pillar_times)
+
+        self._gradients[start_index:] = -1 * (gradients[pillar_indices] - gradients_previous[pillar_indices]) / (
+                pillar_times * discount_factors)[:, None]
+
+        long_curve = self.curve[:start_index] + [
+            {'time': t, 'spot_rate': spot_rate} for t, spot_rate in zip(pillar_times, spot_rates)]
 
         return long_curve
+
+    def rebuild_curve(self, swap_quotes: Dict[float, float]):
+        # a swap quote only moves the pillars from its own onwards, so resume from the previous pillar
+        start_index = first_changed_index(self._swap_quotes, swap_quotes)
+
+        builder = copy(self)
+        builder._swap_quotes = swap_quotes
+        builder._s = np.array(list(swap_quotes.values()))
+        builder._discount_factors_sums = self._discount_factors_sums.copy()
+        builder._discount_factors_sum_gradients = self._discount_factors_sum_gradients.copy()
+        builder._gradients = self._gradients.copy()
+        builder.curve = builder.build_curve(start_index)
+
+        return builder
+
+    @property
+    def previous_curve_jacobian(self) -> np.ndarray:
+        """
+        d(spot_rate) / d(previous spot rate), rows follow self.curve
+        """
+        return self._gradients[:, :self._num_previous_points]
+
+    @property
+    def quote_jacobian(self) -> np.ndarray:
+        """
+        d(spot_rate) / d(swap quote), rows follow self.curve and columns follow the order of the swap quotes
+        """
+        return self._gradients[:, self._num_previous_points:]
@@ -1,14 +1,24 @@
+from copy import copy
 from typing import Dict
 
+import numpy as np
+
 from utils.utils import spot_rate_to_discount, discount_to_spot_rate, future_price_to_forward_rate
+from yield_curve.libor_curve_builder.utils import first_changed_index
 
 
 class MidLiborCurveBuilder:
 
     def __init__(self, futures_prices: Dict[float, float], short_curve):
         self._future_prices = futures_prices
-        self.curve = short_curve
-        self.curve += self.build_curve()
+        self._short_curve = short_curve
+
+        # d(spot_rate) / d(short curve spot rates, futures prices) for every point, keyed by time
+        num_inputs = len(short_curve) + len(futures_prices)
+        self._gradients = {dp['time']: np.eye(1, num_inputs, i)[0] for i, dp in enumerate(short_curve)}
+
+        self._mid_curve = self.build_curve()
+        self.curve = short_curve + self._mid_curve
 
     @staticmethod
     def extend_libor_rate_with_forward_rate(libor_data_point, t, forward_rate):
@@ -19,18 +29,55 @@ class MidLiborCurveBuilder:
         discount_factor = first_point_discount / (1 + delta_t * forward_rate)
         return discount_to_spot_rate(discount_factor, t)
 
-    def build_curve(self):
-        mid_curve = []
+    def build_curve(self, start_index=0):
+        # futures are chained, points before start_index are reused as they cannot depend on later quotes
+        mid_curve = self._mid_curve[:start_index] if start_index else []
 
-        for t, fp in self._future_prices.items():
+        futures = list(self._future_prices.items())
+
+        for i in range(start_index, len(futures)):
+            t, fp = futures[i]
             if mid_curve:
                 last_data_point = max(mid_curve, key=lambda dp: dp['time'])
             else:
-                last_data_point = max(self.curve, key=lambda dp: dp['time'])
+                last_data_point = max(self._short_curve, key=lambda dp: dp['time'])
             forward_rate = future_price_to_forward_rate(fp)
             data_point = {'time': t, 'spot_rate': self.extend_libor_rate_with_forward_rate(
                 last_data_point, t, forward_rate)}
             mid_curve.append(data_point)
+
+            # spot_rate * t = last spot_rate * last t + log(1 + delta_t * forward_rate)
+            last_t = last_data_point['time']
+            gradient = (last_t / t) * self._gradients[last_t]
+            gradient[len(self._short_curve) + i] -= (t - last_t) / (t * (1 + (t - last_t) * forward_rate) * 100)
+            self._gradients[t] = gradient
         mid_curve.sort(key=lambda dp: dp['time'])
 
         return mid_curve
+
+    def rebuild_curve(self, futures_prices: Dict[float, float]):
+        start_index = first_changed_index(self._future_prices, futures_prices)
+
+        builder = copy(self)
+        builder._future_prices = futures_prices
+        builder._gradients = dict(self._gradients)
+        builder._mid_curve = builder.build_curve(start_index)
+        builder.curve = builder._short_curve + builder._mid_curve
+
+        return builder
+
+    @property
+    def short_curve_jacobian(self) -> np.ndarray:
+        """
+        d(spot_rate) / d(short curve spot rate), rows follow the futures points of self.curve
+        """
+        return np.array([self._gradients[dp['time']][:len(self._short_curve)] for dp in self._mid_curve]).reshape(
+            len(self._mid_curve), len(self._short_curve))
+
+    @property
+    def quote_jacobian(self) -> np.ndarray:
+        """
+        d(spot_rate) / d(futures price), rows follow the futures points of self.curve
+        """
+        return np.array([self._gradients[dp['time']][len(self._short_curve):] for dp in self._mid_curve]).reshape(
+            len(self._mid_curve), len(self._future_prices))
@@ -1,5 +1,8 @@
+from copy import copy
 from typing import Dict
 
+import numpy as np
+
 from utils.utils import discount_to_spot_rate
 
 
@@ -13,15 +16,48 @@ class ShortLiborCurveBuilder:
     def libor_rate_to_discount(l, t):
         return 1 / (1 + t * l / 100)
 
+    @staticmethod
+    def spot_rate_derivative(l, t):
+        # d(spot_rate) / d(libor rate quote in %)
+        return 1 / (100 + t * l)
+
+    def build_data_point(self, t, lr):
+        discount_rate = self.libor_rate_to_discount(lr, t)
+        return {'time': t, 'spot_rate': discount_to_spot_rate(discount_rate, t)}
+
     def build_curve(self):
         curve = []
 
         for t, lr in self._libor_rates.items():
-            discount_rate = self.libor_rate_to_discount(lr, t)
-            data_point = {'time': t, 'spot_rate': discount_to_spot_rate(
-                discount_rate, t
-            )}
+            data_point = self.build_data_point(t, lr)
             curve.append(data_point)
         curve.sort(key=lambda dp: dp['time'])
 
         return curve
+
+    def rebuild_curve(self, libor_rates: Dict[float, float]):
+        # each deposit is bootstrapped on its own so only the re-quoted points are recomputed
+        builder = copy(self)
+        builder._libor_rates = libor_rates
+        builder.curve = [
+            dp if libor_rates[dp['time']] == self._libor_rates[dp['time']] else self.build_data_point(
+                dp['time'], libor_rates[dp['time']])
+            for dp in self.curve
+        ]
+
+        return builder
+
+    @property
+    def quote_jacobian(self) -> np.ndarray:
+        """
+        d(spot_rate) / d(quote), rows follow self.curve and columns follow the order of the libor rate quotes
+        """
+        quote_index = {t: j for j, t in enumerate(self._libor_rates)}
+
+        jacobian = np.zeros((len(self.curve), len(self._libor_rates)))
+
+        for i, dp in enumerate(self.curve):
+            t = dp['time']
+            jacobian[i, quote_index[t]] = self.spot_rate_derivative(self._libor_rates[t], t)
+
+        return jacobian
@@ -0,0 +1,9 @@
+from typing import Dict
+
+
+def first_changed_index(quotes: Dict[float, float], new_quotes: Dict[float, float]) -> int:
+    for i, (t, quote) in enumerate(quotes.items()):
+        if new_quotes[t] != quote:
+            return i
+
+    return len(quotes)
@@ -0,0 +1,108 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import combinations
+from typing import Callable, Dict, List
+
+import pandas as pd
+
+from utils.enum import BumpScheme
+from yield_curve.libor_curve import LiborCurve
+
+
+@dataclass
+class RiskLadder:
+    nodes: List[str]
+    # keyed by bump size in bps, then by node
+    delta: Dict[float, Dict[str, float]]
+    gamma: Dict[float, Dict[str, float]]
+    # keyed by bump size in bps, node x node, the diagonal holds the gamma of the same bump size
+    cross_gamma: Dict[float, pd.DataFrame] = field(default_factory=dict)
+
+
+def curve_risk_ladder(price: Callable[[LiborCurve], float], libor_curve: LiborCurve, bump_sizes=(1,),
+                      scheme: BumpScheme = BumpScheme.FORWARD, cross_gamma: bool = False,
+                      max_workers: int = 1) -> RiskLadder:
+    """
+    Delta and gamma to every curve instrument for each bump size h, in value per bump of h bps:
+
+    forward: delta = V(+h) - V0, gamma = V(+2h) - 2 V(+h) + V0
+    central: delta = (V(+h) - V(-h)) / 2, gamma = V(+h) - 2 V0 + V(-h)
+
+    Every bumped curve is built and priced once and shared by all the bump sizes that need it. The cross-gamma pairs
+    bump two quotes together and are priced over a process pool when max_workers is above one, price and the curve
+    must then be picklable.
+    :param price: value of the position on a curve
+    """
+    nodes = libor_curve.instrument_node_names
+
+    npv = price(libor_curve)
+
+    multiples = (1, 2) if scheme == BumpScheme.FORWARD else (1, -1)
+
+    shifts = sorted({multiple * bump_size for bump_size in bump_sizes for multiple in multiples})
+
+    values = {(node, 0): npv for node in nodes}
+
+    for shift in shifts:
+        for node, bumped_curve in libor_curve.iter_bumped_curves(shift):
+            values[node, shift] = price(bumped_curve)
+
+    delta = dict()
+
+    gamma = dict()
+
+    for h in bump_sizes:
+        if scheme == BumpScheme.FORWARD:
+            delta[h] = {node: values[node, h] - npv for node in nodes}
+            gamma[h] = {node: (values[node, 2 * h] - values[node, h]) - (values[node, h] - npv) for node in nodes}
+        else:
+            delta[h] = {node: (values[node, h] - values[node, -h]) / 2 for node in nodes}
+            gamma[h] = {node: (values[node, h] - npv) - (npv - values[node, -h]) for node in nodes}
+
+    ladder = RiskLadder(nodes, delta, gamma)
+
+    if cross_gamma:
+        for h in bump_sizes:
+            ladder.cross_gamma[h] = _cross_gamma(price, libor_curve, nodes, h, scheme, values, gamma[h], max_workers)
+
+    return ladder
+
+
+def _cross_gamma(price, libor_curve: LiborCurve, nodes: List[str], h: float, scheme: BumpScheme, values: dict,
+                 gamma: Dict[str, float], max_workers: int) -> pd.DataFrame:
+    npv = values[nodes[0], 0]
+
+    signs = ((1, 1),) if scheme == BumpScheme.FORWARD else ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+    pair_bumps = [{node_i: sign_i * h, node_j: sign_j * h}
+                  for node_i, node_j in combinations(nodes, 2) for sign_i, sign_j in signs]
+
+    if max_workers == 1:
+        pair_values = [_price_bumped(price, libor_curve, node_bumps) for node_bumps in pair_bumps]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            pair_values = list(executor.map(_price_bumped, [price] * len(pair_bumps), [libor_curve] * len(pair_bumps),
+                                            pair_bumps, chunksize=max(1, len(pair_bumps) // (4 * max_workers))))
+
+    matrix = pd.DataFrame(0., index=nodes, columns=nodes)
+
+    pair_values = iter(pair_values)
+
+    for node_i, node_j in combinations(nodes, 2):
+        if scheme == BumpScheme.FORWARD:
+            cross = next(pair_values) - values[node_i, h] - values[node_j, h] + npv
+        else:
+            up_up, up_down, down_up, down_down = (next(pair_values) for _ in signs)
+            cross = (up_up - up_down - down_up + down_down) / 4
+
+        matrix.loc[node_i, node_j] = matrix.loc[node_j, node_i] = cross
+
+    for node in nodes:
+        matrix.loc[node, node] = gamma[node]
+
+    return matrix
+
+
+def _price_bumped(price, libor_curve: LiborCurve, node_bumps: Dict[str, float]) -> float:
+
+    return price(libor_curve.bump_quotes(node_bumps))